@@ -0,0 +1,156 @@
+"""
+Asyncio front end for services: a snapshot as an async generator of byte chunks.
+
+    async for chunk in stream_snapshot('/path/to/project', streaming=True):
+        await response.write(chunk)
+
+The scan and combine run as usual (the snapshot is still written to its output
+file, so incremental reuse keeps working) on a thread of a bounded executor,
+and the final output's bytes are handed to the event loop as they are written.
+The loop itself never touches the filesystem. At most `max_pending` chunks
+wait for the consumer; when they aren't taken, the worker blocks, so a slow
+client slows its own snapshot down instead of filling memory. Cancelling the
+consuming task, or leaving the `async for` early, cancels the run: the worker
+stops at its next check and removes its temporary files.
+"""
+import asyncio
+import concurrent.futures
+import os
+import threading
+
+from processor import ProjectProcessor
+
+DEFAULT_CHUNK_SIZE = 256 * 1024
+# Chunks written but not yet taken by the consumer, per snapshot
+DEFAULT_MAX_PENDING = 8
+# Snapshots running at once on the shared executor; further requests wait for a thread
+DEFAULT_WORKERS = min(8, (os.cpu_count() or 1) + 4)
+# How often a worker blocked on a full queue checks whether the consumer went away
+PUT_POLL_INTERVAL = 0.1
+
+_DONE = object()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def default_executor():
+    """The executor shared by every AsyncSnapshot that isn't given one, created on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(max_workers=DEFAULT_WORKERS,
+                                                              thread_name_prefix='snapshot')
+        return _executor
+
+
+class SnapshotError(RuntimeError):
+    """The run failed or was cancelled; the message is the one ProjectProcessor.run returned."""
+
+
+class _ConsumerGone(Exception):
+    pass
+
+
+class _ChunkSink:
+    """Collects the output's bytes into chunks of about chunk_size and passes them to `put`."""
+
+    def __init__(self, put, chunk_size):
+        self.put = put
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+
+    def __call__(self, data):
+        self.buffer += data
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            chunk = bytes(self.buffer)
+            self.buffer.clear()
+            if not self.put(chunk):
+                # Abort the write; the combiner cleans up like after any write error
+                raise _ConsumerGone("The consumer stopped reading")
+
+
+class AsyncSnapshot:
+    """
+    One snapshot run for an event loop. Iterate over chunks() once; afterwards `message` and
+    `stats` hold what ProjectProcessor.run returned. `options` are ProjectProcessor's
+    (streaming, dedupe, delta, ...); compressed output can't be streamed. `progress`, a
+    progress.ProgressState, receives the run's progress messages.
+    """
+
+    def __init__(self, project_path, output_file=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                 max_pending=DEFAULT_MAX_PENDING, executor=None, progress=None, **options):
+        if options.get('compression'):
+            raise ValueError("Compressed output can't be streamed")
+        self.project_path = project_path
+        self.output_file = output_file
+        self.chunk_size = chunk_size
+        self.max_pending = max_pending
+        self.executor = executor
+        self.progress = progress
+        self.options = options
+        self.message = None
+        self.stats = None
+
+    async def chunks(self):
+        """Yield the snapshot's bytes; raises SnapshotError if the run fails."""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.max_pending)
+        cancel_event = threading.Event()
+        consumer_gone = threading.Event()
+
+        def put(item):
+            # Called on the worker thread: wait for room in the queue, or for the consumer to leave
+            future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+            while True:
+                try:
+                    future.result(timeout=PUT_POLL_INTERVAL)
+                    return True
+                except concurrent.futures.TimeoutError:
+                    if consumer_gone.is_set():
+                        future.cancel()
+                        return False
+
+        report = self.progress.update if self.progress is not None else _ignore_progress
+
+        def run():
+            try:
+                processor = ProjectProcessor(self.project_path, output_file=self.output_file, **self.options)
+                sink = _ChunkSink(put, self.chunk_size)
+                processor.combiner.output_sink = sink
+                result = processor.run(report, report, cancel_event)
+                if result[0]:
+                    sink.flush()
+                return result
+            except _ConsumerGone:
+                return False, "Process was cancelled by user.", {}
+            finally:
+                put(_DONE)
+
+        worker = loop.run_in_executor(self.executor or default_executor(), run)
+        try:
+            while True:
+                chunk = await queue.get()
+                if chunk is _DONE:
+                    break
+                yield chunk
+            success, self.message, self.stats = await worker
+        finally:
+            if not worker.done():
+                # Cancelled, or the consumer left the loop early
+                cancel_event.set()
+                consumer_gone.set()
+        if not success:
+            raise SnapshotError(self.message)
+
+
+def stream_snapshot(project_path, **kwargs):
+    """Shortcut for AsyncSnapshot(project_path, **kwargs).chunks()."""
+    return AsyncSnapshot(project_path, **kwargs).chunks()
+
+
+def _ignore_progress(message, progress):
+    pass
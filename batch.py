@@ -0,0 +1,312 @@
+"""
+Batch entry point: snapshot many projects in parallel worker processes.
+
+    python batch.py /path/a /path/b ... [--manifest projects.txt] [-w N]
+                    [--timeout SECONDS] [--report report.json] [processor options of cli.py]
+
+Like cli.py it never imports the UI. Each project runs in its own
+ProjectProcessor on a worker of a ProcessPoolExecutor; a project that fails,
+hangs or takes its worker process down is reported as such and the others carry
+on. The aggregated report (per-project stats and timings plus totals) is
+written as JSON.
+"""
+import argparse
+import collections
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from processor import ProjectProcessor
+from ignore_rules import default_ignore_spec
+from cli import add_processor_arguments, processor_options
+
+REPORT_VERSION = 1
+# How long a timed-out project gets to notice the cancel before its worker is killed
+KILL_GRACE = 10.0
+# How often the batch loop checks for overdue projects
+POLL_INTERVAL = 0.5
+
+
+def load_manifest(path):
+    """
+    Read a list of projects: JSON (a list of paths or of {"path": ..., "output": ...} objects)
+    or plain text with one path per line, '#' starting a comment. Relative paths are taken
+    from the manifest's directory. Returns a list of (project path, output file or None).
+    """
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    if content.lstrip().startswith('['):
+        entries = json.loads(content)
+    else:
+        entries = [line.strip() for line in content.splitlines() if line.strip() and not line.strip().startswith('#')]
+    projects = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {'path': entry}
+        output = entry.get('output')
+        projects.append((os.path.join(base, entry['path']), os.path.join(base, output) if output else None))
+    return projects
+
+
+def assign_outputs(projects, output_dir):
+    """Give projects without an explicit output `<output_dir>/<project name>.txt`, made unique."""
+    used = collections.Counter()
+    assigned = []
+    for path, output in projects:
+        if output is None:
+            name = os.path.basename(os.path.normpath(path)) or 'project'
+            used[name] += 1
+            suffix = f"-{used[name]}" if used[name] > 1 else ''
+            output = os.path.join(output_dir, f"{name}{suffix}.txt")
+        assigned.append((path, output))
+    return assigned
+
+
+def _init_worker():
+    # Compiled once per worker (inherited from the parent where processes are forked)
+    default_ignore_spec()
+
+
+def _ignore_progress(message, progress):
+    pass
+
+
+def run_project(path, output_file, options, timeout=None):
+    """
+    Worker: snapshot one project. Never raises; failures are part of the returned result.
+    A timeout sets the run's cancel event, so the scanner and combiner stop at their next check.
+    """
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    cancel_event = threading.Event()
+    timer = threading.Timer(timeout, cancel_event.set) if timeout else None
+    result = {'path': path, 'pid': os.getpid()}
+    try:
+        if not os.path.isdir(path):
+            result.update(status='failed', message="not a directory")
+            return result
+        if timer:
+            timer.daemon = True
+            timer.start()
+        processor = ProjectProcessor(path, output_file=output_file, **options)
+        success, message, stats = processor.run(_ignore_progress, _ignore_progress, cancel_event)
+        if cancel_event.is_set():
+            result.update(status='timeout', message=f"Timed out after {timeout:g} s")
+        else:
+            result.update(status='ok' if success else 'failed', message=message, stats=stats)
+    except Exception as e:
+        result.update(status='failed', message=f"{type(e).__name__}: {e}", traceback=traceback.format_exc())
+    finally:
+        if timer:
+            timer.cancel()
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    result['cpu_seconds'] = round(time.process_time() - cpu_start, 3)
+    return result
+
+
+class BatchRunner:
+    """
+    Runs projects on a process pool, at most `workers` at a time.
+
+    Projects are submitted only when a worker is free, so a project's clock starts when it is
+    handed over. A project that ignores its cancel for KILL_GRACE seconds past the timeout has
+    its worker pool torn down; the projects running next to it are resubmitted. When a worker
+    dies on its own the culprit is unknown, so every project in flight becomes a suspect and is
+    retried alone; one that takes its worker down while running alone is reported as crashed.
+    """
+
+    def __init__(self, workers=None, timeout=None, options=None, callback=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.options = options or {}
+        # callback(result, finished count, total) after every project
+        self.callback = callback
+        self._executor = None
+
+    def run(self, projects):
+        """Run every (path, output) pair; returns the results in input order."""
+        default_ignore_spec()
+        pending = collections.deque(enumerate(projects))
+        suspects = set()
+        results = [None] * len(projects)
+        running = {}
+        try:
+            while pending or running:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+                while pending and len(running) < self.workers:
+                    # A suspect runs with nothing next to it
+                    if running and (pending[0][0] in suspects or any(n in suspects for n, _, _ in running.values())):
+                        break
+                    number, (path, output) = pending.popleft()
+                    future = self._executor.submit(run_project, path, output, self.options, self.timeout)
+                    running[future] = (number, path, time.monotonic())
+
+                done, _ = wait(running, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    number, path, _ = running.pop(future)
+                    try:
+                        self._finish(results, number, future.result())
+                    except BrokenProcessPool:
+                        broken = True
+                        running[future] = (number, path, None)
+                    except Exception as e:
+                        # E.g. the options or the result couldn't be pickled
+                        self._finish(results, number, {'path': path, 'status': 'failed',
+                                                       'message': f"{type(e).__name__}: {e}"})
+
+                overdue = self._overdue(running)
+                if overdue:
+                    for future in overdue:
+                        number, path, _ = running.pop(future)
+                        self._finish(results, number, {'path': path, 'status': 'timeout',
+                                                       'message': f"Killed after {self.timeout:g} s"})
+                    self._kill()
+                    # The others were interrupted through no fault of their own
+                    for number, path, _ in running.values():
+                        pending.appendleft((number, projects[number]))
+                    running.clear()
+                elif broken:
+                    self._discard()
+                    if len(running) == 1:
+                        number, path, _ = next(iter(running.values()))
+                        self._finish(results, number, {'path': path, 'status': 'crashed',
+                                                       'message': "The worker process exited unexpectedly"})
+                    else:
+                        for number, path, _ in running.values():
+                            suspects.add(number)
+                            pending.appendleft((number, projects[number]))
+                    running.clear()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+        return results
+
+    def _finish(self, results, number, result):
+        results[number] = result
+        if self.callback:
+            self.callback(result, sum(r is not None for r in results), len(results))
+
+    def _overdue(self, running):
+        if not self.timeout:
+            return []
+        deadline = time.monotonic() - self.timeout - KILL_GRACE
+        return [future for future, (_, _, started) in running.items() if started is not None and started < deadline]
+
+    def _kill(self):
+        """Stop the pool's processes at once, including the ones still running projects."""
+        executor, self._executor = self._executor, None
+        terminate = getattr(executor, 'terminate_workers', None)
+        if terminate is not None:
+            terminate()
+        else:
+            # No public way before Python 3.14
+            for process in list(getattr(executor, '_processes', {}).values()):
+                process.terminate()
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    def _discard(self):
+        executor, self._executor = self._executor, None
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def build_report(results, started, seconds, workers, timeout, options):
+    totals = collections.Counter(projects=len(results))
+    for result in results:
+        totals[result['status']] += 1
+        stats = result.get('stats') or {}
+        for key in ('text_files', 'total_chars', 'raw_bytes', 'compressed_bytes', 'errors'):
+            totals[key] += stats.get(key, 0)
+        totals['project_seconds'] += result.get('seconds', 0)
+    totals['project_seconds'] = round(totals['project_seconds'], 3)
+    return {
+        'version': REPORT_VERSION,
+        'started': started,
+        'seconds': round(seconds, 3),
+        'workers': workers,
+        'timeout': timeout,
+        'options': options,
+        'totals': dict(totals),
+        'projects': results,
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="codebase-tracker-batch",
+        description="Snapshot many projects in parallel and write one JSON report."
+    )
+    parser.add_argument("projects", nargs='*', help="Project root directories")
+    parser.add_argument("-m", "--manifest", action='append', default=[],
+                        help="File listing projects: one path per line, or a JSON list of paths "
+                             "or {\"path\", \"output\"} objects (repeatable)")
+    parser.add_argument("-w", "--workers", type=int, help="Worker processes (default: number of CPUs)")
+    parser.add_argument("--timeout", type=float, metavar="SECONDS", help="Cancel a project running longer than this")
+    parser.add_argument("--output-dir",
+                        help="Write outputs to DIR/<project name>.txt instead of each project's .codebase/")
+    parser.add_argument("--report", default="batch_report.json",
+                        help="Where to write the JSON report (default: batch_report.json, '-' for stdout)")
+    add_processor_arguments(parser)
+    parser.add_argument("-q", "--quiet", action="store_true", help="Do not print per-project results to stderr")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.compress and (args.shard_kb or args.shard_tokens):
+        parser.error("--compress can't be combined with --shard-kb or --shard-tokens")
+
+    projects = [(path, None) for path in args.projects]
+    for manifest in args.manifest:
+        try:
+            projects.extend(load_manifest(manifest))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Error: can't read manifest {manifest}: {e}", file=sys.stderr)
+            return 2
+    if not projects:
+        parser.error("no projects given")
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        projects = assign_outputs(projects, args.output_dir)
+
+    def report_progress(result, finished, total):
+        if not args.quiet:
+            seconds = f" in {result['seconds']:.1f}s" if 'seconds' in result else ''
+            print(f"[{finished}/{total}] {result['status']:<7} {result['path']}{seconds}: {result['message']}",
+                  file=sys.stderr)
+
+    options = processor_options(args)
+    runner = BatchRunner(args.workers, args.timeout, options, report_progress)
+    started = time.strftime("%Y-%m-%d %H:%M:%S")
+    start = time.perf_counter()
+    try:
+        results = runner.run(projects)
+    except KeyboardInterrupt:
+        print("Cancelled.", file=sys.stderr)
+        return 130
+    report = build_report(results, started, time.perf_counter() - start, runner.workers, args.timeout, options)
+
+    text = json.dumps(report, indent=1, ensure_ascii=False)
+    if args.report == '-':
+        print(text)
+    else:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            f.write(text)
+    totals = report['totals']
+    if not args.quiet:
+        print(f"{totals.get('ok', 0)} of {totals['projects']} projects succeeded in {report['seconds']:.1f}s"
+              + (f", report: {args.report}" if args.report != '-' else ''), file=sys.stderr)
+    return 0 if totals.get('ok', 0) == totals['projects'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
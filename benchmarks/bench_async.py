@@ -0,0 +1,116 @@
+"""
+Check that concurrent asyncio snapshots don't stall the event loop.
+
+Usage:
+    python benchmarks/bench_async.py [--concurrency 8] [--max-lag-ms 100]
+                                     [generator options, see synthetic_repo.py]
+
+A synthetic project is generated and snapshotted `--concurrency` times at once
+through async_api.AsyncSnapshot, every consumer reading its chunks on one
+event loop, while a ticker measures how late the loop wakes up from 10 ms
+sleeps. Reports the wall time against the same runs done one after the other
+with ProjectProcessor.run, the bytes streamed, and the worst and median loop
+lag. The exit status is 1 if the worst lag exceeds --max-lag-ms or a streamed
+snapshot differs from the file written next to it.
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from async_api import AsyncSnapshot  # noqa: E402
+from processor import ProjectProcessor  # noqa: E402
+import synthetic_repo  # noqa: E402
+
+TICK_SECONDS = 0.01
+
+
+async def consume(project, output):
+    """Returns (SHA-1 of the streamed bytes, their size, the output file)."""
+    snapshot = AsyncSnapshot(project, output_file=output, incremental=False)
+    hasher = hashlib.sha1()
+    size = 0
+    async for chunk in snapshot.chunks():
+        hasher.update(chunk)
+        size += len(chunk)
+    return hasher.hexdigest(), size, snapshot.stats['output_file']
+
+
+def file_hash(path):
+    hasher = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+async def ticker(stop, lags):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        lags.append(time.perf_counter() - start - TICK_SECONDS)
+
+
+async def run_concurrent(project, outputs):
+    stop = asyncio.Event()
+    lags = []
+    tick = asyncio.create_task(ticker(stop, lags))
+    start = time.perf_counter()
+    results = await asyncio.gather(*(consume(project, output) for output in outputs))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await tick
+    return elapsed, results, lags
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=8, help="Snapshots streamed at once (default: 8)")
+    parser.add_argument('--max-lag-ms', type=float, default=100.0,
+                        help="Largest acceptable event loop delay (default: 100)")
+    synthetic_repo.add_arguments(parser)
+    parser.set_defaults(files=5000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_async_')
+    try:
+        project = os.path.join(workdir, 'project')
+        os.makedirs(project)
+        summary = synthetic_repo.generate_repo(project, **synthetic_repo.config_from_args(args))
+        print(f"Generated {summary['files']} files ({summary['bytes'] / 1024 / 1024:.1f} MB)")
+        outputs = [os.path.join(workdir, f"codebase-{number}.txt") for number in range(args.concurrency)]
+
+        # Warm the page cache and the classification cache
+        ProjectProcessor(project, output_file=outputs[0], incremental=False).run(
+            lambda m, p: None, lambda m, p: None, threading.Event())
+        start = time.perf_counter()
+        for output in outputs:
+            ProjectProcessor(project, output_file=output, incremental=False).run(
+                lambda m, p: None, lambda m, p: None, threading.Event())
+        sequential = time.perf_counter() - start
+
+        elapsed, results, lags = asyncio.run(run_concurrent(project, outputs))
+        identical = all(digest == file_hash(path) for digest, _, path in results)
+        streamed = sum(size for _, size, _ in results)
+        worst = max(lags) * 1000
+        print(f"{args.concurrency} snapshots: sequential {sequential:.2f}s, async {elapsed:.2f}s, "
+              f"{streamed / 1024 / 1024:.1f} MB streamed")
+        print(f"event loop lag: median {statistics.median(lags) * 1000:.1f} ms, worst {worst:.1f} ms "
+              f"(limit {args.max_lag_ms:g} ms) over {len(lags)} ticks")
+        print(f"streamed bytes identical to the output files: {identical}")
+        return 0 if identical and worst <= args.max_lag_ms else 1
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+Compare output compression codecs and levels.
+
+Usage:
+    python benchmarks/bench_compress.py [project_path] [--files 2000] [--file-kb 24]
+
+Without a project path a synthetic project of source-like files is generated.
+The project is combined once uncompressed and once per codec/level; for each run
+the wall time, throughput in uncompressed MB/s, output size and compression ratio
+are reported, and the decompressed output is checked against the plain one.
+"""
+import argparse
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from processor import ProjectProcessor  # noqa: E402
+from output_writer import open_output  # noqa: E402
+
+RUNS = [(None, None), ('gzip', 1), ('gzip', 6), ('gzip', 9), ('xz', 0), ('xz', 6), ('bz2', 1), ('bz2', 9)]
+WORDS = ['value', 'result', 'config', 'handler', 'request', 'buffer', 'index', 'offset', 'items', 'context']
+
+
+def make_project(root, files, file_kb):
+    rng = random.Random(42)
+    for i in range(files):
+        directory = os.path.join(root, f'pkg{i % 20}', f'mod{i % 7}')
+        os.makedirs(directory, exist_ok=True)
+        lines = []
+        size = 0
+        while size < file_kb * 1024:
+            line = f"    {rng.choice(WORDS)}_{rng.randrange(100)} = {rng.choice(WORDS)}({rng.randrange(10000)})\n"
+            lines.append(line)
+            size += len(line)
+        with open(os.path.join(directory, f'file{i}.py'), 'w', encoding='utf-8') as f:
+            f.write(f"def function_{i}():\n" + ''.join(lines))
+
+
+def run(project, output, compression, level):
+    processor = ProjectProcessor(project, output_file=output, incremental=False,
+                                 compression=compression, compression_level=level)
+    start = time.perf_counter()
+    success, message, stats = processor.run(lambda m, p: None, lambda m, p: None, threading.Event())
+    elapsed = time.perf_counter() - start
+    if not success:
+        raise RuntimeError(message)
+    with open_output(stats['output_file']) as f:
+        # Only the timestamp line differs between runs
+        content = re.sub(rb'SNAPSHOT - [0-9: -]+', b'', f.read())
+    return elapsed, stats, content
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('project_path', nargs='?')
+    parser.add_argument('--files', type=int, default=2000)
+    parser.add_argument('--file-kb', type=int, default=24)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_compress_')
+    try:
+        project = args.project_path
+        if project is None:
+            project = os.path.join(workdir, 'project')
+            make_project(project, args.files, args.file_kb)
+
+        reference = None
+        print(f"{'codec':<6} {'level':>5} {'time':>8} {'MB/s':>8} {'output':>12} {'ratio':>7}  same")
+        for compression, level in RUNS:
+            elapsed, stats, content = run(project, os.path.join(workdir, 'out.txt'), compression, level)
+            if reference is None:
+                reference = content
+            raw, compressed = stats['raw_bytes'], stats['compressed_bytes']
+            print(f"{compression or 'none':<6} {level if level is not None else '-':>5} {elapsed:7.2f}s "
+                  f"{raw / elapsed / 1024 / 1024:8.1f} {compressed:12,} {raw / compressed:7.2f}  {content == reference}")
+            os.remove(stats['output_file'])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
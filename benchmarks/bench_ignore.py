@@ -0,0 +1,101 @@
+"""
+Micro-benchmarks for ignore matching.
+
+Usage:
+    python benchmarks/bench_ignore.py [--paths 100000] [--ignored-dirs 2000]
+
+Compares the compiled matcher against one PathSpec.match_file call per rule
+set (the previous IgnoreRules.is_ignored), and the prefix trie against the
+any(startswith) scan over ignored directories. Results are checked for equality.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pathspec  # noqa: E402
+from ignore_matcher import CompiledIgnoreMatcher, PathPrefixTrie  # noqa: E402
+from ignore_rules import DEFAULT_IGNORE_PATTERNS  # noqa: E402
+
+GITIGNORE_LINES = [
+    '# typical project .gitignore', '*.pyc', '.env', 'dist/', 'coverage/', '*.egg-info/',
+    '/local_settings.py', 'docs/_build/', 'npm-debug.log*', '!important.log', '*.gen.ts',
+]
+TRACK_IGNORE_LINES = ['fixtures/', '*.snap', 'src/**/generated/']
+
+COMPONENTS = ['src', 'lib', 'app', 'node_modules', 'tests', 'fixtures', 'docs', 'api', 'core',
+              'build', 'generated', 'utils', 'components', 'models', 'views']
+FILENAMES = ['index.js', 'main.py', 'util.pyc', 'error.log', 'important.log', 'README.md',
+             'schema.gen.ts', 'data.snap', 'style.css', '.env', 'config.yaml', 'view.tsx']
+
+
+def make_paths(count, rnd):
+    paths = []
+    for _ in range(count):
+        depth = rnd.randint(0, 6)
+        parts = [rnd.choice(COMPONENTS) for _ in range(depth)]
+        parts.append(rnd.choice(FILENAMES))
+        paths.append('/'.join(parts))
+    return paths
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def bench_matcher(paths):
+    specs = [
+        pathspec.PathSpec.from_lines('gitwildmatch', GITIGNORE_LINES),
+        pathspec.PathSpec.from_lines('gitwildmatch', TRACK_IGNORE_LINES),
+        pathspec.PathSpec.from_lines('gitwildmatch', DEFAULT_IGNORE_PATTERNS),
+    ]
+    matcher = CompiledIgnoreMatcher(specs)
+
+    legacy_time, legacy = timed(lambda: [any(spec.match_file(p) for spec in specs) for p in paths])
+    compiled_time, compiled = timed(lambda: [matcher.match(p) for p in paths])
+    report("ignore matching", len(paths), legacy_time, compiled_time, legacy == compiled)
+
+
+def bench_trie(paths, ignored_count, rnd):
+    ignored_dirs = set()
+    for path in paths:
+        parts = path.split('/')[:-1]
+        if parts and len(ignored_dirs) < ignored_count and rnd.random() < 0.5:
+            ignored_dirs.add('/'.join(parts[:rnd.randint(1, len(parts))]))
+    trie = PathPrefixTrie(ignored_dirs)
+
+    def legacy():
+        return [p in ignored_dirs or any(p.startswith(d + '/') for d in ignored_dirs) for p in paths]
+
+    legacy_time, expected = timed(legacy)
+    trie_time, actual = timed(lambda: [trie.covers(p) for p in paths])
+    report(f"ignored-dir lookup ({len(ignored_dirs)} dirs)", len(paths), legacy_time, trie_time,
+           expected == actual)
+
+
+def report(name, count, legacy_time, new_time, identical):
+    print(f"{name}:")
+    print(f"  before {legacy_time * 1e6 / count:9.2f} us/path   after {new_time * 1e6 / count:9.2f} us/path   "
+          f"speed-up {legacy_time / new_time:6.1f}x   identical results: {identical}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--paths', type=int, default=100000)
+    parser.add_argument('--ignored-dirs', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    paths = make_paths(args.paths, rnd)
+    bench_matcher(paths)
+    bench_trie(paths[:max(1, args.paths // 10)], args.ignored_dirs, rnd)
+
+
+if __name__ == '__main__':
+    main()
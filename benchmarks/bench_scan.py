@@ -0,0 +1,160 @@
+"""
+Compare the os.scandir-based FileScanner against the previous os.walk walk.
+
+Usage:
+    python benchmarks/bench_scan.py [--entries 200000] [--keep DIR]
+
+Both variants scan the same synthetic tree and build the project tree.
+Filesystem calls are counted by wrapping os.stat/os.lstat/os.scandir/open,
+which is where every Python-level syscall in the scan path goes through.
+"""
+import argparse
+import builtins
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from file_utils import is_text_file, get_relative_path  # noqa: E402
+from scanner import FileScanner  # noqa: E402
+from tree_builder import TreeBuilder  # noqa: E402
+
+EXTENSIONS = ['.py', '.js', '.md', '.png', '.txt', '']
+
+
+def generate_tree(root, entries, files_per_dir=20, dirs_per_dir=8):
+    """Create roughly `entries` files and directories under root, with some ignored directories."""
+    created = 0
+    pending = [root]
+    while pending and created < entries:
+        current = pending.pop(0)
+        for i in range(dirs_per_dir):
+            name = 'node_modules' if i == 0 and created % 7 == 0 else f'dir{i}'
+            path = os.path.join(current, name)
+            os.mkdir(path)
+            pending.append(path)
+            created += 1
+        for i in range(files_per_dir):
+            with open(os.path.join(current, f'file{i}{EXTENSIONS[i % len(EXTENSIONS)]}'), 'w') as f:
+                f.write('x = 1\n')
+            created += 1
+    return created
+
+
+def legacy_scan(scanner):
+    """The previous FileScanner.scan: os.walk with a Path and relpath per entry."""
+    project_path = scanner.project_path
+    text_files, ignored_items, all_files = [], [], []
+    for root, dirs, files in os.walk(project_path, topdown=True):
+        root_path = Path(root)
+        rel_root = get_relative_path(root_path, project_path)
+        if rel_root == '.':
+            rel_root = ''
+        if rel_root:
+            all_files.append(rel_root)
+        dirs_to_remove = []
+        for d in dirs:
+            dir_path = root_path / d
+            rel_path = get_relative_path(dir_path, project_path)
+            all_files.append(rel_path)
+            if scanner.ignore_rules.is_ignored(rel_path):
+                ignored_items.append((dir_path, rel_path, "directory"))
+                dirs_to_remove.append(d)
+        for d in dirs_to_remove:
+            dirs.remove(d)
+        for filename in files:
+            file_path = root_path / filename
+            rel_path = get_relative_path(file_path, project_path)
+            all_files.append(rel_path)
+            if scanner.ignore_rules.is_ignored(rel_path):
+                ignored_items.append((file_path, rel_path, "file"))
+            elif is_text_file(file_path):
+                text_files.append((file_path, rel_path))
+            else:
+                ignored_items.append((file_path, rel_path, "binary"))
+    return text_files, ignored_items, all_files
+
+
+class SyscallCounter:
+    """Counts calls to the filesystem entry points used by the scan while active."""
+
+    TARGETS = [(os, 'stat'), (os, 'lstat'), (os, 'scandir'), (builtins, 'open')]
+
+    def __init__(self):
+        self.counts = Counter()
+        self._originals = []
+
+    def __enter__(self):
+        for module, name in self.TARGETS:
+            original = getattr(module, name)
+            self._originals.append((module, name, original))
+            setattr(module, name, self._wrap(name, original))
+        return self
+
+    def __exit__(self, *exc):
+        for module, name, original in self._originals:
+            setattr(module, name, original)
+
+    def _wrap(self, name, original):
+        def wrapper(*args, **kwargs):
+            self.counts[name] += 1
+            return original(*args, **kwargs)
+        return wrapper
+
+
+def run_variant(project, use_scandir):
+    scanner = FileScanner(project)
+    tree_builder = TreeBuilder()
+    with SyscallCounter() as counter:
+        start = time.perf_counter()
+        if use_scandir:
+            text_files, ignored_items, all_files = scanner.scan()
+            directories = scanner.directories
+        else:
+            text_files, ignored_items, all_files = legacy_scan(scanner)
+            directories = None
+        scan_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ignored_dirs = [item for item in ignored_items if item[2] == "directory"]
+        tree = tree_builder.build_tree(project, ignored_dirs, all_files, directories=directories)
+        tree_time = time.perf_counter() - start
+    return scan_time, tree_time, counter.counts, len(text_files), tree
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--entries', type=int, default=200000)
+    parser.add_argument('--keep', help="Generate the tree in this directory and keep it")
+    args = parser.parse_args()
+
+    project = args.keep or tempfile.mkdtemp(prefix='bench_scan_')
+    os.makedirs(project, exist_ok=True)
+    try:
+        if not os.listdir(project):
+            print(f"Generating ~{args.entries} entries in {project} ...")
+            generate_tree(project, args.entries)
+
+        results = {}
+        for name, use_scandir in (('os.walk (legacy)', False), ('os.scandir', True)):
+            scan_time, tree_time, counts, text_count, tree = run_variant(project, use_scandir)
+            results[name] = (scan_time + tree_time, sum(counts.values()), tree)
+            calls = ', '.join(f"{k}={v}" for k, v in sorted(counts.items()))
+            print(f"{name:<18} scan {scan_time:7.2f} s  tree {tree_time:7.2f} s  "
+                  f"{text_count} text files  fs calls: {calls}")
+
+        legacy, current = results['os.walk (legacy)'], results['os.scandir']
+        print(f"speed-up: {legacy[0] / current[0]:.2f}x, fs calls: {legacy[1]} -> {current[1]}, "
+              f"identical tree: {legacy[2] == current[2]}")
+    finally:
+        if not args.keep:
+            shutil.rmtree(project, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Compare interpreter start-up cost of the headless CLI against the Tk GUI.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs N]
+
+Each measurement spawns a fresh interpreter so import caches don't leak
+between runs; the minimum over N runs is reported.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+GUI_MODULES = ('tkinter', 'tkinterdnd2', 'ui')
+
+TARGETS = {
+    'python (baseline)': "pass",
+    'cli': "import cli",
+    'gui (main + ui)': "import tkinterdnd2, ui",
+}
+
+
+def time_import(statement, runs):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', statement], cwd=PROJECT_ROOT,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        elapsed = time.perf_counter() - start
+        if result.returncode != 0:
+            return None, result.stderr.decode(errors='replace').strip().splitlines()[-1]
+        best = elapsed if best is None else min(best, elapsed)
+    return best, None
+
+
+def check_cli_is_headless():
+    """Return the GUI modules that get imported along with `cli` (should be none)."""
+    probe = (
+        "import sys, cli\n"
+        f"print(','.join(m for m in {GUI_MODULES!r} if m in sys.modules))"
+    )
+    output = subprocess.check_output([sys.executable, '-c', probe], cwd=PROJECT_ROOT)
+    return [m for m in output.decode().strip().split(',') if m]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    leaked = check_cli_is_headless()
+    print(f"GUI modules imported by cli: {', '.join(leaked) if leaked else 'none'}")
+
+    results = {}
+    for name, statement in TARGETS.items():
+        best, error = time_import(statement, args.runs)
+        results[name] = best
+        if best is None:
+            print(f"{name:<20} unavailable ({error})")
+        else:
+            print(f"{name:<20} {best * 1000:8.1f} ms")
+
+    if results.get('cli') and results.get('gui (main + ui)'):
+        print(f"cli starts {results['gui (main + ui)'] / results['cli']:.1f}x faster than the GUI")
+
+
+if __name__ == '__main__':
+    main()
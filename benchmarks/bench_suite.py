@@ -0,0 +1,212 @@
+"""
+Benchmark suite: time every phase of a snapshot on a synthetic project and compare with a baseline.
+
+Usage:
+    python benchmarks/bench_suite.py [--repeat 3] [--json results.json]
+                                     [--baseline baseline.json] [--threshold 0.15]
+                                     [--save-baseline baseline.json] [--keep DIR]
+                                     [generator options, see synthetic_repo.py]
+
+The project is generated by synthetic_repo.py, so the same options give the same
+tree on every machine. Each phase (scan, ignore matching, tree building, combine,
+incremental combine) is run --repeat times and its median wall time is kept; one
+more run under tracemalloc records its peak traced memory. Results are printed as
+a table and can be written as JSON. With --baseline, every phase slower or larger
+than the baseline by more than --threshold is flagged and the exit status is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from scanner import FileScanner  # noqa: E402
+from tree_builder import TreeBuilder  # noqa: E402
+from combiner import FileCombiner  # noqa: E402
+import synthetic_repo  # noqa: E402
+
+RESULTS_VERSION = 1
+# Differences below these are noise, whatever the ratio
+MIN_REGRESSION_SECONDS = 0.005
+MIN_REGRESSION_BYTES = 64 * 1024
+
+
+class Suite:
+    """The phases, sharing the results of the scan they all depend on."""
+
+    def __init__(self, project, workdir):
+        self.project = project
+        self.output = os.path.join(workdir, 'codebase.txt')
+        self.scanner = None
+        self.scan_result = None
+
+    def scan(self):
+        # Without the classification cache every run sniffs like a first scan
+        self.scanner = FileScanner(self.project, use_classification_cache=False)
+        self.scan_result = self.scanner.scan()
+
+    def ignore(self):
+        rules = self.scanner.ignore_rules
+        directories = self.scanner.directories
+        for rel_path in self.scan_result[2]:
+            rules.is_ignored(rel_path, is_dir=rel_path in directories)
+
+    def tree(self):
+        _, ignored_items, all_files = self.scan_result
+        ignored_dirs = [item for item in ignored_items if item[2] == "directory"]
+        TreeBuilder().build_tree(self.project, ignored_dirs, all_files, directories=self.scanner.directories)
+
+    def tree_listings(self):
+        for _ in TreeBuilder().iter_tree_lines(self.scanner.tree):
+            pass
+
+    def combine(self):
+        self._combine(incremental=False)
+
+    def prepare_combine_incremental(self):
+        # Leaves an output and manifest behind for the timed run to reuse
+        self._combine(incremental=True)
+
+    def combine_incremental(self):
+        self._combine(incremental=True)
+
+    def _combine(self, incremental):
+        text_files, ignored_items, all_files = self.scan_result
+        combiner = FileCombiner(self.project, output_file=self.output, incremental=incremental)
+        success, message, _ = combiner.combine(text_files, ignored_items, self.scanner.ignore_rules, all_files,
+                                               scan_tree=self.scanner.tree)
+        if not success:
+            raise RuntimeError(message)
+
+
+PHASES = ['scan', 'ignore', 'tree', 'tree_listings', 'combine', 'combine_incremental']
+
+
+def measure(suite, phase, repeat, trace_memory):
+    prepare = getattr(suite, 'prepare_' + phase, None)
+    run = getattr(suite, phase)
+    times = []
+    for _ in range(repeat):
+        if prepare:
+            prepare()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    result = {'seconds': statistics.median(times), 'runs': times}
+    if trace_memory:
+        if prepare:
+            prepare()
+        tracemalloc.start()
+        run()
+        result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+
+def compare(results, baseline, threshold):
+    """Print the change per phase against the baseline; returns the list of regressed phases."""
+    if baseline.get('config') != results['config']:
+        print("warning: the baseline was recorded with different generator options")
+    regressions = []
+    print(f"\n{'phase':<20} {'baseline':>10} {'current':>10} {'change':>8}   memory change")
+    for phase, current in results['phases'].items():
+        previous = baseline.get('phases', {}).get(phase)
+        if previous is None:
+            continue
+        change = current['seconds'] / previous['seconds'] - 1 if previous['seconds'] else 0.0
+        slower = change > threshold and current['seconds'] - previous['seconds'] > MIN_REGRESSION_SECONDS
+        memory_text = ''
+        larger = False
+        if 'peak_bytes' in current and previous.get('peak_bytes'):
+            memory_change = current['peak_bytes'] / previous['peak_bytes'] - 1
+            larger = memory_change > threshold and current['peak_bytes'] - previous['peak_bytes'] > MIN_REGRESSION_BYTES
+            memory_text = f"{memory_change * 100:+7.1f}%"
+        flag = '  REGRESSION' if slower or larger else ''
+        print(f"{phase:<20} {previous['seconds']:9.3f}s {current['seconds']:9.3f}s {change * 100:+7.1f}%   "
+              f"{memory_text}{flag}")
+        if flag:
+            regressions.append(phase)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per phase (default: 3)")
+    parser.add_argument('--phases', default=','.join(PHASES), help="Comma-separated phases to run")
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help="Skip the extra tracemalloc run per phase")
+    parser.add_argument('--json', help="Write the results to this file")
+    parser.add_argument('--baseline', help="Compare with results saved earlier")
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help="Relative slowdown or memory growth flagged as a regression (default: 0.15)")
+    parser.add_argument('--save-baseline', help="Also write the results to this file as the new baseline")
+    parser.add_argument('--keep', help="Generate the project in this directory and keep it; "
+                                       "an existing non-empty directory is reused as-is")
+    synthetic_repo.add_arguments(parser)
+    args = parser.parse_args()
+
+    config = synthetic_repo.config_from_args(args)
+    workdir = tempfile.mkdtemp(prefix='bench_suite_')
+    project = args.keep or os.path.join(workdir, 'project')
+    try:
+        os.makedirs(project, exist_ok=True)
+        start = time.perf_counter()
+        if os.listdir(project):
+            summary = None
+            print(f"Reusing {project}")
+        else:
+            summary = synthetic_repo.generate_repo(project, **config)
+            print(f"Generated {summary['files']} files in {summary['directories']} directories "
+                  f"({summary['bytes'] / 1024 / 1024:.1f} MB) in {time.perf_counter() - start:.1f} s")
+
+        suite = Suite(project, workdir)
+        results = {
+            'version': RESULTS_VERSION,
+            'timestamp': time.strftime("%Y-%m-%d %H:%M:%S"),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'config': config,
+            'tree': summary,
+            'phases': {},
+        }
+        print(f"{'phase':<20} {'median':>10} {'peak memory':>14}")
+        # Later phases use the scan's results, so it always runs first
+        selected = args.phases.split(',')
+        for phase in PHASES:
+            if phase not in selected:
+                if phase == 'scan':
+                    suite.scan()
+                continue
+            result = measure(suite, phase, args.repeat, args.memory)
+            results['phases'][phase] = result
+            peak = f"{result['peak_bytes'] / 1024 / 1024:11.1f} MB" if 'peak_bytes' in result else ''
+            print(f"{phase:<20} {result['seconds']:9.3f}s {peak}")
+
+        for path in (args.json, args.save_baseline):
+            if path:
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump(results, f, indent=1)
+
+        if args.baseline:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+            regressions = compare(results, baseline, args.threshold)
+            if regressions:
+                print(f"\n{len(regressions)} phase(s) regressed by more than {args.threshold * 100:.0f}%: "
+                      f"{', '.join(regressions)}")
+                return 1
+        return 0
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""
+Compare building the project tree from path strings with rendering the scanner's listings.
+
+Usage:
+    python benchmarks/bench_tree.py [--entries 200000] [--keep DIR]
+
+TreeBuilder.build_tree splits every relative path and builds a nested dict
+before rendering one big string; TreeBuilder.iter_tree_lines walks the
+ScanTree recorded during the scan and yields lines. Time and peak traced
+memory are reported for both, and the rendered trees are checked for equality.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_scan import generate_tree  # noqa: E402
+from scanner import FileScanner  # noqa: E402
+from tree_builder import TreeBuilder  # noqa: E402
+
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--entries', type=int, default=200000)
+    parser.add_argument('--keep', help="Generate the tree in this directory and keep it")
+    args = parser.parse_args()
+
+    project = args.keep or tempfile.mkdtemp(prefix='bench_tree_')
+    os.makedirs(project, exist_ok=True)
+    try:
+        if not os.listdir(project):
+            print(f"Generating ~{args.entries} entries in {project} ...")
+            generate_tree(project, args.entries)
+
+        scanner = FileScanner(project)
+        _, ignored_items, all_files = scanner.scan()
+        ignored_dirs = [item for item in ignored_items if item[2] == "directory"]
+        builder = TreeBuilder()
+
+        results = {}
+        variants = (
+            ('build_tree', lambda: builder.build_tree(project, ignored_dirs, all_files,
+                                                      directories=scanner.directories)),
+            # Writing the lines to a sink is what the combiner does; count them instead of joining
+            ('iter_tree_lines', lambda: sum(1 for _ in builder.iter_tree_lines(scanner.tree))),
+        )
+        for name, func in variants:
+            elapsed, peak, _ = measure(func)
+            results[name] = elapsed
+            print(f"{name:<16} {elapsed:7.3f} s  peak traced memory {peak / 1024 / 1024:8.1f} MB")
+
+        identical = builder.build_tree(project, ignored_dirs, all_files, directories=scanner.directories) \
+            == '\n'.join(builder.iter_tree_lines(scanner.tree))
+        print(f"{len(all_files)} entries, speed-up: {results['build_tree'] / results['iter_tree_lines']:.2f}x, "
+              f"identical tree: {identical}")
+    finally:
+        if not args.keep:
+            shutil.rmtree(project, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+Check that attaching the UI's progress reporting doesn't slow a run down.
+
+Usage:
+    python benchmarks/bench_ui_progress.py [--files 20000] [--repeat 5] [--tolerance 0.05]
+                                           [generator options, see synthetic_repo.py]
+
+A synthetic project of small files is generated, so the combiner reports
+progress for every one of many files. Runs alternate between headless (no-op
+callbacks) and attached: the callbacks update a ProgressState that is polled
+every PROGRESS_FRAME_MS, by the real CodebaseTrackerUI when Tk, tkinterdnd2 and
+a display are available, otherwise by a thread doing the same polls. The median
+throughput of both is reported, together with the log lines the poller saw and
+the log ring's size. The exit status is 1 if the attached runs are slower by
+more than --tolerance.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from processor import ProjectProcessor  # noqa: E402
+from progress import ProgressState  # noqa: E402
+import synthetic_repo  # noqa: E402
+
+# The UI's frame interval, without importing ui (and Tk) when it can't be used
+PROGRESS_FRAME_MS = 50
+
+
+def run(project, output, scan_callback, combine_callback):
+    processor = ProjectProcessor(project, output_file=output, incremental=False)
+    start = time.perf_counter()
+    success, message, stats = processor.run(scan_callback, combine_callback, threading.Event())
+    elapsed = time.perf_counter() - start
+    if not success:
+        raise RuntimeError(message)
+    return elapsed, stats
+
+
+def run_headless(project, output):
+    elapsed, stats = run(project, output, lambda m, p: None, lambda m, p: None)
+    return elapsed, stats, None
+
+
+def run_with_poller(project, output):
+    """ProgressState polled from a thread at the UI's frame rate, for machines without a display."""
+    state = ProgressState()
+    done = threading.Event()
+    seen = {'version': 0, 'line': 0, 'received': 0, 'frames': 0}
+
+    def poll():
+        while not done.wait(PROGRESS_FRAME_MS / 1000):
+            update = state.poll(seen['version'], seen['line'])
+            if update is not None:
+                seen['version'], _, _, lines, seen['line'], _ = update
+                seen['received'] += len(lines)
+                seen['frames'] += 1
+
+    poller = threading.Thread(target=poll, daemon=True)
+    poller.start()
+    try:
+        elapsed, stats = run(project, output, state.update, state.update)
+    finally:
+        done.set()
+        poller.join()
+    return elapsed, stats, (seen['frames'], seen['received'], state.log_lines)
+
+
+def make_ui_runner():
+    """A runner driving the real CodebaseTrackerUI, or None if Tk can't be used here."""
+    try:
+        import tkinter as tk
+        from tkinterdnd2 import TkinterDnD
+        import ui
+        root = TkinterDnD.Tk()
+    except Exception as e:
+        print(f"Tk UI unavailable ({e}); polling from a thread instead")
+        return None
+    app = ui.CodebaseTrackerUI(root)
+
+    def run_with_ui(project, output):
+        result = {}
+
+        def work():
+            try:
+                result['run'] = run(project, output, app._scan_callback, app._combine_callback)
+            except Exception as e:
+                result['error'] = e
+
+        def wait():
+            if worker.is_alive():
+                root.after(PROGRESS_FRAME_MS, wait)
+            else:
+                root.quit()
+
+        app.progress_state.reset()
+        worker = threading.Thread(target=work, daemon=True)
+        worker.start()
+        root.after(PROGRESS_FRAME_MS, wait)
+        root.mainloop()
+        if 'error' in result:
+            raise result['error']
+        # Let the last frame through so the log widget holds the final lines
+        root.update()
+        time.sleep(PROGRESS_FRAME_MS / 1000)
+        root.update()
+        lines = int(app.log_text.index(tk.END).split('.')[0]) - 2
+        elapsed, stats = result['run']
+        return elapsed, stats, (None, lines, app.progress_state.log_lines)
+
+    return run_with_ui
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per mode (default: 5)")
+    parser.add_argument('--tolerance', type=float, default=0.05,
+                        help="Allowed relative slowdown of the attached runs (default: 0.05)")
+    parser.add_argument('--no-tk', dest='tk', action='store_false', help="Always poll from a thread")
+    synthetic_repo.add_arguments(parser)
+    parser.set_defaults(files=20000, median_kb=0.5, binary_ratio=0.0, size_sigma=0.8)
+    args = parser.parse_args()
+
+    attached = (make_ui_runner() if args.tk else None) or run_with_poller
+    workdir = tempfile.mkdtemp(prefix='bench_ui_progress_')
+    try:
+        project = os.path.join(workdir, 'project')
+        os.makedirs(project)
+        summary = synthetic_repo.generate_repo(project, **synthetic_repo.config_from_args(args))
+        print(f"Generated {summary['files']} files ({summary['bytes'] / 1024 / 1024:.1f} MB)")
+        output = os.path.join(workdir, 'codebase.txt')
+
+        # Warm the page cache and the classification cache
+        run_headless(project, output)
+        times = {'headless': [], 'attached': []}
+        for number in range(args.repeat):
+            # Alternate the order so drift affects both modes alike
+            modes = [('headless', run_headless), ('attached', attached)]
+            for name, runner in modes if number % 2 == 0 else reversed(modes):
+                elapsed, stats, seen = runner(project, output)
+                times[name].append(elapsed)
+                if seen is not None:
+                    frames, lines, ring = seen
+                    print(f"  attached run {number + 1}: {elapsed:.3f}s, {lines} log lines reached the UI "
+                          f"(ring of {ring})" + (f" in {frames} frames" if frames is not None else ""))
+
+        files = stats['text_files']
+        headless = statistics.median(times['headless'])
+        attached_time = statistics.median(times['attached'])
+        change = attached_time / headless - 1
+        print(f"{'mode':<10} {'median':>9} {'files/s':>10}")
+        print(f"{'headless':<10} {headless:8.3f}s {files / headless:10,.0f}")
+        print(f"{'attached':<10} {attached_time:8.3f}s {files / attached_time:10,.0f}")
+        print(f"attached slowdown: {change * 100:+.1f}% (tolerance {args.tolerance * 100:.0f}%)")
+        return 1 if change > args.tolerance else 0
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
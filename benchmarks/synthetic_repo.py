@@ -0,0 +1,167 @@
+"""
+Deterministic synthetic project trees for benchmarks.
+
+Usage:
+    python benchmarks/synthetic_repo.py DIR [--files 10000] [--depth 6] [--seed 1] ...
+
+The same options and seed always produce the same tree: names, contents, sizes
+and modification times. Directories are attached at random below existing ones
+up to --depth levels; a share of them get names the default ignore patterns
+prune (node_modules/, build/, ...) and a share get their own .gitignore.
+File sizes follow a log-normal distribution around --median-kb, and a share
+of files is binary, some with extensions that force content sniffing.
+"""
+import argparse
+import math
+import os
+import random
+
+# Names from DEFAULT_IGNORE_PATTERNS, so the scanner prunes them
+IGNORED_DIR_NAMES = ['node_modules', 'build', 'dist', '__pycache__', 'vendor', 'target']
+TEXT_EXTENSIONS = ['.py', '.js', '.ts', '.md', '.json', '.txt', '.css', '']
+# '.dat' and '' are unknown extensions, so their files are classified by sniffing
+BINARY_EXTENSIONS = ['.png', '.jpg', '.zip', '.dat', '']
+# Every nested .gitignore ignores these files and re-includes one of them
+NESTED_GITIGNORE = "*.cache.txt\n!keep*.cache.txt\nlocal/\n"
+# All generated files get this modification time, far outside the racy window
+FIXED_MTIME = 1_600_000_000
+
+DEFAULTS = {
+    'files': 10000,
+    'depth': 6,
+    'files_per_dir': 16,
+    'binary_ratio': 0.1,
+    'median_kb': 2.0,
+    'size_sigma': 1.2,
+    'max_kb': 2048,
+    'ignored_dir_ratio': 0.05,
+    'gitignore_ratio': 0.05,
+    'seed': 1,
+}
+
+_WORDS = ['value', 'result', 'config', 'handler', 'request', 'buffer', 'index', 'offset', 'items',
+          'context', 'render', 'update', 'status', 'token', 'stream', 'parser', 'cache', 'layout']
+
+
+def add_arguments(parser):
+    """Add one option per generator setting, named after the keys of DEFAULTS."""
+    parser.add_argument('--files', type=int, default=DEFAULTS['files'], help="Number of files")
+    parser.add_argument('--depth', type=int, default=DEFAULTS['depth'], help="Maximum directory depth")
+    parser.add_argument('--files-per-dir', type=int, default=DEFAULTS['files_per_dir'],
+                        help="Average files per directory, which sets the number of directories")
+    parser.add_argument('--binary-ratio', type=float, default=DEFAULTS['binary_ratio'],
+                        help="Share of binary files")
+    parser.add_argument('--median-kb', type=float, default=DEFAULTS['median_kb'], help="Median file size")
+    parser.add_argument('--size-sigma', type=float, default=DEFAULTS['size_sigma'],
+                        help="Spread of the log-normal file size distribution")
+    parser.add_argument('--max-kb', type=int, default=DEFAULTS['max_kb'], help="Largest file size")
+    parser.add_argument('--ignored-dir-ratio', type=float, default=DEFAULTS['ignored_dir_ratio'],
+                        help="Share of directories named like ignored ones (node_modules/, build/, ...)")
+    parser.add_argument('--gitignore-ratio', type=float, default=DEFAULTS['gitignore_ratio'],
+                        help="Share of directories with a nested .gitignore")
+    parser.add_argument('--seed', type=int, default=DEFAULTS['seed'])
+
+
+def config_from_args(args):
+    return {key: getattr(args, key) for key in DEFAULTS}
+
+
+def generate_repo(root, **options):
+    """
+    Create the tree described by `options` (see DEFAULTS) under root, which should be empty.
+    Returns a summary dict: files, directories, bytes, binary files, .gitignore files.
+    """
+    config = dict(DEFAULTS, **options)
+    rng = random.Random(config['seed'])
+    text_pool = _text_pool(rng)
+    binary_pool = bytes(rng.randrange(256) for _ in range(64 * 1024))
+    summary = {'files': 0, 'directories': 0, 'bytes': 0, 'binary_files': 0, 'gitignore_files': 0}
+
+    # Directories: (relative path, depth); each new one goes below a random shallower one
+    directories = [('', 0)]
+    names_used = set()
+    for number in range(max(config['files'] // max(config['files_per_dir'], 1), 1)):
+        parent, depth = rng.choice(directories)
+        if depth >= config['depth']:
+            parent, depth = directories[0]
+        if rng.random() < config['ignored_dir_ratio']:
+            name = rng.choice(IGNORED_DIR_NAMES)
+        else:
+            name = f"{rng.choice(_WORDS)}{number}"
+        path = os.path.join(parent, name)
+        if path in names_used:
+            continue
+        names_used.add(path)
+        os.makedirs(os.path.join(root, path), exist_ok=True)
+        directories.append((path, depth + 1))
+        summary['directories'] += 1
+        if rng.random() < config['gitignore_ratio']:
+            _write(os.path.join(root, path, '.gitignore'), NESTED_GITIGNORE.encode('ascii'), summary)
+            summary['gitignore_files'] += 1
+
+    median = config['median_kb'] * 1024
+    max_size = config['max_kb'] * 1024
+    for number in range(config['files']):
+        directory = rng.choice(directories)[0]
+        size = min(int(math.exp(rng.gauss(math.log(median), config['size_sigma']))), max_size)
+        if rng.random() < config['binary_ratio']:
+            extension = rng.choice(BINARY_EXTENSIONS)
+            data = _slice(binary_pool, rng, size)
+            # Binary content: NUL bytes make the sniffer reject it
+            data = b'\0' + data[1:] if data else b'\0'
+            summary['binary_files'] += 1
+        else:
+            extension = rng.choice(TEXT_EXTENSIONS)
+            data = _slice(text_pool, rng, size)
+        kind = rng.random()
+        if kind < 0.02:
+            name = f"{'file' if kind < 0.015 else 'keep'}{number}.cache.txt"
+        else:
+            name = f"{rng.choice(_WORDS)}_{number}{extension}"
+        _write(os.path.join(root, directory, name), data, summary)
+        summary['files'] += 1
+
+    for directory, _ in directories:
+        os.utime(os.path.join(root, directory), (FIXED_MTIME, FIXED_MTIME))
+    return summary
+
+
+def _text_pool(rng, size=1024 * 1024):
+    lines = []
+    total = 0
+    while total < size:
+        line = f"    {rng.choice(_WORDS)}_{rng.randrange(1000)} = {rng.choice(_WORDS)}({rng.randrange(100000)})\n"
+        lines.append(line)
+        total += len(line)
+    return ''.join(lines).encode('ascii')
+
+
+def _slice(pool, rng, size):
+    """`size` bytes taken from the pool at a random offset, repeating it for large sizes."""
+    if size <= 0:
+        return b''
+    start = rng.randrange(len(pool))
+    data = pool[start:start + size]
+    while len(data) < size:
+        data += pool[:size - len(data)]
+    return data
+
+
+def _write(path, data, summary):
+    with open(path, 'wb') as f:
+        f.write(data)
+    os.utime(path, (FIXED_MTIME, FIXED_MTIME))
+    summary['bytes'] += len(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('root', help="Directory to create the tree in")
+    add_arguments(parser)
+    args = parser.parse_args()
+    os.makedirs(args.root, exist_ok=True)
+    print(generate_repo(args.root, **config_from_args(args)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+import json
+import os
+import sys
+import threading
+import time
+from manifest import RACY_WINDOW_NS
+
+CLASSIFICATION_CACHE_VERSION = 1
+CLASSIFICATION_CACHE_FILENAME = "classification_cache.json"
+# Upper bound on cached files, which keeps the JSON file a few MB at most
+DEFAULT_MAX_ENTRIES = 200_000
+# Upper bound on sniffed bytes held for the combiner between scan and combine
+DEFAULT_SNIFFED_BYTES = 32 * 1024 * 1024
+
+
+class ClassificationCache:
+    """
+    Persistent text/binary verdicts for files that had to be sniffed, stored in .codebase/.
+
+    Entries are keyed by relative path and only trusted while the file's size and
+    mtime_ns are unchanged and the file wasn't modified within RACY_WINDOW_NS of the
+    scan that recorded it. Only entries seen by the current scan are saved, so deleted
+    files drop out, and at most max_entries files are kept.
+    """
+
+    def __init__(self, cache_dir, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = os.path.join(cache_dir, CLASSIFICATION_CACHE_FILENAME)
+        self.max_entries = max_entries
+        self.created_ns = time.time_ns()
+        self.previous = {}
+        self.previous_created_ns = 0
+        self.files = {}
+        self.hits = 0
+
+    def load(self):
+        self.previous = {}
+        self.files = {}
+        self.hits = 0
+        self.created_ns = time.time_ns()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == CLASSIFICATION_CACHE_VERSION:
+                self.previous = data.get('files', {})
+                self.previous_created_ns = data.get('created_ns', 0)
+        except (OSError, ValueError, AttributeError):
+            self.previous = {}
+
+    def get(self, relative_path, stat_result):
+        """Return the cached verdict (True = text) for an unchanged file, else None."""
+        entry = self.previous.get(relative_path)
+        if (entry is None or entry[0] != stat_result.st_size or entry[1] != stat_result.st_mtime_ns or
+                stat_result.st_mtime_ns >= self.previous_created_ns - RACY_WINDOW_NS):
+            return None
+        self.hits += 1
+        self.put(relative_path, stat_result, entry[2])
+        return entry[2]
+
+    def retain(self, relative_path):
+        """Carry an entry over for a file the scan replayed from an earlier result instead of sniffing."""
+        entry = self.previous.get(relative_path)
+        if entry is not None and len(self.files) < self.max_entries:
+            self.files[relative_path] = entry
+
+    def put(self, relative_path, stat_result, is_text):
+        if len(self.files) < self.max_entries:
+            self.files[relative_path] = [stat_result.st_size, stat_result.st_mtime_ns, is_text]
+
+    def save(self):
+        """Write the entries seen by this scan; errors only cost the next scan its cache hits."""
+        data = {
+            'version': CLASSIFICATION_CACHE_VERSION,
+            'created_ns': self.created_ns,
+            'files': self.files,
+        }
+        # Unique per writer: runs on the same project in other threads or processes save too
+        tmp_path = f"{self.path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Error saving classification cache: {e}", file=sys.stderr)
+
+
+class SniffedChunks:
+    """
+    First bytes of text files read by the scanner while classifying them, handed over
+    to the combiner so it doesn't read them a second time. Thread-safe, since the
+    scanner and the combiner's read-ahead workers run concurrently in streaming mode.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_SNIFFED_BYTES):
+        self.max_bytes = max_bytes
+        self._chunks = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, relative_path, stat_result, chunk):
+        # Recently modified files may change again within the same mtime tick
+        if stat_result.st_mtime_ns >= time.time_ns() - RACY_WINDOW_NS:
+            return
+        with self._lock:
+            if self._bytes + len(chunk) > self.max_bytes or relative_path in self._chunks:
+                return
+            self._chunks[relative_path] = (stat_result.st_size, stat_result.st_mtime_ns, chunk)
+            self._bytes += len(chunk)
+
+    def take(self, relative_path, stat_result):
+        """
+        Remove and return the chunk for a path if the file still has the size and mtime
+        it had when it was sniffed, else None.
+        """
+        with self._lock:
+            item = self._chunks.pop(relative_path, None)
+            if item is None:
+                return None
+            self._bytes -= len(item[2])
+        size, mtime_ns, chunk = item
+        if size != stat_result.st_size or mtime_ns != stat_result.st_mtime_ns:
+            return None
+        return chunk
+
+    def clear(self):
+        with self._lock:
+            self._chunks.clear()
+            self._bytes = 0
@@ -0,0 +1,184 @@
+"""
+Headless command-line entry point.
+
+This module must never import `ui`, `tkinter` or `tkinterdnd2` so it can run
+on CI runners, cron jobs and containers without a display.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+from processor import ProjectProcessor
+from output_writer import COMPRESSION_CODECS
+from profiler import summary_line
+from progress import StderrProgress
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="codebase-tracker",
+        description="Scan a project and combine its text files into a single snapshot file."
+    )
+    parser.add_argument("project_path", help="Root directory of the project to scan")
+    parser.add_argument("-o", "--output",
+                        help="Output file (default: <project>/.codebase/codebase.txt)")
+    add_processor_arguments(parser)
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and regenerate the output whenever project files change")
+    parser.add_argument("--debounce-ms", type=int, default=300, metavar="MS",
+                        help="With --watch, wait for changes to settle this long before regenerating "
+                             "(default: 300)")
+    parser.add_argument("--poll", action="store_true",
+                        help="With --watch, poll modification times instead of using inotify")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="Do not print progress messages to stderr")
+    return parser
+
+
+def add_processor_arguments(parser):
+    """The options that configure a ProjectProcessor, shared with the batch entry point."""
+    parser.add_argument("--no-incremental", dest="incremental", action="store_false",
+                        help="Re-read every file instead of reusing unchanged segments of the previous output")
+    parser.add_argument("--stream", action="store_true",
+                        help="Pipeline scanning and combining instead of scanning the whole tree first")
+    parser.add_argument("-j", "--read-workers", type=int, default=0, metavar="N",
+                        help="Read N files ahead of the writer on a thread pool (default: 0, sequential)")
+    parser.add_argument("--read-ahead-mb", type=int, default=64, metavar="MB",
+                        help="Cap on file bytes held by the read-ahead stage (default: 64)")
+    parser.add_argument("--max-file-memory-mb", type=int, default=8, metavar="MB",
+                        help="Copy files larger than this in chunks instead of reading them whole (default: 8)")
+    parser.add_argument("--max-file-size-kb", type=int, metavar="KB",
+                        help="Skip files larger than this, judged from their size alone")
+    parser.add_argument("--max-output-mb", type=int, metavar="MB",
+                        help="Cap the file contents section; the file crossing the cap is truncated "
+                             "and later files are omitted")
+    parser.add_argument("--git-index", action="store_true",
+                        help="In git repositories, take the file list from .git/index instead of walking "
+                             "the tree (falls back to the walk elsewhere)")
+    parser.add_argument("--untracked", action="store_true",
+                        help="With --git-index, also include untracked files that aren't ignored")
+    parser.add_argument("--dedupe", action="store_true",
+                        help="Write identical files once; later copies get a '(same as other/path)' reference")
+    parser.add_argument("--delta", action="store_true",
+                        help="Write only the files added or modified since the last snapshot, plus the deleted "
+                             "paths, to codebase.delta.txt next to it")
+    parser.add_argument("--delta-base", metavar="SNAPSHOT",
+                        help="With --delta, compare against this snapshot (or its .manifest.json) instead")
+    parser.add_argument("--skip-generated", action="store_true",
+                        help="Skip files that look minified or generated (very long lines, *.min.js, ...)")
+    shard_group = parser.add_mutually_exclusive_group()
+    shard_group.add_argument("--shard-kb", type=int, metavar="KB",
+                             help="Also split the output into <name>.part-NNN files of at most KB kilobytes")
+    shard_group.add_argument("--shard-tokens", type=int, metavar="N",
+                             help="Also split the output into <name>.part-NNN files of about N tokens at most")
+    parser.add_argument("--compress", choices=sorted(COMPRESSION_CODECS),
+                        help="Compress the output as it is written (adds .gz, .xz or .bz2 to its name)")
+    parser.add_argument("--compress-level", type=int, metavar="N",
+                        help="Compression level: 1-9 for gzip and bz2, 0-9 for xz (default: 6, 6, 9)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Record per-phase timings and I/O counters in .codebase/profile.json")
+
+
+def processor_options(args):
+    """ProjectProcessor keyword arguments from the options of add_processor_arguments()."""
+    return dict(
+        streaming=args.stream,
+        incremental=args.incremental,
+        read_workers=args.read_workers,
+        read_ahead_bytes=args.read_ahead_mb * 1024 * 1024,
+        max_file_memory=args.max_file_memory_mb * 1024 * 1024,
+        max_file_size=args.max_file_size_kb * 1024 if args.max_file_size_kb is not None else None,
+        max_output_bytes=args.max_output_mb * 1024 * 1024 if args.max_output_mb is not None else None,
+        skip_generated=args.skip_generated,
+        dedupe=args.dedupe,
+        delta=args.delta,
+        delta_base=args.delta_base,
+        git_index=args.git_index,
+        untracked=args.untracked,
+        shard_bytes=args.shard_kb * 1024 if args.shard_kb else None,
+        shard_tokens=args.shard_tokens,
+        compression=args.compress,
+        compression_level=args.compress_level,
+        profile=args.profile,
+    )
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.compress and (args.shard_kb or args.shard_tokens):
+        parser.error("--compress can't be combined with --shard-kb or --shard-tokens")
+
+    if not os.path.isdir(args.project_path):
+        print(f"Error: not a directory: {args.project_path}", file=sys.stderr)
+        return 2
+
+    progress = StderrProgress(quiet=args.quiet)
+    cancel_event = threading.Event()
+    processor = ProjectProcessor(
+        args.project_path,
+        output_file=args.output,
+        keep_scan_records=args.watch,
+        **processor_options(args)
+    )
+
+    try:
+        success, message, stats = processor.run(progress, progress, cancel_event)
+    except KeyboardInterrupt:
+        cancel_event.set()
+        print("Cancelled.", file=sys.stderr)
+        return 130
+
+    if not success:
+        print(f"Error: {message}", file=sys.stderr)
+        return 1
+
+    if not args.quiet:
+        print(f"{message} Total characters: {stats.get('total_chars', 0):,}", file=sys.stderr)
+        if 'shards' in stats:
+            print(f"Wrote {stats['shards']} shards, index: {stats['shard_index']}", file=sys.stderr)
+        if 'profile' in stats:
+            print(f"Profile: {summary_line(stats['profile'])}\n  written to {stats['profile_file']}", file=sys.stderr)
+        if 'delta_added' in stats:
+            print(f"Delta: {stats['delta_added']} added, {stats['delta_modified']} modified, "
+                  f"{stats['delta_deleted']} deleted, {stats['delta_unchanged']} unchanged", file=sys.stderr)
+        if stats.get('deduplicated_files'):
+            print(f"Deduplicated {stats['deduplicated_files']} files, saving {stats['dedup_saved_bytes']:,} bytes",
+                  file=sys.stderr)
+        if args.compress:
+            print(f"Compressed {stats['raw_bytes']:,} bytes to {stats['compressed_bytes']:,} bytes "
+                  f"({args.compress})", file=sys.stderr)
+    # The output path is the only thing written to stdout so scripts can capture it
+    print(stats.get('output_file', processor.combiner.output_file), flush=True)
+    if args.watch:
+        return watch(processor, args, progress, cancel_event)
+    return 0
+
+
+def watch(processor, args, progress, cancel_event):
+    """Regenerate on every change until interrupted."""
+    # Imported here so runs without --watch don't load ctypes and the inotify bindings
+    from watcher import ProjectWatcher
+
+    def report(success, message, stats, changes):
+        if not success:
+            print(f"Error: {message}", file=sys.stderr)
+        elif not args.quiet:
+            print(f"{time.strftime('%H:%M:%S')} {changes} change(s): {message} "
+                  f"Reused {stats.get('reused_files', 0)} unchanged files.", file=sys.stderr)
+
+    watcher = ProjectWatcher(processor, debounce=args.debounce_ms / 1000, polling=args.poll)
+    if not args.quiet:
+        print("Watching for changes, press Ctrl+C to stop.", file=sys.stderr)
+    quiet = StderrProgress(quiet=True)
+    try:
+        watcher.run(cancel_event, quiet, quiet, on_result=report)
+    except KeyboardInterrupt:
+        cancel_event.set()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
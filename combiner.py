@@ -1,146 +1,852 @@
+import io
 import os
 import time
+import codecs
+import hashlib
 from pathlib import Path
-from file_utils import ensure_directory
+from file_utils import (ensure_directory, decode_text, is_generated_name, detect_generated, temp_path,
+                        GENERATED_SAMPLE_SIZE)
 from tree_builder import TreeBuilder
+from output_writer import OutputWriter, compression_suffix
+from manifest import SnapshotManifest
+from read_ahead import iter_read_ahead
+from output_budget import OutputBudget
+from sharding import ShardWriter
+from profiler import profiled
+from delta import SnapshotDelta, delta_output_path
+from snapshot_index import LineCounter, count_lines, write_snapshot_index, discard_snapshot_index
+
+COPY_CHUNK_SIZE = 1024 * 1024
+DEFAULT_READ_AHEAD_BYTES = 64 * 1024 * 1024
+# Files larger than this are copied in COPY_CHUNK_SIZE pieces instead of being read whole
+DEFAULT_MAX_FILE_MEMORY = 8 * 1024 * 1024
+# Valid UTF-8 without '\r' is already in output form, unless newlines must be translated
+DIRECT_COPY = os.linesep == '\n'
+# Tree lines joined per write call
+TREE_WRITE_BATCH = 1024
+# Room kept for the marker when a file is truncated by the output size limit
+TRUNCATION_MARKER_RESERVE = 128
 
 
 class FileCombiner:
-    def __init__(self, project_path):
+    def __init__(self, project_path, output_file=None, incremental=True,
+                 read_workers=0, read_ahead_bytes=DEFAULT_READ_AHEAD_BYTES, sniffed_chunks=None,
+                 max_file_memory=DEFAULT_MAX_FILE_MEMORY, max_output_bytes=None, skip_generated=False,
+                 shard_bytes=None, shard_tokens=None, compression=None, compression_level=None, dedupe=False,
+                 delta=False, delta_base=None):
         self.project_path = Path(project_path).absolute()
-        self.output_dir = self.project_path / '.codebase'
-        self.output_file = self.output_dir / 'codebase.txt'
+        # 'gzip', 'xz' or 'bz2': the output is compressed as it is written and named with the codec's suffix
+        self.compression = compression
+        self.compression_level = compression_level
+        suffix = compression_suffix(compression)
+        if output_file:
+            self.output_file = Path(output_file).absolute()
+            if suffix and self.output_file.suffix != suffix:
+                self.output_file = self.output_file.with_name(self.output_file.name + suffix)
+            self.output_dir = self.output_file.parent
+        else:
+            self.output_dir = self.project_path / '.codebase'
+            self.output_file = self.output_dir / ('codebase.txt' + suffix)
+        # Delta mode writes only the files added or modified since an earlier snapshot (by default
+        # the one at output_file, else delta_base), and lists the deleted ones, to <stem>.delta.txt
+        self.delta = None
+        if delta:
+            # Compressed snapshots keep no manifest, so the default base is the uncompressed one
+            base_file = self.output_file.with_name(self.output_file.name[:len(self.output_file.name) - len(suffix)])
+            self.delta = SnapshotDelta(delta_base or base_file)
+            self.output_file = delta_output_path(self.output_file, suffix)
+        if compression and (shard_bytes or shard_tokens):
+            raise ValueError("Sharding needs uncompressed output")
         self.tree_builder = TreeBuilder()
+        self.incremental = incremental
+        # Number of threads reading files ahead of the writer (0 = sequential)
+        self.read_workers = read_workers
+        self.read_ahead_bytes = read_ahead_bytes
+        self.max_file_memory = max_file_memory
+        # The scanner's SniffedChunks: file starts already read while classifying them
+        self.sniffed_chunks = sniffed_chunks
+        self.budget = OutputBudget(max_output_bytes, skip_generated)
+        # Optionally split the finished output into part files by a byte or estimated-token budget
+        self.shard_writer = ShardWriter(self.output_file, shard_bytes, shard_tokens) \
+            if shard_bytes or shard_tokens else None
+        # (relative path, offset, length, chars) of every file segment of the last body written
+        self.segments = []
+        # Write each distinct content once; later identical files get a one-line reference
+        self.dedupe = dedupe
+        # content hash -> (relative path, content bytes, index entry) of the files written in full by this run
+        self.written_content = {}
+        # (relative path, content offset, length, lines, hash, extra) of every file of the last body
+        # written, saved as <stem>.index.json for random access (see snapshot_index.SnapshotReader)
+        self.content_index = []
+        self.deduplicated = 0
+        self.dedup_saved_bytes = 0
+        # RunProfile collecting timings and I/O counts, or None when profiling is off
+        self.profile = None
+        # Called with the bytes of the final output as they are written, for uncompressed
+        # output (see async_api.py)
+        self.output_sink = None
 
         ensure_directory(self.output_dir)
 
-    def combine(self, text_files, ignored_items, ignore_rules, all_files=None, callback=None, cancel_event=None):
+    def combine(self, text_files, ignored_items, ignore_rules, all_files=None, callback=None, cancel_event=None,
+                scan_tree=None):
+        # With a budget or in delta mode, which files make it into the output is only known
+        # once they are written, so the header has to be written after the body
+        if self.budget.active or self.delta is not None:
+            return self.combine_stream(text_files, ignored_items, ignore_rules, all_files, callback,
+                                       cancel_event, scan_tree)
+
+        temp_file = None
+        previous_output = None
         try:
             total_text_files = len(text_files)
-            ignored_count = len(ignored_items)
-            files_processed = 0
-            total_chars = 0
-            error_count = 0
             timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
 
-            with open(self.output_file, 'w', encoding='utf-8') as outfile:
-                header = f"/* ==========================================================\n" \
-                         f"   CODEBASE SNAPSHOT - {timestamp}\n" \
-                         f"   Project: {self.project_path.name}\n" \
-                         f"   Text Files Included: {total_text_files}\n" \
-                         f"   Items Ignored: {ignored_count}\n" \
-                         f"   ========================================================== */\n\n"
-                outfile.write(header)
-                total_chars += len(header)
-
-                if all_files:
-                    ignored_dirs = [item for item in ignored_items if item[2] == "directory"]
-                    tree_structure = self.tree_builder.build_tree(
-                        self.project_path,
-                        ignored_dirs,
-                        all_files
-                    )
-                    tree_header = "/* PROJECT STRUCTURE\n" \
-                                  f"   {'-' * 60}\n"
-                    tree_footer = f"   {'-' * 60} */\n\n"
-
-                    tree_lines = [f"   {line}" for line in tree_structure.split('\n')]
-                    formatted_tree = tree_header + '\n'.join(tree_lines) + '\n' + tree_footer
-                    outfile.write(formatted_tree)
-                    total_chars += len(formatted_tree)
-
-                for absolute_path, relative_path in text_files:
-                    if cancel_event and cancel_event.is_set():
-                        if callback:
-                            callback("Combine process cancelled.", -1)
-                        break
-
-                    files_processed += 1
-                    if callback:
-                        callback(f"Processing ({files_processed}/{total_text_files}): {relative_path}",
-                                 0.5 + (files_processed / total_text_files) * 0.5)
+            manifest, previous_output = self._open_manifest()
+            # Write to a temporary file so the previous output stays readable for segment reuse
+            temp_file = temp_path(self.output_file)
 
-                    try:
-                        with open(absolute_path, 'r', encoding='utf-8', errors='replace') as infile:
-                            content = infile.read()
-                        file_header = f"/* ===== {relative_path} ===== */\n"
-                        outfile.write(file_header)
-                        outfile.write(content)
-                        outfile.write("\n\n")
-                        total_chars += len(file_header) + len(content) + 2
-                    except Exception as e:
-                        error_count += 1
-                        error_msg = f"/* ===== ERROR: Could not read file: {relative_path} ===== */\n/* {str(e)} */\n\n"
-                        outfile.write(error_msg)
-                        total_chars += len(error_msg)
-                
+            with self._open_writer(temp_file, self.output_sink) as outfile:
+                total_chars = self._write_header(outfile, timestamp, total_text_files, len(ignored_items))
+                total_chars += self._write_tree(outfile, ignored_items, all_files, scan_tree)
+                prologue = (outfile.tell(), total_chars)
+
+                files_processed, body_chars, error_count = self._write_body(
+                    outfile, text_files, total_text_files, manifest, previous_output, callback, cancel_event
+                )
                 if cancel_event and cancel_event.is_set():
+                    outfile.close()
+                    self._cleanup(temp_file, previous_output)
                     return False, "Process cancelled by user.", {}
+                total_chars += body_chars
+
+                epilogue_offset = outfile.tell()
+                epilogue_chars = self._write_ignored_section(outfile, ignored_items, ignore_rules)
+                total_chars += epilogue_chars
 
-                if ignored_items:
-                    rule_summary = ignore_rules.get_rule_summary()
-                    ignore_section = "\n/* ===== IGNORED FILES & DIRECTORIES ===== */\n"
-                    ignore_section += "/* The following items were excluded from the output. */\n\n"
-
-                    if rule_summary['gitignore']['found']:
-                        ignore_section += "/* Based on .gitignore patterns: */\n"
-                        for pattern in rule_summary['gitignore']['patterns']:
-                            ignore_section += f"/* {pattern} */\n"
-                        ignore_section += "\n"
-
-                    # --- UPDATED: Check for 'track_ignore' instead of 'watchignore' ---
-                    if rule_summary['track_ignore']['found'] and rule_summary['track_ignore']['patterns']:
-                        ignore_section += f"/* Based on {ignore_rules.get_track_ignore_path().name} patterns: */\n"
-                        for pattern in rule_summary['track_ignore']['patterns']:
-                            ignore_section += f"/* {pattern} */\n"
-                        ignore_section += "\n"
-
-                    outfile.write(ignore_section)
-                    total_chars += len(ignore_section)
-
-                    ignored_dirs = sorted([item for item in ignored_items if item[2] == "directory"], key=lambda x: x[1])
-                    ignored_files_by_rule = sorted([item for item in ignored_items if item[2] == "file"], key=lambda x: x[1])
-                    ignored_binary_files = sorted([item for item in ignored_items if item[2] == "binary"], key=lambda x: x[1])
-
-                    if ignored_dirs:
-                        outfile.write("/* Ignored directories: */\n")
-                        for _, relative_path, _ in ignored_dirs:
-                            ignored_line = f"/* {relative_path}/ */\n"
-                            outfile.write(ignored_line)
-                            total_chars += len(ignored_line)
-
-                    if ignored_files_by_rule:
-                        outfile.write("\n/* Ignored files (by rule): */\n")
-                        for _, relative_path, _ in ignored_files_by_rule:
-                            ignored_line = f"/* {relative_path} */\n"
-                            outfile.write(ignored_line)
-                            total_chars += len(ignored_line)
-
-                    if ignored_binary_files:
-                        outfile.write("\n/* Ignored binary files: */\n")
-                        for _, relative_path, _ in ignored_binary_files:
-                            ignored_line = f"/* {relative_path} */\n"
-                            outfile.write(ignored_line)
-                            total_chars += len(ignored_line)
-
-            stats = {
-                'text_files': total_text_files,
-                'binary_files': len([i for i in ignored_items if i[2] == 'binary']),
-                'ignored_items': ignored_count,
-                'total_files': total_text_files,
-                'total_chars': total_chars,
-                'errors': error_count,
-                'output_file': str(self.output_file),
-                'timestamp': timestamp
-            }
+            return self._finish(temp_file, manifest, previous_output, total_text_files, ignored_items,
+                                total_chars, error_count, timestamp, callback, outfile.tell(),
+                                layout=prologue + (0, epilogue_offset, epilogue_chars))
 
+        except Exception as e:
+            self._cleanup(temp_file, previous_output)
+            error_msg = f"Error combining files: {str(e)}"
             if callback:
-                callback(f"Done! Combined {total_text_files} text files into {self.output_file.name}", 1.0)
+                callback(error_msg, 1.0)
+            return False, error_msg, {}
+
+    def combine_stream(self, text_files, ignored_items, ignore_rules, all_files=None, callback=None,
+                       cancel_event=None, scan_tree=None):
+        """
+        Streaming variant of combine() for pipelined scanning.
+
+        `text_files` may be any iterable that yields files while the scan is still running;
+        `ignored_items` and `all_files` are only read once it is exhausted. File contents go
+        to a body file first, then the header, tree, body and ignored section are assembled
+        into the final output. The result is identical to combine() on the same scan.
+        Like all_files, `scan_tree` is only read after the stream is exhausted.
+        combine() delegates here when an output budget is set or in delta mode, since the
+        header counts then depend on the files written. With compression the body file is compressed
+        too and is appended to the output without being decompressed.
+        """
+        temp_file = None
+        body_file = None
+        previous_output = None
+        try:
+            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+
+            if self.delta is not None:
+                if not self.delta.load():
+                    return False, f"No snapshot manifest to take a delta against: {self.delta.manifest.path}", {}
+                text_files = self.delta.changed_files(text_files, self._open_source)
+
+            manifest, previous_output = self._open_manifest()
+            temp_file = temp_path(self.output_file)
+            body_file = temp_path(self.output_file, '.body.tmp')
+
+            with self._open_writer(body_file) as body:
+                files_processed, body_chars, error_count = self._write_body(
+                    body, text_files, len(text_files) if isinstance(text_files, list) else None,
+                    manifest, previous_output, callback, cancel_event
+                )
+                body_bytes = body.tell()
+            if cancel_event and cancel_event.is_set():
+                self._cleanup(temp_file, previous_output, body_file)
+                return False, "Process cancelled by user.", {}
+
+            if callback:
+                callback("Assembling output file...", -1)
+            total_text_files = files_processed - self.budget.skipped
+            with self._open_writer(temp_file, self.output_sink) as outfile:
+                total_chars = self._write_header(outfile, timestamp, total_text_files,
+                                                 len(ignored_items) + self.budget.skipped)
+                total_chars += self._write_tree(outfile, ignored_items, all_files, scan_tree)
+
+                # Segments were recorded relative to the body file
+                prologue = (outfile.tell(), total_chars)
+                manifest.shift_offsets(outfile.tell())
+                self._append_body(outfile, body_file, body_bytes)
+                total_chars += body_chars
+
+                epilogue_offset = outfile.tell()
+                epilogue_chars = self._write_changes_section(outfile)
+                epilogue_chars += self._write_ignored_section(outfile, ignored_items, ignore_rules)
+                total_chars += epilogue_chars
+            os.remove(body_file)
 
-            return True, f"Successfully combined {total_text_files} text files.", stats
+            return self._finish(temp_file, manifest, previous_output, total_text_files, ignored_items,
+                                total_chars, error_count, timestamp, callback, outfile.tell(),
+                                layout=prologue + (prologue[0], epilogue_offset, epilogue_chars))
 
         except Exception as e:
+            self._cleanup(temp_file, previous_output, body_file)
             error_msg = f"Error combining files: {str(e)}"
             if callback:
                 callback(error_msg, 1.0)
             return False, error_msg, {}
+
+    @profiled('assemble')
+    def _append_body(self, outfile, body_file, body_bytes):
+        if outfile.compression:
+            outfile.append_compressed(body_file, body_bytes)
+            return
+        with open(body_file, 'rb') as body:
+            while True:
+                chunk = body.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                outfile.write_bytes(chunk)
+
+    @profiled('manifest_load')
+    def _open_manifest(self):
+        """Return (manifest, previous output handle or None if no segments can be reused)."""
+        manifest = SnapshotManifest(self.output_file, self.budget.manifest_options())
+        # Segments can't be read back at an offset of a compressed output
+        if self.incremental and not self.compression and manifest.load():
+            return manifest, open(self.output_file, 'rb')
+        return manifest, None
+
+    def _open_writer(self, path, sink=None):
+        return OutputWriter(path, self.compression, self.compression_level, sink)
+
+    def _write_header(self, outfile, timestamp, total_text_files, ignored_count):
+        if self.delta is not None:
+            delta = self.delta
+            base_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(delta.base_created_ns / 1e9))
+            kind = "DELTA"
+            changes = f"   Changes Since: {base_time} (added {len(delta.added)}, modified {len(delta.modified)}, " \
+                      f"deleted {len(delta.deleted)})\n"
+        else:
+            kind = "SNAPSHOT"
+            changes = ""
+        header = f"/* ==========================================================\n" \
+                 f"   CODEBASE {kind} - {timestamp}\n" \
+                 f"   Project: {self.project_path.name}\n" \
+                 f"{changes}" \
+                 f"   Text Files Included: {total_text_files}\n" \
+                 f"   Items Ignored: {ignored_count}\n" \
+                 f"   ========================================================== */\n\n"
+        outfile.write(header)
+        return len(header)
+
+    @profiled('tree')
+    def _write_tree(self, outfile, ignored_items, all_files, scan_tree=None):
+        """
+        Write the project structure section. With the scanner's ScanTree the lines are
+        rendered straight from its listings and written in batches, without building
+        the whole tree as one string. Returns the number of characters written.
+        """
+        if not all_files:
+            return 0
+
+        if scan_tree is not None:
+            tree_lines = self.tree_builder.iter_tree_lines(scan_tree)
+        else:
+            ignored_dirs = [item for item in ignored_items if item[2] == "directory"]
+            tree_lines = self.tree_builder.build_tree(self.project_path, ignored_dirs, all_files).split('\n')
+
+        tree_header = "/* PROJECT STRUCTURE\n" \
+                      f"   {'-' * 60}\n"
+        tree_footer = f"   {'-' * 60} */\n\n"
+
+        outfile.write(tree_header)
+        total_chars = len(tree_header)
+        batch = []
+        for line in tree_lines:
+            batch.append(f"   {line}\n")
+            if len(batch) >= TREE_WRITE_BATCH:
+                chunk = ''.join(batch)
+                outfile.write(chunk)
+                total_chars += len(chunk)
+                batch.clear()
+        chunk = ''.join(batch) + tree_footer
+        outfile.write(chunk)
+        return total_chars + len(chunk)
+
+    @profiled('write')
+    def _write_body(self, outfile, text_files, total_text_files, manifest, previous_output, callback, cancel_event):
+        """
+        Write every file's segment in order. total_text_files may be None when the
+        number of files isn't known up front (streaming), in which case progress is indeterminate.
+        Returns (files_processed, chars_written, error_count).
+        """
+        files_processed = 0
+        total_chars = 0
+        error_count = 0
+        self.budget.start(outfile.tell())
+        self.segments = []
+        self.written_content = {}
+        self.content_index = []
+        self.deduplicated = 0
+        self.dedup_saved_bytes = 0
+
+        # Files larger than their share of the read-ahead budget are read by the writer itself,
+        # so the bytes held by finished-but-unwritten reads never exceed read_ahead_bytes
+        window = self.read_workers * 2
+        read_limit = min(self.read_ahead_bytes // window, self.max_file_memory) if window else self.max_file_memory
+        load_file = self._load_file if self.profile is None else self._load_file_profiled
+        loaded_files = iter_read_ahead(
+            text_files,
+            lambda item: load_file(item[0], item[1], manifest, previous_output, read_limit),
+            workers=self.read_workers, window=window, cancel_event=cancel_event
+        )
+
+        try:
+            for (absolute_path, relative_path), get_loaded in loaded_files:
+                if cancel_event and cancel_event.is_set():
+                    if callback:
+                        callback("Combine process cancelled.", -1)
+                    break
+
+                files_processed += 1
+                if callback:
+                    if total_text_files:
+                        callback(f"Processing ({files_processed}/{total_text_files}): {relative_path}",
+                                 0.5 + (files_processed / total_text_files) * 0.5)
+                    else:
+                        callback(f"Processing ({files_processed}): {relative_path}", -1)
+
+                offset = outfile.tell()
+                try:
+                    chars = self._write_file(outfile, absolute_path, relative_path, get_loaded(),
+                                             manifest, previous_output)
+                except Exception as e:
+                    error_count += 1
+                    error_msg = f"/* ===== ERROR: Could not read file: {relative_path} ===== */\n/* {str(e)} */\n\n"
+                    outfile.write(error_msg)
+                    chars = len(error_msg)
+                total_chars += chars
+                if outfile.tell() > offset:
+                    self.segments.append((relative_path, offset, outfile.tell() - offset, chars))
+        finally:
+            loaded_files.close()
+
+        return files_processed, total_chars, error_count
+
+    def _write_changes_section(self, outfile):
+        """Delta mode: the added, modified and deleted paths. Returns the number of characters written."""
+        if self.delta is None:
+            return 0
+        section = "\n/* ===== CHANGES ===== */\n"
+        for title, paths in (("Added", self.delta.added), ("Modified", self.delta.modified),
+                             ("Deleted", self.delta.deleted)):
+            if paths:
+                section += f"\n/* {title} files: */\n" + ''.join(f"/* {path} */\n" for path in sorted(paths))
+        if not (self.delta.added or self.delta.modified or self.delta.deleted):
+            section += "/* No changes. */\n"
+        outfile.write(section)
+        return len(section)
+
+    @profiled('ignored_section')
+    def _write_ignored_section(self, outfile, ignored_items, ignore_rules):
+        if not ignored_items and not self.budget.items:
+            return 0
+
+        total_chars = 0
+        rule_summary = ignore_rules.get_rule_summary()
+        ignore_section = "\n/* ===== IGNORED FILES & DIRECTORIES ===== */\n"
+        ignore_section += "/* The following items were excluded from the output. */\n\n"
+
+        if rule_summary['gitignore']['found']:
+            ignore_section += "/* Based on .gitignore patterns: */\n"
+            for pattern in rule_summary['gitignore']['patterns']:
+                ignore_section += f"/* {pattern} */\n"
+            ignore_section += "\n"
+
+        for rel_dir, patterns in rule_summary['nested_gitignore'].items():
+            if patterns:
+                ignore_section += f"/* Based on {rel_dir}/.gitignore patterns: */\n"
+                for pattern in patterns:
+                    ignore_section += f"/* {pattern} */\n"
+                ignore_section += "\n"
+
+        # --- UPDATED: Check for 'track_ignore' instead of 'watchignore' ---
+        if rule_summary['track_ignore']['found'] and rule_summary['track_ignore']['patterns']:
+            ignore_section += f"/* Based on {ignore_rules.get_track_ignore_path().name} patterns: */\n"
+            for pattern in rule_summary['track_ignore']['patterns']:
+                ignore_section += f"/* {pattern} */\n"
+            ignore_section += "\n"
+
+        outfile.write(ignore_section)
+        total_chars += len(ignore_section)
+
+        ignored_dirs = sorted([item for item in ignored_items if item[2] == "directory"], key=lambda x: x[1])
+        ignored_files_by_rule = sorted([item for item in ignored_items if item[2] == "file"], key=lambda x: x[1])
+        ignored_binary_files = sorted([item for item in ignored_items if item[2] == "binary"], key=lambda x: x[1])
+
+        if ignored_dirs:
+            outfile.write("/* Ignored directories: */\n")
+            for _, relative_path, _ in ignored_dirs:
+                ignored_line = f"/* {relative_path}/ */\n"
+                outfile.write(ignored_line)
+                total_chars += len(ignored_line)
+
+        if ignored_files_by_rule:
+            outfile.write("\n/* Ignored files (by rule): */\n")
+            for _, relative_path, _ in ignored_files_by_rule:
+                ignored_line = f"/* {relative_path} */\n"
+                outfile.write(ignored_line)
+                total_chars += len(ignored_line)
+
+        if ignored_binary_files:
+            outfile.write("\n/* Ignored binary files: */\n")
+            for _, relative_path, _ in ignored_binary_files:
+                ignored_line = f"/* {relative_path} */\n"
+                outfile.write(ignored_line)
+                total_chars += len(ignored_line)
+
+        budget_items = [(relative_path, "larger than the per-file size limit")
+                        for _, relative_path, kind in ignored_items if kind == "too large"]
+        budget_items.extend(self.budget.items)
+        if budget_items:
+            outfile.write("\n/* Skipped or truncated by output budget: */\n")
+            for relative_path, reason in sorted(budget_items):
+                ignored_line = f"/* {relative_path} ({reason}) */\n"
+                outfile.write(ignored_line)
+                total_chars += len(ignored_line)
+
+        return total_chars
+
+    @profiled('finish')
+    def _finish(self, temp_file, manifest, previous_output, total_text_files, ignored_items,
+                total_chars, error_count, timestamp, callback, raw_bytes, layout=None):
+        """
+        Move the finished output into place, persist the manifest, write shards if enabled
+        and build the stats dict. raw_bytes is the uncompressed size of the output. `layout`
+        is (prologue bytes, prologue chars, offset of the body in the output, offset of the
+        ignored section, its chars).
+        """
+        if previous_output:
+            previous_output.close()
+        os.replace(temp_file, self.output_file)
+        if self.profile is not None:
+            self.profile.count('bytes_written', raw_bytes)
+        if self.incremental and not self.compression:
+            manifest.save()
+        else:
+            manifest.discard()
+        # The index serves byte ranges of the output, which a compressed file doesn't have
+        index_file = None
+        if self.compression or layout is None:
+            discard_snapshot_index(self.output_file)
+        else:
+            body_offset = layout[2]
+            index_file = write_snapshot_index(self.output_file, [
+                (relative_path, body_offset + offset, length, lines, content_hash, extra)
+                for relative_path, offset, length, lines, content_hash, extra in self.content_index
+            ])
+
+        stats = {
+            'text_files': total_text_files,
+            'binary_files': len([i for i in ignored_items if i[2] == 'binary']),
+            'ignored_items': len(ignored_items) + self.budget.skipped,
+            'total_files': total_text_files,
+            'total_chars': total_chars,
+            'errors': error_count,
+            'reused_files': manifest.reused_count,
+            'budget_skipped': self.budget.skipped + len([i for i in ignored_items if i[2] == 'too large']),
+            'truncated_files': self.budget.truncated,
+            'deduplicated_files': self.deduplicated,
+            'dedup_saved_bytes': self.dedup_saved_bytes,
+            'raw_bytes': raw_bytes,
+            'compressed_bytes': os.path.getsize(self.output_file) if self.compression else raw_bytes,
+            'output_file': str(self.output_file),
+            'timestamp': timestamp
+        }
+        if index_file is not None:
+            stats['index_file'] = index_file
+        if self.delta is not None:
+            stats.update(delta_added=len(self.delta.added), delta_modified=len(self.delta.modified),
+                         delta_deleted=len(self.delta.deleted), delta_unchanged=self.delta.unchanged)
+
+        if self.shard_writer is not None and layout is not None:
+            if callback:
+                callback("Writing shards...", -1)
+            shards = self.shard_writer.write(self._shard_segments(layout), timestamp, self.project_path.name)
+            stats['shards'] = len(shards)
+            stats['shard_index'] = str(self.shard_writer.index_path)
+
+        if callback:
+            callback(f"Done! Combined {total_text_files} text files into {self.output_file.name}", 1.0)
+
+        return True, f"Successfully combined {total_text_files} text files.", stats
+
+    def _shard_segments(self, layout):
+        """All segments of the finished output in order: header and tree, files, ignored section."""
+        prologue_bytes, prologue_chars, body_offset, epilogue_offset, epilogue_chars = layout
+        segments = [(None, 0, prologue_bytes, prologue_chars)]
+        segments.extend((path, body_offset + offset, length, chars) for path, offset, length, chars in self.segments)
+        segments.append((None, epilogue_offset, os.path.getsize(self.output_file) - epilogue_offset, epilogue_chars))
+        return segments
+
+    def _load_file_profiled(self, absolute_path, relative_path, *args):
+        """_load_file that records the stat call and, when the file was read, how long it took."""
+        start = time.perf_counter()
+        loaded = self._load_file(absolute_path, relative_path, *args)
+        if loaded[0] is not None:
+            self.profile.count('stat_calls')
+        if loaded[1] is not None:
+            self.profile.record_read(relative_path, time.perf_counter() - start, len(loaded[1]))
+        return loaded
+
+    def _load_file(self, absolute_path, relative_path, manifest, previous_output, read_limit=None):
+        """
+        Read stage: stat the file and read its bytes unless the previous segment can be
+        reused as-is or the file exceeds read_limit. Safe to run on worker threads.
+        Returns (stat_result, raw bytes or None, previous manifest entry or None).
+        """
+        if self.budget.exhausted:
+            # Nothing more will be written, don't touch the file
+            return None, None, None
+        stat_result = os.stat(absolute_path)
+        # Always take the chunk so it is released even when the file isn't read here
+        chunk = self.sniffed_chunks.take(relative_path, stat_result) if self.sniffed_chunks else None
+        entry = manifest.lookup(relative_path, stat_result.st_size) if previous_output else None
+        if entry is not None and manifest.is_unchanged(entry, stat_result):
+            return stat_result, None, entry
+        if read_limit is not None and stat_result.st_size > read_limit:
+            return stat_result, None, entry
+
+        if chunk is not None and len(chunk) == stat_result.st_size:
+            return stat_result, chunk, entry
+        with self._open_source(absolute_path) as infile:
+            if chunk is None:
+                raw = infile.read()
+            else:
+                infile.seek(len(chunk))
+                raw = chunk + infile.read()
+        return stat_result, raw, entry
+
+    def _write_file(self, outfile, absolute_path, relative_path, loaded, manifest, previous_output):
+        """
+        Write stage: write one file's segment and record it in the manifest.
+        The segment is copied from the previous output when the file is unchanged,
+        either by stat data or, failing that, by content hash. With dedupe, a file whose
+        content was already written by this run gets a reference to that file instead.
+        Returns the number of characters written.
+        """
+        stat_result, raw, entry = loaded
+        budget = self.budget
+        if budget.exhausted:
+            budget.omit(relative_path)
+            return 0
+        file_header = f"/* ===== {relative_path} ===== */\n"
+        # Files above max_file_memory are never held in memory as a whole
+        streamed = raw is None and stat_result.st_size > self.max_file_memory
+        remaining = budget.remaining(outfile.tell())
+        # A file that will be truncated is only read as far as it is written, never hashed in full
+        over_budget = remaining is not None and len(file_header) + stat_result.st_size + 2 > remaining
+
+        content_hash = None
+        if entry is not None:
+            if manifest.is_unchanged(entry, stat_result):
+                content_hash = entry['hash']
+            elif over_budget:
+                entry = None
+            else:
+                raw, content_hash = self._read_and_hash(absolute_path, raw, streamed)
+                if content_hash != entry['hash']:
+                    entry = None
+
+        if self.dedupe and (content_hash is not None or not over_budget):
+            if content_hash is None:
+                # Large files are read twice: once here, once when they are streamed out
+                raw, content_hash = self._read_and_hash(absolute_path, raw, streamed)
+            chars = self._write_reference(outfile, relative_path, file_header, content_hash, remaining)
+            if chars is not None:
+                return chars
+
+        if entry is not None and (remaining is None or entry['length'] <= remaining):
+            offset = outfile.tell()
+            if self._copy_segment(previous_output, outfile, entry, file_header):
+                manifest.record(relative_path, stat_result, entry['hash'], offset, entry['length'], entry['chars'],
+                                entry['lines'])
+                manifest.reused_count += 1
+                header_bytes = _output_bytes(file_header)
+                self._index_content(relative_path, offset + header_bytes,
+                                    entry['length'] - header_bytes - _output_bytes("\n\n"),
+                                    entry['lines'], entry['hash'], entry['length'] - header_bytes)
+                return entry['chars']
+
+        # A reused segment has passed these checks before, so they only run for content written anew
+        if budget.skip_generated:
+            reason = self._generated_reason(absolute_path, relative_path, raw)
+            if reason:
+                budget.skip(relative_path, reason)
+                return 0
+        if over_budget:
+            return self._write_truncated(outfile, absolute_path, relative_path, stat_result, raw,
+                                         file_header, remaining)
+
+        offset = outfile.tell()
+        header_bytes = outfile.write(file_header)
+        if streamed:
+            hasher = hashlib.sha1()
+            line_counter = LineCounter()
+            start = time.perf_counter()
+            try:
+                with self._open_source(absolute_path) as infile:
+                    chars = self._stream_content(outfile, infile, hasher, line_counter)
+            except Exception:
+                # Drop the partial segment so the error message replaces it; a compressed
+                # stream can't be rewound, so there the message follows the partial content
+                if outfile.can_truncate:
+                    outfile.truncate(offset)
+                raise
+            content_hash = hasher.hexdigest()
+            lines = line_counter.lines
+            if self.profile is not None:
+                self.profile.record_read(relative_path, time.perf_counter() - start, stat_result.st_size)
+        else:
+            if raw is None:
+                with self._open_source(absolute_path) as infile:
+                    raw = infile.read()
+            chars = self._write_content(outfile, raw)
+            content_hash = hashlib.sha1(raw).hexdigest()
+            lines = count_lines(raw)
+        content_end = outfile.tell()
+        outfile.write("\n\n")
+        chars += len(file_header) + 2
+        manifest.record(relative_path, stat_result, content_hash, offset, outfile.tell() - offset, chars, lines)
+        self._index_content(relative_path, offset + header_bytes, content_end - offset - header_bytes,
+                            lines, content_hash, outfile.tell() - offset - header_bytes)
+        return chars
+
+    def _read_and_hash(self, absolute_path, raw, streamed):
+        """Return (raw, content hash); raw is read here unless the file is too large to hold."""
+        if streamed:
+            return raw, self._hash_file(absolute_path)
+        if raw is None:
+            with self._open_source(absolute_path) as infile:
+                raw = infile.read()
+        return raw, hashlib.sha1(raw).hexdigest()
+
+    def _index_content(self, relative_path, offset, length, lines, content_hash, segment_rest=None, extra=None):
+        """
+        Add a file to the content index. segment_rest, the bytes of its segment after the
+        header, is given for files written in full, which later duplicates can refer to.
+        """
+        indexed = (relative_path, offset, length, lines, content_hash, extra)
+        self.content_index.append(indexed)
+        if self.dedupe and segment_rest is not None:
+            self.written_content.setdefault(content_hash, (relative_path, segment_rest, indexed))
+
+    def _write_reference(self, outfile, relative_path, file_header, content_hash, remaining):
+        """
+        Write a reference to the earlier file with the same content instead of the content
+        itself. Returns the number of characters, or None if the file has to be written in
+        full: its content is new, or the reference wouldn't be shorter than the segment.
+        References aren't recorded in the manifest, so they are never reused.
+        """
+        original = self.written_content.get(content_hash)
+        if original is None:
+            return None
+        original_path, content_bytes, indexed = original
+        reference = f"/* ===== {relative_path} ===== (same as {original_path}) */\n\n"
+        full_bytes = _output_bytes(file_header) + content_bytes
+        reference_bytes = _output_bytes(reference)
+        if reference_bytes >= full_bytes:
+            return None
+        if remaining is not None and reference_bytes > remaining:
+            self.budget.omit(relative_path)
+            return 0
+        outfile.write(reference)
+        # The index points at the original's content
+        self.content_index.append((relative_path,) + indexed[1:5] + ({'same_as': original_path},))
+        self.deduplicated += 1
+        self.dedup_saved_bytes += full_bytes - reference_bytes
+        return len(reference)
+
+    def _write_content(self, outfile, raw):
+        """
+        Write a file's bytes as text and return the number of characters.
+        Valid UTF-8 without '\r' decodes to exactly the same bytes, so it is written as-is;
+        anything else goes through decode_text to replace bad bytes and translate newlines.
+        """
+        if DIRECT_COPY and b'\r' not in raw:
+            if raw.isascii():
+                outfile.write_bytes(raw)
+                return len(raw)
+            try:
+                chars = len(raw.decode('utf-8'))
+            except UnicodeDecodeError:
+                pass
+            else:
+                outfile.write_bytes(raw)
+                return chars
+
+        content = decode_text(raw)
+        outfile.write(content)
+        return len(content)
+
+    def _stream_content(self, outfile, infile, hasher, line_counter):
+        """
+        Chunked version of _write_content for large files: at most COPY_CHUNK_SIZE bytes
+        (plus their decoded text) are in memory at once. Chunks are copied as raw bytes
+        while the file is valid UTF-8 without '\r'; from the first chunk that isn't, the
+        rest is decoded incrementally exactly like a text-mode read.
+        Updates `hasher` and `line_counter` with every byte read and returns the number of characters.
+        """
+        chars = 0
+        direct = DIRECT_COPY
+        validator = codecs.getincrementaldecoder('utf-8')()
+        # Bytes of a UTF-8 sequence split across chunks, held back until it is complete
+        pending = b''
+        decoder = None
+
+        while True:
+            chunk = infile.read(COPY_CHUNK_SIZE)
+            hasher.update(chunk)
+            line_counter.update(chunk)
+            final = not chunk
+
+            if direct:
+                if b'\r' not in chunk:
+                    if not pending and chunk.isascii():
+                        outfile.write_bytes(chunk)
+                        chars += len(chunk)
+                        if final:
+                            break
+                        continue
+                    try:
+                        chars += len(validator.decode(chunk, final))
+                    except UnicodeDecodeError:
+                        pass
+                    else:
+                        data = pending + chunk if pending else chunk
+                        pending = validator.getstate()[0]
+                        outfile.write_bytes(data[:len(data) - len(pending)])
+                        if final:
+                            break
+                        continue
+                # Switch to decoding for the rest of the file, starting with the held-back bytes
+                direct = False
+                decoder = io.IncrementalNewlineDecoder(
+                    codecs.getincrementaldecoder('utf-8')(errors='replace'), translate=True
+                )
+                chunk = pending + chunk
+
+            text = decoder.decode(chunk, final)
+            if text:
+                outfile.write(text)
+                chars += len(text)
+            if final:
+                break
+        return chars
+
+    def _write_truncated(self, outfile, absolute_path, relative_path, stat_result, raw, file_header, remaining):
+        """
+        Write as much of a file as fits in the remaining output budget, followed by a marker.
+        Truncated segments aren't recorded in the manifest, and their index entry carries the
+        hash of the bytes written rather than of the whole file. Returns the number of characters.
+        """
+        limit = remaining - len(file_header) - TRUNCATION_MARKER_RESERVE
+        if limit <= 0:
+            self.budget.omit(relative_path)
+            return 0
+        if raw is None:
+            with self._open_source(absolute_path) as infile:
+                raw = infile.read(limit)
+        raw = _trim_partial_utf8(raw[:limit])
+
+        content_offset = outfile.tell() + outfile.write(file_header)
+        chars = self._write_content(outfile, raw)
+        self._index_content(relative_path, content_offset, outfile.tell() - content_offset, count_lines(raw),
+                            hashlib.sha1(raw).hexdigest(), extra={'truncated': True, 'hash_scope': 'prefix'})
+        marker = f"\n/* ===== TRUNCATED: {len(raw)} of {stat_result.st_size} bytes shown " \
+                 f"(output size limit reached) ===== */\n\n"
+        outfile.write(marker)
+        self.budget.truncate(relative_path, len(raw), stat_result.st_size)
+        return len(file_header) + chars + len(marker)
+
+    def _generated_reason(self, absolute_path, relative_path, raw):
+        """Why a file looks minified or generated, or None. Reads at most GENERATED_SAMPLE_SIZE bytes."""
+        if is_generated_name(os.path.basename(relative_path)):
+            return "generated file name"
+        if raw is None:
+            with self._open_source(absolute_path) as infile:
+                sample = infile.read(GENERATED_SAMPLE_SIZE)
+        else:
+            sample = raw[:GENERATED_SAMPLE_SIZE]
+        return detect_generated(sample)
+
+    def _hash_file(self, absolute_path):
+        hasher = hashlib.sha1()
+        with self._open_source(absolute_path) as infile:
+            while True:
+                chunk = infile.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+        return hasher.hexdigest()
+
+    def _open_source(self, absolute_path):
+        if self.profile is not None:
+            self.profile.count('open_calls')
+        return open(absolute_path, 'rb')
+
+    def _copy_segment(self, previous_output, outfile, entry, file_header):
+        """Copy a segment from the previous output. Returns False if it doesn't look like the expected file."""
+        expected = file_header.encode('utf-8')
+        previous_output.seek(entry['offset'])
+        first = previous_output.read(min(entry['length'], COPY_CHUNK_SIZE))
+        if not first.startswith(expected):
+            return False
+        outfile.write_bytes(first)
+        remaining = entry['length'] - len(first)
+        while remaining > 0:
+            chunk = previous_output.read(min(remaining, COPY_CHUNK_SIZE))
+            if not chunk:
+                raise IOError("Previous output ended before the end of a reused segment")
+            outfile.write_bytes(chunk)
+            remaining -= len(chunk)
+        if self.profile is not None:
+            self.profile.count('bytes_reused', entry['length'])
+        return True
+
+    def _cleanup(self, temp_file, previous_output, *extra_files):
+        if previous_output:
+            previous_output.close()
+        for path in (temp_file,) + extra_files:
+            if path:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def _output_bytes(text):
+    """Bytes OutputWriter.write() produces for `text`."""
+    return len(text.encode('utf-8')) + text.count('\n') * (len(os.linesep) - 1)
+
+
+def _trim_partial_utf8(data):
+    """Drop an incomplete UTF-8 sequence at the end of data, so a cut doesn't produce U+FFFD."""
+    for back in range(1, min(4, len(data)) + 1):
+        byte = data[-back]
+        if byte < 0x80:
+            return data
+        if byte >= 0xC0:
+            needed = 2 if byte < 0xE0 else 3 if byte < 0xF0 else 4
+            return data if back >= needed else data[:-back]
+    return data
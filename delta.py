@@ -0,0 +1,97 @@
+import hashlib
+import os
+from pathlib import Path
+
+from manifest import SnapshotManifest
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def delta_output_path(output_file, compression_suffix=''):
+    """codebase.txt -> codebase.delta.txt (codebase.txt.gz -> codebase.delta.txt.gz)."""
+    name = output_file.name
+    if compression_suffix and name.endswith(compression_suffix):
+        name = name[:-len(compression_suffix)]
+    stem, extension = os.path.splitext(name)
+    return output_file.with_name(f"{stem}.delta{extension}{compression_suffix}")
+
+
+class SnapshotDelta:
+    """
+    Sorts the text files of a scan into added, modified and unchanged against the manifest of
+    an earlier snapshot, and lists the files of that snapshot that are gone.
+
+    A file whose size and mtime match its manifest entry is unchanged without being opened;
+    one with the same size but another mtime is hashed, and counts as modified only if the
+    content differs. Files the earlier snapshot didn't write in full (truncated, deduplicated
+    or unreadable ones) have no manifest entry and show up as added.
+    """
+
+    def __init__(self, base_file):
+        """`base_file` is the earlier snapshot or its .manifest.json."""
+        base_file = Path(base_file).absolute()
+        if base_file.name.endswith('.manifest.json'):
+            self.manifest = SnapshotManifest(base_file.with_name(base_file.name[:-len('.manifest.json')] + '.txt'))
+            self.manifest.path = base_file
+        else:
+            self.manifest = SnapshotManifest(base_file)
+        self.added = []
+        self.modified = []
+        self.deleted = []
+        self.unchanged = 0
+        self._seen = set()
+
+    @property
+    def base_created_ns(self):
+        return self.manifest.previous_created_ns
+
+    def load(self):
+        """Read the base manifest. Returns False if there is none to compare against."""
+        self.added = []
+        self.modified = []
+        self.deleted = []
+        self.unchanged = 0
+        self._seen = set()
+        return self.manifest.load_entries()
+
+    def changed_files(self, text_files, open_source=None):
+        """
+        Yield the (file_path, rel_path) items of `text_files` that are added or modified.
+        The deleted list is complete once the iterable is exhausted.
+        """
+        manifest = self.manifest
+        for item in text_files:
+            absolute_path, relative_path = item
+            self._seen.add(relative_path)
+            entry = manifest.previous.get(relative_path)
+            if entry is None:
+                self.added.append(relative_path)
+                yield item
+                continue
+            try:
+                stat_result = os.stat(absolute_path)
+            except OSError:
+                # Let the combiner report the error in its segment
+                self.modified.append(relative_path)
+                yield item
+                continue
+            if manifest.is_unchanged(entry, stat_result) or (
+                    entry['size'] == stat_result.st_size and self._hash(absolute_path, open_source) == entry['hash']):
+                self.unchanged += 1
+                continue
+            self.modified.append(relative_path)
+            yield item
+        self.deleted = sorted(path for path in manifest.previous if path not in self._seen)
+
+    def _hash(self, absolute_path, open_source):
+        hasher = hashlib.sha1()
+        try:
+            with (open_source(absolute_path) if open_source else open(absolute_path, 'rb')) as infile:
+                while True:
+                    chunk = infile.read(HASH_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+        except OSError:
+            return None
+        return hasher.hexdigest()
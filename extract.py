@@ -0,0 +1,225 @@
+"""
+Cut a smaller snapshot out of an existing one, without rescanning the project:
+
+    python extract.py .codebase/codebase.txt -i "src/api/**" -i "*.json" [-x "**/tests/**"] [-o slice.txt]
+
+Files are chosen by gitignore-style globs matched against the paths in the
+snapshot's index (<stem>.index.json, see snapshot_index.py), and their
+segments are copied from the snapshot through an mmap, so the work grows with
+the selected slice rather than with the snapshot. The project tree is never
+read. The slice has the usual framing (header, project structure of the
+selected files, one segment per file) and an index of its own.
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+import pathspec
+
+from file_utils import temp_path
+from output_writer import OutputWriter
+from progress import StderrProgress
+from snapshot_index import SnapshotIndexError, SnapshotReader, write_snapshot_index
+from tree_builder import ScanTree, TreeBuilder
+
+COPY_CHUNK_SIZE = 1024 * 1024
+# A truncated segment ends with "/* ===== TRUNCATED: ... ===== */" after its content
+TRUNCATION_MARKER_END = b' ===== */'
+TRUNCATION_MARKER_WINDOW = 512
+# Bytes of the source snapshot read to recover its timestamp and project name
+HEADER_WINDOW = 1024
+
+
+def select_paths(rel_paths, include=(), exclude=()):
+    """
+    The paths matching any `include` glob (every path without includes) and no `exclude` glob.
+    Globs follow .gitignore syntax: "*.json" matches at any depth, "src/api/**" a subtree.
+    """
+    include_spec = pathspec.PathSpec.from_lines('gitwildmatch', include) if include else None
+    exclude_spec = pathspec.PathSpec.from_lines('gitwildmatch', exclude) if exclude else None
+    selected = []
+    for rel_path in rel_paths:
+        posix_path = rel_path.replace(os.sep, '/')
+        if include_spec is not None and not include_spec.match_file(posix_path):
+            continue
+        if exclude_spec is not None and exclude_spec.match_file(posix_path):
+            continue
+        selected.append(rel_path)
+    return selected
+
+
+class SnapshotExtractor:
+    """Writes the files of `snapshot_file` selected by include/exclude globs to a new snapshot."""
+
+    def __init__(self, snapshot_file, output_file=None, include=(), exclude=()):
+        self.snapshot_file = Path(snapshot_file).absolute()
+        self.output_file = Path(output_file).absolute() if output_file else \
+            self.snapshot_file.with_name(self.snapshot_file.stem + '.extract' + self.snapshot_file.suffix)
+        self.include = list(include)
+        self.exclude = list(exclude)
+
+    def extract(self, callback=None, cancel_event=None):
+        """Returns (was_successful, message, stats) like ProjectProcessor.run."""
+        if self.output_file == self.snapshot_file:
+            return False, "The extract can't overwrite the snapshot it is read from.", {}
+        try:
+            reader = SnapshotReader(self.snapshot_file)
+        except (OSError, SnapshotIndexError) as e:
+            return False, f"Can't extract from {self.snapshot_file.name}: {e}", {}
+
+        temp_file = temp_path(self.output_file)
+        try:
+            with reader:
+                selected = select_paths(reader, self.include, self.exclude)
+                timestamp, project_name = self._read_header(reader)
+                with OutputWriter(temp_file) as outfile:
+                    self._write_header(outfile, timestamp, project_name, len(selected))
+                    self._write_tree(outfile, selected)
+                    entries = self._write_files(outfile, reader, selected, callback, cancel_event)
+                    raw_bytes = outfile.tell()
+                if cancel_event and cancel_event.is_set():
+                    os.remove(temp_file)
+                    return False, "Process cancelled by user.", {}
+            os.replace(temp_file, self.output_file)
+            index_file = write_snapshot_index(self.output_file, entries)
+        except Exception as e:
+            try:
+                os.remove(temp_file)
+            except OSError:
+                pass
+            error_msg = f"Error extracting files: {str(e)}"
+            if callback:
+                callback(error_msg, 1.0)
+            return False, error_msg, {}
+
+        stats = {
+            'text_files': len(selected),
+            'raw_bytes': raw_bytes,
+            'source_bytes': os.path.getsize(self.snapshot_file),
+            'output_file': str(self.output_file),
+            'index_file': index_file,
+            'timestamp': timestamp,
+        }
+        if callback:
+            callback(f"Done! Extracted {len(selected)} files into {self.output_file.name}", 1.0)
+        return True, f"Successfully extracted {len(selected)} of {len(reader)} files.", stats
+
+    def _read_header(self, reader):
+        """Timestamp and project name of the source snapshot."""
+        header = reader.read_range(0, HEADER_WINDOW).decode('utf-8', errors='replace')
+        timestamp = re.search(r'CODEBASE (?:SNAPSHOT|DELTA) - (.*)', header)
+        project_name = re.search(r'Project: (.*)', header)
+        return (timestamp.group(1).strip() if timestamp else time.strftime("%Y-%m-%d %H:%M:%S"),
+                project_name.group(1).strip() if project_name else '')
+
+    def _write_header(self, outfile, timestamp, project_name, total_text_files):
+        filters = []
+        if self.include:
+            filters.append(f"include: {', '.join(self.include)}")
+        if self.exclude:
+            filters.append(f"exclude: {', '.join(self.exclude)}")
+        header = f"/* ==========================================================\n" \
+                 f"   CODEBASE SNAPSHOT - {timestamp}\n" \
+                 f"   Project: {project_name}\n" \
+                 f"   Text Files Included: {total_text_files}\n" \
+                 f"   Extracted from: {self.snapshot_file.name}" + \
+                 (f" ({'; '.join(filters)})" if filters else '') + "\n" \
+                 "   ========================================================== */\n\n"
+        outfile.write(header)
+
+    def _write_tree(self, outfile, selected):
+        if not selected:
+            return
+        outfile.write("/* PROJECT STRUCTURE\n"
+                      f"   {'-' * 60}\n")
+        for line in TreeBuilder().iter_tree_lines(ScanTree.from_paths(selected)):
+            outfile.write(f"   {line}\n")
+        outfile.write(f"   {'-' * 60} */\n\n")
+
+    def _write_files(self, outfile, reader, selected, callback, cancel_event):
+        """
+        Copy the selected segments in snapshot order. A deduplicated file whose original isn't
+        selected gets the content in full. Returns the entries of the new snapshot's index.
+        """
+        entries = []
+        # source content offset -> (path, new index entry) of the first selected file with that content
+        written = {}
+        ordered = sorted(selected, key=lambda rel_path: reader.files[rel_path].offset)
+        for number, rel_path in enumerate(ordered, 1):
+            if cancel_event and cancel_event.is_set():
+                break
+            if callback:
+                callback(f"Processing ({number}/{len(ordered)}): {rel_path}", number / len(ordered))
+            source = reader.files[rel_path]
+            extra = None
+            if source.truncated:
+                extra = {'truncated': True}
+                if source.hash_scope != 'file':
+                    extra['hash_scope'] = source.hash_scope
+
+            original = written.get(source.offset)
+            if original is not None and not source.truncated:
+                outfile.write(f"/* ===== {rel_path} ===== (same as {original[0]}) */\n\n")
+                entries.append((rel_path,) + original[1][1:5] + ({'same_as': original[0]},))
+                continue
+
+            outfile.write(f"/* ===== {rel_path} ===== */\n")
+            entry = (rel_path, outfile.tell(), source.length, source.lines, source.hash, extra)
+            position = source.offset
+            end = source.offset + source.length
+            while position < end:
+                chunk = reader.read_range(position, min(end - position, COPY_CHUNK_SIZE))
+                outfile.write_bytes(chunk)
+                position += len(chunk)
+            if source.truncated:
+                outfile.write_bytes(self._truncation_marker(reader, end))
+            else:
+                outfile.write("\n\n")
+            entries.append(entry)
+            written.setdefault(source.offset, (rel_path, entry))
+        return entries
+
+    def _truncation_marker(self, reader, content_end):
+        """The marker that follows a truncated file's content in the source, with its line breaks."""
+        window = reader.read_range(content_end, TRUNCATION_MARKER_WINDOW)
+        end = window.find(TRUNCATION_MARKER_END)
+        if end < 0:
+            raise ValueError("truncated segment without its marker")
+        end += len(TRUNCATION_MARKER_END) + 2 * len(os.linesep)
+        return window[:end]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="codebase-tracker-extract",
+        description="Write the files of an existing snapshot selected by globs to a smaller snapshot."
+    )
+    parser.add_argument("snapshot", help="Snapshot to read, e.g. .codebase/codebase.txt (needs its .index.json)")
+    parser.add_argument("-i", "--include", action='append', default=[], metavar="GLOB",
+                        help="Keep files matching this .gitignore-style glob (repeatable; default: all files)")
+    parser.add_argument("-x", "--exclude", action='append', default=[], metavar="GLOB",
+                        help="Leave out files matching this glob (repeatable)")
+    parser.add_argument("-o", "--output",
+                        help="Output file (default: <snapshot name>.extract.txt next to the snapshot)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Do not print progress to stderr")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    extractor = SnapshotExtractor(args.snapshot, args.output, args.include, args.exclude)
+    success, message, stats = extractor.extract(StderrProgress(quiet=args.quiet))
+    if not success:
+        print(f"Error: {message}", file=sys.stderr)
+        return 1
+    if not args.quiet:
+        print(f"{message} {stats['raw_bytes']:,} of {stats['source_bytes']:,} bytes", file=sys.stderr)
+    print(stats['output_file'], flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
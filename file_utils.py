@@ -1,5 +1,6 @@
 import os
 import mimetypes
+import threading
 from pathlib import Path
 
 # Common binary file extensions
@@ -33,6 +34,18 @@ COMMON_TEXT_FILES = [
     'manifest.json', 'config.xml', 'pom.xml', 'build.gradle', 'settings.gradle',
     'cmakelists.txt'
 ]
+COMMON_TEXT_FILES_SET = frozenset(COMMON_TEXT_FILES)
+
+
+# Bytes read from the start of a file when its name and MIME type don't decide text vs binary
+TEXT_SNIFF_SIZE = 4096
+
+# Minified/generated file detection: name patterns, then the shape of the first bytes
+GENERATED_NAME_SUFFIXES = ('.min.js', '.min.mjs', '.min.css', '.bundle.js', '.chunk.js', '.js.map', '.css.map')
+GENERATED_SAMPLE_SIZE = 64 * 1024
+GENERATED_MIN_SAMPLE = 1024
+GENERATED_MAX_LINE_LENGTH = 2000
+GENERATED_MAX_AVERAGE_LINE_LENGTH = 300
 
 
 def is_text_file(file_path):
@@ -40,52 +53,99 @@ def is_text_file(file_path):
     Determine if a file is likely a text file that can be safely read.
     Returns True if file is text, False if not.
     """
-    file_path = Path(file_path)
+    is_text = classify_by_name(file_path)
+    if is_text is None:
+        is_text, _ = sniff_text_file(file_path)
+    return is_text
+
+
+def classify_by_name(file_path):
+    """
+    The part of is_text_file that only looks at the file name.
+    Returns True or False, or None if the file's content has to be sniffed.
+    """
+    # Plain string operations: this runs for every file in the scan, so avoid building a Path
+    file_path = os.fspath(file_path)
+    name = os.path.basename(file_path)
 
     # Check by name for common text files - check this first to ensure these are always treated as text
-    if file_path.name.lower() in COMMON_TEXT_FILES:
+    if name.lower() in COMMON_TEXT_FILES_SET:
         return True
 
     # Special case for .env files and lock files
-    if file_path.name.endswith('.env') or file_path.name.endswith('.lock'):
+    if name.endswith('.env') or name.endswith('.lock'):
         return True
 
-    # Skip by extension
-    if file_path.suffix.lower().lstrip('.') in NON_TEXT_EXTENSIONS:
+    # Skip by extension (same rule as Path.suffix: a leading or trailing dot is not an extension)
+    dot = name.rfind('.')
+    extension = name[dot + 1:].lower() if 0 < dot < len(name) - 1 else ''
+    if extension in NON_TEXT_EXTENSIONS:
         return False
 
     # Check MIME type
-    mime_type, _ = mimetypes.guess_type(str(file_path))
+    mime_type, _ = mimetypes.guess_type(file_path)
     if mime_type:
         if any(mime_type.startswith(prefix) for prefix in READABLE_MIME_PREFIXES):
             return True
         if (mime_type.startswith('image/') or mime_type.startswith('audio/') or
                 mime_type.startswith('video/') or mime_type.startswith('font/')):
             return False
+    return None
+
 
+def sniff_text_file(file_path):
+    """
+    The content check of is_text_file. Returns (is_text, chunk) where chunk is the first
+    TEXT_SNIFF_SIZE bytes that were read, or None if the file couldn't be read.
+    """
     # === PERFORMANCE OPTIMIZATION: Replaced chardet with a faster null-byte check ===
     try:
         # For files without extension or unknown MIME type, use a fast heuristic.
         # Check for NULL bytes in the first few KB, which is a strong indicator of a binary file.
         with open(file_path, 'rb') as f:
-            chunk = f.read(4096)  # Read first 4KB
-            if not chunk:
-                return True  # Empty file is considered text
-
-            # If a NULL byte is found, it's almost certainly a binary file.
-            if b'\0' in chunk:
-                return False
-        
-        # If no NULL bytes, it's likely a text file.
-        # We can still attempt to decode as UTF-8 as a final check.
-        try:
-            chunk.decode('utf-8')
-            return True
-        except UnicodeDecodeError:
-            return False  # Contains non-UTF8 characters, treat as binary.
-
+            chunk = f.read(TEXT_SNIFF_SIZE)  # Read first 4KB
     except (IOError, OSError):
-        return False
+        return False, None
+
+    if not chunk:
+        return True, chunk  # Empty file is considered text
+
+    # If a NULL byte is found, it's almost certainly a binary file.
+    if b'\0' in chunk:
+        return False, chunk
+
+    # If no NULL bytes, it's likely a text file.
+    # We can still attempt to decode as UTF-8 as a final check.
+    try:
+        chunk.decode('utf-8')
+        return True, chunk
+    except UnicodeDecodeError:
+        return False, chunk  # Contains non-UTF8 characters, treat as binary.
+
+
+def is_generated_name(file_name):
+    """True for file names that are build artifacts by convention (app.min.js, vendor.css.map, ...)."""
+    return file_name.lower().endswith(GENERATED_NAME_SUFFIXES)
+
+
+def detect_generated(sample):
+    """
+    Cheap check of a file's first bytes for minified or generated content.
+    Returns a short reason, or None if the file looks hand-written.
+    """
+    head = sample[:2048]
+    if b'@generated' in head or (b'DO NOT EDIT' in head and b'enerated' in head):
+        return "marked as generated"
+    if len(sample) < GENERATED_MIN_SAMPLE:
+        return None
+
+    longest = max(len(line) for line in sample.split(b'\n'))
+    if longest > GENERATED_MAX_LINE_LENGTH:
+        return f"minified: line of {longest}+ bytes"
+    average = len(sample) / (sample.count(b'\n') + 1)
+    if average > GENERATED_MAX_AVERAGE_LINE_LENGTH:
+        return f"minified: {average:.0f} bytes per line on average"
+    return None
 
 
 def format_file_size(size_bytes):
@@ -110,6 +170,25 @@ def ensure_directory(directory_path):
     return path
 
 
+def temp_path(path, suffix='.tmp'):
+    """
+    A temporary name next to `path` for writing it atomically, unique to this process and
+    thread so concurrent runs writing the same file don't clobber each other's temp files.
+    """
+    return path.with_name(f"{path.name}.{os.getpid()}-{threading.get_ident()}{suffix}")
+
+
 def get_relative_path(file_path, base_path):
     """Get the path of a file relative to the base path"""
-    return os.path.relpath(file_path, base_path)
\ No newline at end of file
+    return os.path.relpath(file_path, base_path)
+
+
+def decode_text(raw):
+    """
+    Decode raw file bytes exactly like open(path, 'r', encoding='utf-8', errors='replace').read():
+    invalid sequences become U+FFFD and '\\r\\n' / '\\r' newlines are translated to '\\n'.
+    """
+    text = raw.decode('utf-8', errors='replace')
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
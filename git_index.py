@@ -0,0 +1,152 @@
+import os
+import struct
+
+# Entry modes (the type bits of st_mode as git stores them)
+MODE_DIRECTORY = 0o040000
+MODE_SYMLINK = 0o120000
+MODE_GITLINK = 0o160000
+_TYPE_MASK = 0o170000
+
+_HEADER = struct.Struct('>4sII')
+# ctime, mtime (seconds, nanoseconds), dev, ino, mode, uid, gid, size
+_STAT_DATA = struct.Struct('>10I')
+_FLAGS = struct.Struct('>H')
+_FLAG_EXTENDED = 0x4000
+_FLAG_STAGE = 0x3000
+_FLAG_NAME_LENGTH = 0x0fff
+_EXTENDED_SKIP_WORKTREE = 0x4000
+
+
+class GitIndexError(ValueError):
+    """The index file is missing, truncated or in a format this parser doesn't know."""
+
+
+def find_git_index(project_path):
+    """
+    Return (index path, repository root) for the repository containing project_path, or None.
+    Handles a .git directory as well as a .git file pointing elsewhere (worktrees, submodules).
+    """
+    directory = os.path.abspath(project_path)
+    while True:
+        dot_git = os.path.join(directory, '.git')
+        if os.path.isdir(dot_git):
+            return os.path.join(dot_git, 'index'), directory
+        if os.path.isfile(dot_git):
+            try:
+                with open(dot_git, 'r', encoding='utf-8') as f:
+                    line = f.readline().strip()
+            except OSError:
+                return None
+            if not line.startswith('gitdir:'):
+                return None
+            git_dir = os.path.join(directory, line[len('gitdir:'):].strip())
+            return os.path.join(git_dir, 'index'), directory
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+def _hash_size(index_path):
+    """20 bytes for SHA-1 repositories, 32 for SHA-256 ones (extensions.objectFormat)."""
+    git_dir = os.path.dirname(index_path)
+    # A linked worktree keeps its config in the common directory
+    try:
+        with open(os.path.join(git_dir, 'commondir'), 'r', encoding='utf-8') as f:
+            git_dir = os.path.join(git_dir, f.read().strip())
+    except OSError:
+        pass
+    try:
+        with open(os.path.join(git_dir, 'config'), 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                key, _, value = line.partition('=')
+                if key.strip().lower() == 'objectformat' and value.strip().lower() == 'sha256':
+                    return 32
+    except OSError:
+        pass
+    return 20
+
+
+def read_git_index(index_path):
+    """
+    Parse a git index file (versions 2, 3 and 4) and return its entries as (path, mode)
+    pairs, paths relative to the repository root with '/' separators, sorted as git sorts
+    them. Conflicted paths appear once; entries marked skip-worktree (not checked out in a
+    sparse checkout) are left out. Raises GitIndexError for files it can't parse.
+    """
+    try:
+        with open(index_path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        raise GitIndexError(f"can't read {index_path}: {e}") from e
+    if len(data) < _HEADER.size:
+        raise GitIndexError("index file is truncated")
+    signature, version, count = _HEADER.unpack_from(data, 0)
+    if signature != b'DIRC':
+        raise GitIndexError("not a git index file")
+    if version not in (2, 3, 4):
+        raise GitIndexError(f"unsupported index version {version}")
+
+    hash_size = _hash_size(index_path)
+    entries = []
+    previous_path = b''
+    offset = _HEADER.size
+    unpack_stat = _STAT_DATA.unpack_from
+    unpack_flags = _FLAGS.unpack_from
+    try:
+        for _ in range(count):
+            start = offset
+            mode = unpack_stat(data, offset)[6]
+            offset += _STAT_DATA.size + hash_size
+            flags = unpack_flags(data, offset)[0]
+            offset += 2
+            skip_worktree = False
+            if flags & _FLAG_EXTENDED:
+                if version < 3:
+                    raise GitIndexError("extended entry flags in a version 2 index")
+                skip_worktree = bool(unpack_flags(data, offset)[0] & _EXTENDED_SKIP_WORKTREE)
+                offset += 2
+
+            if version == 4:
+                # The path is the previous one minus `strip` trailing bytes, plus a suffix
+                strip, offset = _read_varint(data, offset)
+                end = data.index(b'\0', offset)
+                path = previous_path[:len(previous_path) - strip] + data[offset:end]
+                offset = end + 1
+                previous_path = path
+            else:
+                name_length = flags & _FLAG_NAME_LENGTH
+                if name_length < _FLAG_NAME_LENGTH:
+                    end = offset + name_length
+                else:
+                    # Names of 0xfff bytes or more are only NUL-terminated
+                    end = data.index(b'\0', offset)
+                path = data[offset:end]
+                # 1 to 8 NULs pad the entry to a multiple of 8 bytes
+                offset = start + ((end - start) // 8 + 1) * 8
+
+            if skip_worktree:
+                continue
+            if flags & _FLAG_STAGE and entries and entries[-1][0] == path:
+                # Further stages of a conflicted path
+                continue
+            entries.append((path, mode & _TYPE_MASK))
+    except (struct.error, ValueError) as e:
+        if isinstance(e, GitIndexError):
+            raise
+        raise GitIndexError(f"index file is truncated or corrupt: {e}") from e
+    if offset > len(data):
+        raise GitIndexError("index file is truncated")
+    return [(os.fsdecode(path).rstrip('/'), mode) for path, mode in entries]
+
+
+def _read_varint(data, offset):
+    """Git's offset varint: 7 bits per byte, most significant first, with a +1 per continuation."""
+    byte = data[offset]
+    offset += 1
+    value = byte & 0x7f
+    while byte & 0x80:
+        byte = data[offset]
+        offset += 1
+        value = ((value + 1) << 7) | (byte & 0x7f)
+    return value, offset
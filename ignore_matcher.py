@@ -0,0 +1,241 @@
+import re
+
+# Shapes of the regexes pathspec's gitwildmatch generates for the most common patterns.
+# LIT is a run of literal (escaped) characters without a slash.
+_LIT = r'((?:\\[^A-Za-z0-9]|[^\\.^$*+?{}\[\]|()/])+)'
+_SIMPLE_SHAPES = [
+    # 'name'   -> any path component equals name
+    ('name', re.compile(r'\^\(\?:\.\+/\)\?' + _LIT + r'\(\?:\(\?P<ps_d>/\)\.\*\)\?\$\Z')),
+    # 'name/'  -> any directory component (not the last one) equals name
+    ('dir', re.compile(r'\^\(\?:\.\+/\)\?' + _LIT + r'\(\?P<ps_d>/\)\.\*\$\Z')),
+    # '*.ext'  -> any path component ends with .ext
+    ('suffix', re.compile(r'\^\(\?:\.\+/\)\?\[\^/\]\*' + _LIT + r'\(\?:\(\?P<ps_d>/\)\.\*\)\?\$\Z')),
+    # '*.ext/' -> any directory component ends with .ext
+    ('dir_suffix', re.compile(r'\^\(\?:\.\+/\)\?\[\^/\]\*' + _LIT + r'\(\?P<ps_d>/\)\.\*\$\Z')),
+]
+_UNESCAPE = re.compile(r'\\(.)')
+# Last-dot extension of every component of a path ('a.b/c.tar.gz' -> ['.b', '.gz'])
+_EXTENSIONS = re.compile(r'\.[^./]*(?=/|\Z)')
+
+
+def _classify(regex_source):
+    """Return (kind, literal) for patterns that can be answered with hash lookups, else None."""
+    for kind, shape in _SIMPLE_SHAPES:
+        match = shape.match(regex_source)
+        if match:
+            return kind, _UNESCAPE.sub(r'\1', match.group(1))
+    return None
+
+
+class CompiledRuleSet:
+    """
+    One rule set (e.g. a .gitignore file) compiled for fast matching.
+
+    Within a rule set the last matching pattern wins, so every table maps to the
+    highest pattern index for its key; only regexes with a higher index than the
+    best hash-table hit still need to run.
+    """
+
+    def __init__(self, patterns):
+        """`patterns` are pathspec patterns, e.g. PathSpec.patterns."""
+        self.include = []
+        self.names = {}
+        self.dir_names = {}
+        self.extensions = {}
+        self.dir_extensions = {}
+        self.suffixes = []
+        self.dir_suffixes = []
+        self.regexes = []
+
+        for pattern in patterns:
+            if pattern.include is None:
+                continue
+            index = len(self.include)
+            self.include.append(pattern.include)
+
+            simple = _classify(pattern.regex.pattern)
+            if simple is None:
+                self.regexes.append((index, pattern.regex))
+                continue
+
+            kind, literal = simple
+            if kind == 'name':
+                self.names[literal] = index
+            elif kind == 'dir':
+                self.dir_names[literal] = index
+            elif literal.startswith('.') and '.' not in literal[1:]:
+                # '*.log' is a plain extension lookup on the component's last dot
+                table = self.extensions if kind == 'suffix' else self.dir_extensions
+                table[literal] = index
+            else:
+                (self.suffixes if kind == 'suffix' else self.dir_suffixes).append((index, literal))
+
+        # Highest index first so the first regex that matches is the winner
+        self.regexes.reverse()
+        self.has_negation = not all(self.include)
+
+    def match(self, path, parts=None):
+        """True if the last pattern matching `path` is an ignore (not a '!') pattern."""
+        return self.result(path, parts) is True
+
+    def result(self, path, parts=None):
+        """
+        Return True (ignored) or False (re-included by a '!' pattern) according to the
+        last matching pattern, or None if no pattern matches `path`.
+        `parts` is the _PathParts of `path` when the caller already has it.
+        """
+        if parts is None:
+            parts = _PathParts(path)
+        best = -1
+        if self.names:
+            for key in parts.names.intersection(self.names):
+                best = max(best, self.names[key])
+        if self.dir_names:
+            for key in parts.dir_names.intersection(self.dir_names):
+                best = max(best, self.dir_names[key])
+        if self.extensions:
+            for key in parts.extensions.intersection(self.extensions):
+                best = max(best, self.extensions[key])
+        if self.dir_extensions:
+            for key in parts.dir_extensions.intersection(self.dir_extensions):
+                best = max(best, self.dir_extensions[key])
+        for index, suffix in self.suffixes:
+            if index > best and any(name.endswith(suffix) for name in parts.names):
+                best = index
+        for index, suffix in self.dir_suffixes:
+            if index > best and any(name.endswith(suffix) for name in parts.dir_names):
+                best = index
+
+        # Without negations any hit settles the answer
+        if best >= 0 and not self.has_negation:
+            return True
+
+        for index, regex in self.regexes:
+            if index <= best:
+                break
+            if regex.match(path) is not None:
+                best = index
+                break
+
+        return self.include[best] if best >= 0 else None
+
+
+class _PathParts:
+    """Components and extensions of one path, split once and looked up by every rule set."""
+
+    __slots__ = ('names', 'dir_names', 'extensions', 'dir_extensions')
+
+    def __init__(self, path):
+        components = path.split('/')
+        last = components.pop()
+        self.dir_names = set(components)
+        self.names = self.dir_names | {last}
+        self.dir_extensions = {name[name.rfind('.'):] for name in components if '.' in name}
+        self.extensions = self.dir_extensions | {last[last.rfind('.'):]} if '.' in last else self.dir_extensions
+
+
+class CompiledIgnoreMatcher:
+    """
+    Precompiled union of several gitwildmatch rule sets.
+
+    A path is ignored if any rule set ignores it, with negation ('!pattern')
+    handled inside each rule set exactly like pathspec's PathSpec.match_file.
+
+    Rule sets without negations are merged: a hit in any of their basename
+    ('node_modules/', '.env') or extension ('*.log') hash sets is a match
+    without running a regex, and their remaining patterns are joined into a
+    single alternation. Rule sets with negations keep their own ordered tables.
+    """
+
+    def __init__(self, path_specs):
+        compiled = [CompiledRuleSet(spec.patterns) for spec in path_specs]
+        plain = [spec for spec in compiled if not spec.has_negation]
+        self.ordered_specs = [spec for spec in compiled if spec.has_negation]
+
+        self.names = frozenset(name for spec in plain for name in spec.names)
+        self.dir_names = frozenset(name for spec in plain for name in spec.dir_names)
+        self.extensions = frozenset(ext for spec in plain for ext in spec.extensions)
+        self.dir_extensions = frozenset(ext for spec in plain for ext in spec.dir_extensions)
+        self.suffixes = tuple(suffix for spec in plain for _, suffix in spec.suffixes)
+        self.dir_suffixes = tuple(suffix for spec in plain for _, suffix in spec.dir_suffixes)
+
+        # Named groups would clash once the regexes are joined, so make them non-capturing
+        sources = [regex.pattern.replace('(?P<ps_d>', '(?:') for spec in plain for _, regex in spec.regexes]
+        self.regex = re.compile('|'.join(f'(?:{source})' for source in sources)) if sources else None
+
+    def match(self, path):
+        """`path` must be relative and use '/' separators."""
+        components = path.split('/')
+        if not self.names.isdisjoint(components):
+            return True
+        if self.extensions and not self.extensions.isdisjoint(_EXTENSIONS.findall(path)):
+            return True
+
+        slash = path.rfind('/')
+        if slash >= 0:
+            directories = components[:-1]
+            if not self.dir_names.isdisjoint(directories):
+                return True
+            if self.dir_extensions and not self.dir_extensions.isdisjoint(_EXTENSIONS.findall(path, 0, slash)):
+                return True
+            for suffix in self.dir_suffixes:
+                if any(name.endswith(suffix) for name in directories):
+                    return True
+        for suffix in self.suffixes:
+            if any(name.endswith(suffix) for name in components):
+                return True
+
+        if self.regex is not None and self.regex.match(path) is not None:
+            return True
+
+        if self.ordered_specs:
+            parts = _PathParts(path)
+            for spec in self.ordered_specs:
+                if spec.match(path, parts):
+                    return True
+        return False
+
+
+class PathPrefixTrie:
+    """
+    Set of directory paths that answers "is this path one of them or inside one of them"
+    in O(depth), instead of scanning every stored directory with startswith().
+    """
+
+    _TERMINAL = object()
+
+    def __init__(self, paths=()):
+        self.root = {}
+        for path in paths:
+            self.add(path)
+
+    def add(self, path):
+        node = self.root
+        for part in path.split('/'):
+            if part:
+                node = node.setdefault(part, {})
+        node[self._TERMINAL] = True
+
+    def covers(self, path):
+        node = self.root
+        for part in path.split('/'):
+            if not part:
+                continue
+            node = node.get(part)
+            if node is None:
+                return False
+            if self._TERMINAL in node:
+                return True
+        return False
+
+    def child(self, node, part):
+        """
+        Step one path component down from `node` (None means "not under any stored path").
+        Lets callers walking a path component by component check coverage in O(1) per step.
+        """
+        if node is None:
+            return None
+        return node.get(part)
+
+    def is_terminal(self, node):
+        return node is not None and self._TERMINAL in node
@@ -1,7 +1,9 @@
 import os
+import sys
 import pathspec
 from pathlib import Path
 from file_utils import ensure_directory
+from ignore_matcher import CompiledIgnoreMatcher, CompiledRuleSet
 
 DEFAULT_IGNORE_PATTERNS = [
     '.git/', 'node_modules/', 'vendor/', 'bower_components/', 'storage/',
@@ -16,6 +18,21 @@ TRACK_IGNORE_FILENAME = "track_ignore.txt"
 TRACK_IGNORE_HEADER = "# File này giúp bạn bỏ qua (ignore) các file và thư mục không cần thiết khỏi quá trình quét codebase của bạn (Cú pháp tương tự như .gitignore). Bạn có thể bỏ qua code của thư viện, file nhị phân, folder không cần thiết để codebase nhẹ hơn."
 TRACK_IGNORE_EXAMPLE = "# Ví dụ: build/\n# Ví dụ: *.log\n"
 
+GITIGNORE_FILENAME = ".gitignore"
+
+_default_spec = None
+
+
+def default_ignore_spec():
+    """
+    DEFAULT_IGNORE_PATTERNS compiled once per process and shared by every IgnoreRules;
+    nothing modifies a PathSpec after it is built. Batch workers compile it up front.
+    """
+    global _default_spec
+    if _default_spec is None:
+        _default_spec = pathspec.PathSpec.from_lines('gitwildmatch', DEFAULT_IGNORE_PATTERNS)
+    return _default_spec
+
 
 class IgnoreRules:
     def __init__(self, project_path):
@@ -23,6 +40,12 @@ class IgnoreRules:
         self.codebase_dir = self.project_path / '.codebase'
         self.rules = []
         self.gitignore_found = False
+        self.gitignore_spec = None
+        # Nested .gitignore files, loaded lazily as the scanner enters directories:
+        # posix relative dir -> (mtime_ns, size, CompiledRuleSet or None, patterns)
+        self.nested_gitignores = {}
+        # Nested .gitignore files seen by the current scan, for the rule summary
+        self.active_nested_gitignores = set()
         
         # --- UPDATED: Renamed variables for clarity ---
         self.track_ignore_found = False
@@ -36,6 +59,12 @@ class IgnoreRules:
         # --- UPDATED: Call the new method ---
         self._load_track_ignore()
         self._add_default_patterns()
+        # All rule sets merged into one matcher; is_ignored() never calls PathSpec.match_file
+        self.matcher = CompiledIgnoreMatcher(self.rules)
+        # Below a nested .gitignore the root .gitignore joins the per-directory hierarchy
+        # instead, so deeper files can override it (including '!' re-includes)
+        self.non_git_matcher = CompiledIgnoreMatcher([r for r in self.rules if r is not self.gitignore_spec])
+        self.root_gitignore = CompiledRuleSet(self.gitignore_spec.patterns) if self.gitignore_spec else None
 
     def _load_gitignore(self):
         """Load rules from .gitignore file if it exists"""
@@ -46,7 +75,8 @@ class IgnoreRules:
                     gitignore_content = f.read()
                 gitignore_lines = gitignore_content.splitlines()
                 self.gitignore_patterns = [line for line in gitignore_lines if line.strip() and not line.strip().startswith('#')]
-                self.rules.append(pathspec.PathSpec.from_lines('gitwildmatch', gitignore_lines))
+                self.gitignore_spec = pathspec.PathSpec.from_lines('gitwildmatch', gitignore_lines)
+                self.rules.append(self.gitignore_spec)
                 self.gitignore_found = True
             except Exception as e:
                 print(f"Error loading .gitignore: {e}")
@@ -92,12 +122,47 @@ class IgnoreRules:
 
     def _add_default_patterns(self):
         """Add default ignore patterns"""
-        self.rules.append(pathspec.PathSpec.from_lines('gitwildmatch', DEFAULT_IGNORE_PATTERNS))
+        self.rules.append(default_ignore_spec())
 
-    def is_ignored(self, path):
+    def load_nested_gitignore(self, rel_dir, gitignore_path, stat_result=None):
+        """
+        Load (or return the cached) rules of a .gitignore below the project root.
+        rel_dir is the directory relative to the project root; the cache entry is reused
+        as long as the file's size and mtime are unchanged.
+        Returns a CompiledRuleSet, or None if the file has no usable patterns.
+        """
+        rel_dir = rel_dir.replace('\\', '/').strip('/')
+        self.active_nested_gitignores.add(rel_dir)
+        try:
+            stat_result = stat_result or os.stat(gitignore_path)
+        except OSError:
+            return None
+
+        cached = self.nested_gitignores.get(rel_dir)
+        if cached and cached[0] == stat_result.st_mtime_ns and cached[1] == stat_result.st_size:
+            return cached[2]
+
+        rule_set = None
+        patterns = []
+        try:
+            with open(gitignore_path, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+            patterns = [line for line in lines if line.strip() and not line.strip().startswith('#')]
+            if patterns:
+                rule_set = CompiledRuleSet(pathspec.PathSpec.from_lines('gitwildmatch', lines).patterns)
+        except Exception as e:
+            print(f"Error loading {rel_dir}/{GITIGNORE_FILENAME}: {e}", file=sys.stderr)
+        self.nested_gitignores[rel_dir] = (stat_result.st_mtime_ns, stat_result.st_size, rule_set, patterns)
+        return rule_set
+
+    def is_ignored(self, path, is_dir=False, scope=()):
         """
         Check if a path should be ignored based on rules.
         Returns True if the path should be ignored.
+
+        is_dir marks directories, so 'name/' patterns match the directory itself and it can be
+        pruned. scope is the chain of (posix dir prefix, CompiledRuleSet) for the nested
+        .gitignore files above the path, ordered from the root downwards.
         """
         if isinstance(path, Path):
             rel_path = path.relative_to(self.project_path) if path.is_absolute() else path
@@ -108,12 +173,33 @@ class IgnoreRules:
         if path_str == '.codebase' or path_str.startswith('.codebase/'):
             return True
 
-        for rule_set in self.rules:
-            if rule_set.match_file(path_str):
-                return True
+        if is_dir:
+            path_str += '/'
+
+        if not scope:
+            return self.matcher.match(path_str)
 
+        if self.non_git_matcher.match(path_str):
+            return True
+        # Like git: the deepest .gitignore with a matching pattern decides
+        for prefix, rule_set in reversed(scope):
+            result = rule_set.result(path_str[len(prefix):])
+            if result is not None:
+                return result
+        if self.root_gitignore is not None:
+            return self.root_gitignore.result(path_str) is True
         return False
 
+    def is_always_ignored(self, path, is_dir=False):
+        """
+        True if a relative path is ignored whatever .gitignore files apply to it, i.e. by the
+        .codebase rule, default patterns or track_ignore.txt. Used to drop irrelevant file events.
+        """
+        path_str = path.replace('\\', '/')
+        if path_str == '.codebase' or path_str.startswith('.codebase/'):
+            return True
+        return self.non_git_matcher.match(path_str + '/' if is_dir else path_str)
+
     def get_rule_summary(self):
         """Get a summary of all ignore rules for reporting"""
         # --- UPDATED: Use the new key 'track_ignore' ---
@@ -122,6 +208,11 @@ class IgnoreRules:
                 'found': self.gitignore_found,
                 'patterns': self.gitignore_patterns
             },
+            'nested_gitignore': {
+                rel_dir: self.nested_gitignores[rel_dir][3]
+                for rel_dir in sorted(self.active_nested_gitignores)
+                if rel_dir in self.nested_gitignores
+            },
             'track_ignore': {
                 'found': self.track_ignore_found,
                 'patterns': self.track_ignore_patterns
@@ -0,0 +1,87 @@
+import array
+import mmap
+import os
+
+# Bytes scanned for line breaks per step of build()
+INDEX_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+class LineIndex:
+    """
+    Random access to the lines of a large text file through an mmap.
+
+    build() records the byte offset at which every line starts, in an array of
+    8-byte integers (about 80 MB for 10 million lines, against the file itself
+    never being loaded). It can run on a background thread while lines() serves
+    the part indexed so far. Line breaks are '\\n'; a trailing '\\r' is stripped
+    from each line, so CRLF output reads the same.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        # mmap can't map an empty file
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b''
+        self.offsets = array.array('Q', [0])
+        self.indexed_bytes = 0
+        self.complete = self.size == 0
+
+    def build(self, cancel_event=None, callback=None, chunk_size=INDEX_CHUNK_SIZE):
+        """
+        Index the whole file; callback(indexed bytes, size) is called after every chunk.
+        Returns False if cancel_event was set before the end.
+        """
+        offsets = self.offsets
+        position = self.indexed_bytes
+        while position < self.size:
+            if cancel_event is not None and cancel_event.is_set():
+                return False
+            end = min(position + chunk_size, self.size)
+            pieces = self._map[position:end].split(b'\n')
+            starts = []
+            start = position
+            # The last piece runs on into the next chunk
+            for index in range(len(pieces) - 1):
+                start += len(pieces[index]) + 1
+                starts.append(start)
+            # One extend per chunk, so readers never see a half-updated array
+            offsets.extend(starts)
+            position = self.indexed_bytes = end
+            if callback:
+                callback(position, self.size)
+        self.complete = True
+        return True
+
+    @property
+    def line_count(self):
+        """Lines indexed so far; a final line without a line break counts once the index is complete."""
+        count = len(self.offsets) - 1
+        if self.complete and self.offsets[-1] < self.size:
+            count += 1
+        return count
+
+    def lines(self, first, count):
+        """Decoded lines first .. first + count - 1 (0-based), fewer at the end of the indexed part."""
+        offsets = self.offsets
+        last = min(first + count, self.line_count)
+        result = []
+        for number in range(max(first, 0), last):
+            start = offsets[number]
+            end = offsets[number + 1] if number + 1 < len(offsets) else self.size
+            line = self._map[start:end].rstrip(b'\n')
+            if line.endswith(b'\r'):
+                line = line[:-1]
+            result.append(line.decode('utf-8', errors='replace'))
+        return result
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
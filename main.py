@@ -1,10 +1,17 @@
 import os
+import sys
 import mimetypes
-from tkinterdnd2 import TkinterDnD
-from ui import CodebaseTrackerUI
 
 
 def main():
+    # Any command-line arguments select the headless mode, which never loads Tk
+    if len(sys.argv) > 1:
+        from cli import main as cli_main
+        sys.exit(cli_main(sys.argv[1:]))
+
+    from tkinterdnd2 import TkinterDnD
+    from ui import CodebaseTrackerUI
+
     mimetypes.init()
 
     root = TkinterDnD.Tk()
@@ -0,0 +1,126 @@
+import json
+import os
+import time
+
+from file_utils import temp_path
+
+MANIFEST_VERSION = 2
+
+# Files modified this close to the previous snapshot may have changed again within
+# the same mtime tick (FAT has 2s resolution), so their stat data isn't trusted.
+RACY_WINDOW_NS = 2_000_000_000
+
+
+class SnapshotManifest:
+    """
+    Per-file record of the previous snapshot stored next to the output file.
+
+    Each entry keeps the file's size, mtime_ns, content hash and line count plus
+    the byte offset/length of its segment in the output, so unchanged files can be
+    copied from the previous output instead of being read and re-encoded.
+    """
+
+    def __init__(self, output_file, options=None):
+        self.output_file = output_file
+        # Settings that change what a file's segment looks like; a manifest written
+        # with different options can't vouch for its segments
+        self.options = options or {}
+        self.path = output_file.with_name(output_file.stem + '.manifest.json')
+        self.created_ns = time.time_ns()
+        self.files = {}
+        self.previous = {}
+        self.previous_created_ns = 0
+        self.reused_count = 0
+
+    def load(self):
+        """
+        Load the previous manifest. Its segments are only usable if the previous
+        output file still has exactly the size and mtime recorded when it was written.
+        Returns True if previous segments are available.
+        """
+        self.previous = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != MANIFEST_VERSION or data.get('options', {}) != self.options:
+                return False
+            output_stat = os.stat(self.output_file)
+            output_info = data.get('output', {})
+            if (output_stat.st_size != output_info.get('size') or
+                    output_stat.st_mtime_ns != output_info.get('mtime_ns')):
+                return False
+            self.previous = data.get('files', {})
+            self.previous_created_ns = data.get('created_ns', 0)
+        except (OSError, ValueError, AttributeError):
+            self.previous = {}
+        return bool(self.previous)
+
+    def load_entries(self):
+        """
+        Load the previous manifest's file entries only to compare files against them (delta
+        snapshots): unlike load() the previous output doesn't have to be intact, so its
+        segments must not be copied. Returns True if the manifest was read.
+        """
+        self.previous = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != MANIFEST_VERSION:
+                return False
+            self.previous = data.get('files', {})
+            self.previous_created_ns = data.get('created_ns', 0)
+        except (OSError, ValueError, AttributeError):
+            self.previous = {}
+            return False
+        return True
+
+    def lookup(self, relative_path, size):
+        """Return the previous entry for a path if its size still matches, else None."""
+        entry = self.previous.get(relative_path)
+        if entry is None or entry['size'] != size:
+            return None
+        return entry
+
+    def is_unchanged(self, entry, stat_result):
+        """True if stat data alone proves the file is the one recorded in `entry`."""
+        return (entry['size'] == stat_result.st_size and
+                entry['mtime_ns'] == stat_result.st_mtime_ns and
+                stat_result.st_mtime_ns < self.previous_created_ns - RACY_WINDOW_NS)
+
+    def record(self, relative_path, stat_result, content_hash, offset, length, chars, lines):
+        self.files[relative_path] = {
+            'size': stat_result.st_size,
+            'mtime_ns': stat_result.st_mtime_ns,
+            'hash': content_hash,
+            'offset': offset,
+            'length': length,
+            'chars': chars,
+            'lines': lines,
+        }
+
+    def shift_offsets(self, delta):
+        """Move every segment recorded so far by `delta` bytes (used when the body is written separately)."""
+        for entry in self.files.values():
+            entry['offset'] += delta
+
+    def save(self):
+        """Write the manifest for the output file that was just produced."""
+        output_stat = os.stat(self.output_file)
+        data = {
+            'version': MANIFEST_VERSION,
+            'created_ns': self.created_ns,
+            'options': self.options,
+            'output': {'size': output_stat.st_size, 'mtime_ns': output_stat.st_mtime_ns},
+            'files': self.files,
+        }
+        tmp_path = temp_path(self.path)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+
+    def discard(self):
+        """Remove the manifest, e.g. when the output was produced without it."""
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,50 @@
+class OutputBudget:
+    """
+    Limits on what goes into the file contents section of one snapshot.
+
+    max_output_bytes caps the bytes of all file segments together: the file that
+    crosses the limit is truncated with a marker and every later file is omitted.
+    skip_generated leaves out files that look minified or generated. Every file
+    skipped or truncated here is recorded in `items` as (relative path, reason)
+    for the ignored section.
+    """
+
+    def __init__(self, max_output_bytes=None, skip_generated=False):
+        self.max_output_bytes = max_output_bytes
+        self.skip_generated = skip_generated
+        self.start(0)
+
+    @property
+    def active(self):
+        return self.max_output_bytes is not None or self.skip_generated
+
+    def manifest_options(self):
+        """Options a previous snapshot must have been written with for its segments to be reused."""
+        return {'skip_generated': True} if self.skip_generated else {}
+
+    def start(self, body_offset):
+        """Reset for a new run whose file segments start at body_offset of the output."""
+        self.body_offset = body_offset
+        self.items = []
+        self.skipped = 0
+        self.truncated = 0
+        self.exhausted = False
+
+    def remaining(self, offset):
+        """Bytes left before the limit when the output is at `offset`, or None without a limit."""
+        if self.max_output_bytes is None:
+            return None
+        return self.max_output_bytes - (offset - self.body_offset)
+
+    def skip(self, relative_path, reason):
+        self.items.append((relative_path, reason))
+        self.skipped += 1
+
+    def omit(self, relative_path):
+        self.exhausted = True
+        self.skip(relative_path, "omitted: output size limit reached")
+
+    def truncate(self, relative_path, shown, size):
+        self.items.append((relative_path, f"truncated to {shown} of {size} bytes: output size limit reached"))
+        self.truncated += 1
+        self.exhausted = True
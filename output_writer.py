@@ -0,0 +1,175 @@
+import codecs
+import contextlib
+import io
+import os
+
+# name -> file suffix
+COMPRESSION_CODECS = {'gzip': '.gz', 'xz': '.xz', 'bz2': '.bz2'}
+DEFAULT_COMPRESSION_LEVELS = {'gzip': 6, 'xz': 6, 'bz2': 9}
+
+
+# The codec modules (and shutil, which imports them all) are loaded on first use so
+# uncompressed runs never pay for them
+def _gzip_writer(raw, level):
+    import gzip
+    return gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=level)
+
+
+def _xz_writer(raw, level):
+    import lzma
+    return lzma.LZMAFile(raw, 'wb', preset=level)
+
+
+def _bz2_writer(raw, level):
+    import bz2
+    return bz2.BZ2File(raw, 'wb', compresslevel=level)
+
+
+def _gzip_open(*args, **kwargs):
+    import gzip
+    return gzip.open(*args, **kwargs)
+
+
+def _xz_open(*args, **kwargs):
+    import lzma
+    return lzma.open(*args, **kwargs)
+
+
+def _bz2_open(*args, **kwargs):
+    import bz2
+    return bz2.open(*args, **kwargs)
+
+
+# name -> factory wrapping a binary file object for writing
+_WRITERS = {'gzip': _gzip_writer, 'xz': _xz_writer, 'bz2': _bz2_writer}
+_READERS = {'.gz': _gzip_open, '.xz': _xz_open, '.bz2': _bz2_open}
+# Bytes read per step of read_output_text()
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+class OutputWriter:
+    """
+    Binary output sink that encodes text the same way a text-mode file would
+    (UTF-8, '\\n' translated to os.linesep) while keeping an exact byte count.
+    Knowing the byte offsets lets callers record where each segment lives.
+
+    With `compression` ('gzip', 'xz' or 'bz2') the bytes go straight through the
+    stdlib compressor; offsets and bytes_written still count uncompressed bytes.
+    `sink`, if given, is called with every block of bytes written, uncompressed.
+    """
+
+    def __init__(self, path, compression=None, level=None, sink=None):
+        if compression is not None and compression not in COMPRESSION_CODECS:
+            raise ValueError(f"Unknown compression: {compression}")
+        self.path = path
+        self.compression = compression
+        self.level = level if level is not None else (DEFAULT_COMPRESSION_LEVELS[compression] if compression else None)
+        self._raw = open(path, 'wb')
+        self._file = self._open_stream()
+        self.bytes_written = 0
+        self.sink = sink
+
+    def _open_stream(self):
+        if self.compression is None:
+            return self._raw
+        return _WRITERS[self.compression](self._raw, self.level)
+
+    def write(self, text):
+        if os.linesep != '\n':
+            text = text.replace('\n', os.linesep)
+        return self.write_bytes(text.encode('utf-8'))
+
+    def write_bytes(self, data):
+        self._file.write(data)
+        if self.sink is not None:
+            self.sink(data)
+        self.bytes_written += len(data)
+        return len(data)
+
+    def append_compressed(self, path, raw_length):
+        """
+        Append a file written by another OutputWriter with the same compression, without
+        decompressing it: the current member/stream is finished and the file's bytes are
+        copied after it, which gzip, xz and bz2 readers all treat as one concatenated stream.
+        raw_length is its uncompressed size.
+        """
+        import shutil
+        self._file.close()
+        with open(path, 'rb') as source:
+            shutil.copyfileobj(source, self._raw)
+        self._file = self._open_stream()
+        self.bytes_written += raw_length
+
+    def tell(self):
+        return self.bytes_written
+
+    @property
+    def can_truncate(self):
+        # Bytes handed to the sink can't be taken back
+        return self.compression is None and self.sink is None
+
+    def truncate(self, offset):
+        """Discard everything written after `offset` (uncompressed output only)."""
+        self._file.flush()
+        self._file.truncate(offset)
+        self._file.seek(offset)
+        self.bytes_written = offset
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+        if not self._raw.closed:
+            self._raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def compression_suffix(compression):
+    return COMPRESSION_CODECS[compression] if compression else ''
+
+
+def open_output(path, mode='rb', **kwargs):
+    """Open an output file for reading, decompressing it if its suffix names a codec."""
+    opener = _READERS.get(os.path.splitext(os.fspath(path))[1].lower(), open)
+    return opener(path, mode, **kwargs)
+
+
+def is_compressed_output(path):
+    return os.path.splitext(os.fspath(path))[1].lower() in _READERS
+
+
+def decompress_output(path, target):
+    """Write the decompressed contents of a compressed output to `target`, in bounded chunks."""
+    import shutil
+    with open_output(path, 'rb') as source, open(target, 'wb') as dest:
+        shutil.copyfileobj(source, dest, 1024 * 1024)
+    return target
+
+
+def read_output_text(path, cancel_event=None, callback=None, chunk_size=READ_CHUNK_SIZE):
+    """
+    Decode a (possibly compressed) output file as UTF-8 text with '\n' line breaks, in chunks.
+    callback(bytes read, file size) reports progress in bytes of the file on disk.
+    Returns the text, or None if cancel_event was set before the end.
+    """
+    opener = _READERS.get(os.path.splitext(os.fspath(path))[1].lower())
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder('utf-8')(errors='replace'), translate=True)
+    parts = []
+    with open(path, 'rb') as raw:
+        total = os.fstat(raw.fileno()).st_size
+        with (opener(raw, 'rb') if opener else contextlib.nullcontext(raw)) as source:
+            while True:
+                if cancel_event is not None and cancel_event.is_set():
+                    return None
+                data = source.read(chunk_size)
+                if not data:
+                    break
+                parts.append(decoder.decode(data))
+                if callback:
+                    callback(raw.tell(), total)
+    parts.append(decoder.decode(b'', final=True))
+    return ''.join(parts)
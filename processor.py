@@ -1,6 +1,13 @@
+import queue
 import threading
 from scanner import FileScanner
 from combiner import FileCombiner
+from profiler import RunProfile, phase
+
+# Maximum number of discovered text files waiting for the combiner in streaming mode
+STREAM_QUEUE_SIZE = 256
+
+_SCAN_DONE = object()
 
 
 class ProjectProcessor:
@@ -8,24 +15,53 @@ class ProjectProcessor:
     Acts as a controller/facade to orchestrate the scanning and combining process.
     This decouples the business logic from the UI.
     """
-    def __init__(self, project_path):
+    def __init__(self, project_path, output_file=None, streaming=False, max_file_size=None,
+                 keep_scan_records=False, profile=False, git_index=False, untracked=False, **combiner_options):
         self.project_path = project_path
-        self.scanner = FileScanner(project_path)
-        self.combiner = FileCombiner(project_path)
+        # In streaming mode the scanner and combiner run concurrently instead of one after the other
+        self.streaming = streaming
+        # Collect per-phase timings and I/O counters into stats['profile'] and .codebase/profile.json
+        self.profile = profile
+        # keep_scan_records lets later runs rescan only changed directories (watch mode)
+        # git_index enumerates a git repository's tracked files (plus untracked ones with `untracked`)
+        # from .git/index instead of walking the tree
+        self.scanner = FileScanner(project_path, max_file_size=max_file_size, keep_dir_records=keep_scan_records,
+                                   use_git_index=git_index, include_untracked=untracked)
+        self.combiner = FileCombiner(
+            project_path, output_file=output_file, sniffed_chunks=self.scanner.sniffed_chunks, **combiner_options
+        )
 
-    def run(self, scan_callback, combine_callback, cancel_event: threading.Event):
+    def run(self, scan_callback, combine_callback, cancel_event: threading.Event, dirty=None):
         """
         Runs the full scan and combine process.
         Accepts callbacks for UI updates and a cancel_event for interruption.
+        `dirty` optionally limits rescanning to the given directories (see FileScanner.iter_scan).
         Returns (was_successful, message, stats)
         """
+        profile = RunProfile() if self.profile else None
+        self.scanner.profile = self.combiner.profile = profile
+        if self.streaming:
+            result = self._run_streaming(scan_callback, combine_callback, cancel_event, dirty)
+        else:
+            result = self._run_batch(scan_callback, combine_callback, cancel_event, dirty)
+
+        success, message, stats = result
+        if profile is not None and success:
+            stats['profile'] = profile.to_dict()
+            stats['profile_file'] = profile.save(self.scanner.ignore_rules.codebase_dir, stats['profile'])
+        return result
+
+    def _run_batch(self, scan_callback, combine_callback, cancel_event, dirty=None):
+        profile = self.scanner.profile
         try:
             # --- Scanning phase ---
             scan_callback("Scanning project files...", 0)
-            text_files, ignored_items, all_files = self.scanner.scan(
-                callback=scan_callback,
-                cancel_event=cancel_event
-            )
+            with phase(profile, 'scan'):
+                text_files, ignored_items, all_files = self.scanner.scan(
+                    callback=scan_callback,
+                    cancel_event=cancel_event,
+                    dirty=dirty
+                )
 
             if cancel_event.is_set():
                 return False, "Process was cancelled by user.", {}
@@ -34,12 +70,81 @@ class ProjectProcessor:
 
             # --- Combining phase ---
             combine_callback("Combining files...", 0.5)
-            success, message, stats = self.combiner.combine(
-                text_files, ignored_items,
-                self.scanner.ignore_rules, all_files,
-                callback=combine_callback,
-                cancel_event=cancel_event
-            )
+            with phase(profile, 'combine'):
+                success, message, stats = self.combiner.combine(
+                    text_files, ignored_items,
+                    self.scanner.ignore_rules, all_files,
+                    callback=combine_callback,
+                    cancel_event=cancel_event,
+                    scan_tree=self.scanner.tree
+                )
+
+            if cancel_event.is_set():
+                return False, "Process was cancelled by user.", {}
+
+            return success, message, stats
+
+        except Exception as e:
+            return False, f"An unexpected error occurred: {str(e)}", {}
+
+    def _run_streaming(self, scan_callback, combine_callback, cancel_event, dirty=None):
+        """
+        Pipelined run: the scanner walks the tree on a background thread and hands text files
+        to the combiner through a bounded queue, so writing starts with the first file found.
+        The tree and ignored sections are added by the combiner once the scan has finished.
+        """
+        ignored_items = []
+        all_files = []
+        text_queue = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+        stop_event = threading.Event()
+        scan_errors = []
+
+        def put(item):
+            # Give up if the combiner has stopped consuming, so the scanner thread can't block forever
+            while not stop_event.is_set():
+                try:
+                    text_queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce():
+            try:
+                with phase(self.scanner.profile, 'scan'):
+                    for item in self.scanner.iter_scan(ignored_items, all_files, scan_callback, cancel_event, dirty):
+                        if not put(item):
+                            return
+            except Exception as e:
+                scan_errors.append(e)
+            finally:
+                put(_SCAN_DONE)
+
+        def consume():
+            while True:
+                item = text_queue.get()
+                if item is _SCAN_DONE:
+                    if scan_errors:
+                        raise scan_errors[0]
+                    return
+                yield item
+
+        try:
+            scan_callback("Scanning and combining project files...", 0)
+            scan_thread = threading.Thread(target=produce, daemon=True)
+            scan_thread.start()
+            try:
+                with phase(self.combiner.profile, 'combine'):
+                    success, message, stats = self.combiner.combine_stream(
+                        consume(), ignored_items,
+                        self.scanner.ignore_rules, all_files,
+                        callback=combine_callback,
+                        cancel_event=cancel_event,
+                        scan_tree=self.scanner.tree
+                    )
+            finally:
+                stop_event.set()
+                scan_thread.join()
 
             if cancel_event.is_set():
                 return False, "Process was cancelled by user.", {}
@@ -47,4 +152,4 @@ class ProjectProcessor:
             return success, message, stats
 
         except Exception as e:
-            return False, f"An unexpected error occurred: {str(e)}", {}
\ No newline at end of file
+            return False, f"An unexpected error occurred: {str(e)}", {}
@@ -0,0 +1,150 @@
+import contextlib
+import functools
+import heapq
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+from file_utils import temp_path
+
+PROFILE_VERSION = 1
+PROFILE_FILENAME = "profile.json"
+# Number of slowest file reads kept
+DEFAULT_SLOWEST_COUNT = 10
+
+
+class RunProfile:
+    """
+    Timings and I/O counters of one ProjectProcessor run.
+
+    Phases record wall time and the CPU time of the thread that ran them; a phase
+    entered several times accumulates. timed() wraps hot functions such as the
+    ignore matcher to count calls and time. Counters and file reads may be recorded
+    from worker threads. Components hold None instead of a profile when profiling
+    is off, so the only cost then is that check.
+    """
+
+    def __init__(self, slowest_count=DEFAULT_SLOWEST_COUNT):
+        self.slowest_count = slowest_count
+        self.phases = {}
+        self.timers = {}
+        self.counters = {}
+        # Min-heap of (seconds, relative path, bytes) holding the slowest reads
+        self._slowest = []
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.thread_time() - cpu
+            with self._lock:
+                totals = self.phases.setdefault(name, [0.0, 0.0])
+                totals[0] += wall
+                totals[1] += cpu
+
+    def timed(self, name, function):
+        """Return a wrapper of function that adds its calls and time to timers[name]."""
+        totals = self.timers.setdefault(name, [0, 0.0])
+        perf_counter = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                # Only called from the scanning thread, so no lock
+                totals[0] += 1
+                totals[1] += perf_counter() - start
+        return wrapper
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record_read(self, relative_path, seconds, size):
+        """The combiner loaded a source file: count it and keep it if it is among the slowest."""
+        with self._lock:
+            self.counters['files_loaded'] = self.counters.get('files_loaded', 0) + 1
+            self.counters['bytes_loaded'] = self.counters.get('bytes_loaded', 0) + size
+            item = (seconds, relative_path, size)
+            if len(self._slowest) < self.slowest_count:
+                heapq.heappush(self._slowest, item)
+            elif item > self._slowest[0]:
+                heapq.heapreplace(self._slowest, item)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'total_seconds': round(time.perf_counter() - self._start, 6),
+                'phases': {name: {'wall_seconds': round(wall, 6), 'cpu_seconds': round(cpu, 6)}
+                           for name, (wall, cpu) in self.phases.items()},
+                'timers': {name: {'calls': calls, 'seconds': round(seconds, 6)}
+                           for name, (calls, seconds) in self.timers.items()},
+                'counters': dict(self.counters),
+                'slowest_reads': [{'path': path, 'seconds': round(seconds, 6), 'bytes': size}
+                                  for seconds, path, size in sorted(self._slowest, reverse=True)],
+            }
+
+    def save(self, directory, data=None):
+        """Write the profile as JSON to directory/profile.json; errors are only reported."""
+        path = os.path.join(directory, PROFILE_FILENAME)
+        data = dict(data or self.to_dict(), version=PROFILE_VERSION)
+        tmp_path = temp_path(Path(path))
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=1, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error saving profile: {e}", file=sys.stderr)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        return path
+
+
+def phase(profile, name):
+    """profile.phase(name), or a no-op context when profiling is off."""
+    return profile.phase(name) if profile is not None else _NO_PHASE
+
+
+def profiled(name):
+    """Method decorator: time each call as phase `name` of self.profile when it is set."""
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.profile is None:
+                return method(self, *args, **kwargs)
+            with self.profile.phase(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorate
+
+
+_NO_PHASE = contextlib.nullcontext()
+
+
+def summary_line(profile_data):
+    """One-line digest of a profile dict for the CLI and the UI."""
+    phases = profile_data['phases']
+    timers = profile_data['timers']
+    parts = []
+    for name in ('scan', 'tree', 'write', 'assemble', 'finish'):
+        if name in phases:
+            text = f"{name} {phases[name]['wall_seconds']:.2f}s"
+            if name == 'scan' and timers:
+                text += " (" + ", ".join(f"{timer} {timers[timer]['seconds']:.2f}s" for timer in sorted(timers)) + ")"
+            parts.append(text)
+    counters = profile_data['counters']
+    read = counters.get('bytes_loaded', 0) + counters.get('bytes_sniffed', 0)
+    parts.append(f"{read / 1024 / 1024:.1f} MB read, {counters.get('bytes_written', 0) / 1024 / 1024:.1f} MB written")
+    return " · ".join(parts)
@@ -0,0 +1,103 @@
+import collections
+import itertools
+import sys
+import time
+
+# Lines kept in the log; older ones are dropped
+DEFAULT_LOG_LINES = 500
+# Status messages that are also added to the log
+LOGGED_PREFIXES = ("Scanning:", "Processing")
+
+
+class ProgressState:
+    """
+    Latest status of a run, shared between worker threads and the UI.
+
+    Workers call update() for every message; it only stores the message and
+    appends per-file lines to the log ring, so it costs about the same whether
+    or not anything is watching. The UI calls poll() at its own frame rate and
+    gets the latest message, progress and the log lines added since its
+    previous poll; intermediate messages are simply skipped. The log keeps the
+    last `log_lines` lines, so a 100k-file run can't grow it without bound.
+
+    There is no lock: attribute stores, deque appends and next() on a counter
+    are atomic under the GIL, and log lines carry their own sequence number, so
+    poll() needs only one copy of the ring to tell which lines are new.
+    """
+
+    def __init__(self, log_lines=DEFAULT_LOG_LINES):
+        self.message = ""
+        # None until a determinate progress value is reported
+        self.progress = None
+        self.version = 0
+        self._versions = itertools.count(1)
+        # (sequence number, line) pairs
+        self._log = collections.deque(maxlen=log_lines)
+        self._line_numbers = itertools.count(1)
+
+    @property
+    def log_lines(self):
+        return self._log.maxlen
+
+    def update(self, message, progress=None):
+        """Record a status message; a progress of None or below 0 keeps the previous value."""
+        self.message = message
+        if progress is not None and progress >= 0:
+            self.progress = progress
+        if message.startswith(LOGGED_PREFIXES):
+            self._log.append((next(self._line_numbers), message))
+        self.version = next(self._versions)
+
+    def log(self, message, show_timestamp=True):
+        if show_timestamp:
+            message = f"[{time.strftime('%H:%M:%S')}] {message}"
+        self._log.append((next(self._line_numbers), message))
+        self.version = next(self._versions)
+
+    def reset(self, message=""):
+        """Clear the log and progress, e.g. when a new run starts."""
+        self._log.clear()
+        self._line_numbers = itertools.count(1)
+        self.message = message
+        self.progress = None
+        self.version = next(self._versions)
+
+    def poll(self, seen_version, seen_line):
+        """
+        Return (version, message, progress, new log lines, last line number, restart), or None
+        if nothing changed since `seen_version`. `seen_line` is the last line number of the
+        previous poll. restart is True when the lines shown so far should be cleared first:
+        the log was reset, or more lines arrived than the ring keeps.
+        """
+        version = self.version
+        if version == seen_version:
+            return None
+        message, progress = self.message, self.progress
+        entries = list(self._log)
+        last_line = entries[-1][0] if entries else 0
+        if last_line < seen_line or (entries and entries[0][0] > seen_line + 1):
+            return version, message, progress, [line for _, line in entries], last_line, True
+        return version, message, progress, [line for number, line in entries if number > seen_line], last_line, False
+
+
+class StderrProgress:
+    """Prints progress messages to stderr, throttled so large projects don't flood the terminal."""
+
+    def __init__(self, quiet=False, interval=0.25):
+        self.quiet = quiet
+        self.interval = interval
+        self._last_print = 0.0
+
+    def __call__(self, message, progress):
+        if self.quiet:
+            return
+        now = time.monotonic()
+        # Always show phase boundaries, throttle the per-file chatter
+        is_milestone = progress is not None and (progress == 0 or progress == 0.5 or progress >= 1.0)
+        if not is_milestone and now - self._last_print < self.interval:
+            return
+        self._last_print = now
+        if progress is not None and progress >= 0:
+            print(f"[{progress * 100:5.1f}%] {message}", file=sys.stderr)
+        else:
+            print(f"[  ... ] {message}", file=sys.stderr)
@@ -0,0 +1,45 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+def iter_read_ahead(items, load, workers=0, window=None, cancel_event=None):
+    """
+    Yield (item, get_result) pairs in the original order of `items`.
+
+    With workers > 0, up to `window` calls to load(item) run ahead on a thread
+    pool while the caller consumes earlier results, hiding I/O latency.
+    Calling get_result() returns the loaded value or raises the loader's
+    exception, so callers handle errors exactly as with a sequential load.
+    With workers == 0, load(item) runs lazily inside get_result().
+
+    Once `cancel_event` is set no new loads are submitted; the caller is
+    expected to stop iterating, which cancels everything still queued.
+    """
+    if workers <= 0:
+        for item in items:
+            yield item, (lambda item=item: load(item))
+        return
+
+    window = window or workers * 2
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="read-ahead")
+    pending = deque()
+    items_iter = iter(items)
+    try:
+        while True:
+            # Keep the window full; stop feeding the pool as soon as cancellation is requested
+            while len(pending) < window and not (cancel_event and cancel_event.is_set()):
+                item = next(items_iter, None)
+                if item is None:
+                    break
+                pending.append((item, executor.submit(load, item)))
+
+            if not pending:
+                return
+
+            item, future = pending.popleft()
+            yield item, future.result
+    finally:
+        for _, future in pending:
+            future.cancel()
+        # Don't wait for reads already in flight; they only touch input files
+        executor.shutdown(wait=False)
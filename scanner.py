@@ -1,85 +1,498 @@
 import os
+import stat
+import sys
 from pathlib import Path
-from ignore_rules import IgnoreRules
-from file_utils import is_text_file, get_relative_path
+from ignore_rules import IgnoreRules, GITIGNORE_FILENAME
+from file_utils import classify_by_name, sniff_text_file
+from classification_cache import ClassificationCache, SniffedChunks
+from tree_builder import ScanTree
+from git_index import GitIndexError, find_git_index, read_git_index
 
 
 class FileScanner:
-    def __init__(self, project_path):
+    def __init__(self, project_path, nested_gitignore=True, use_classification_cache=True, max_file_size=None,
+                 keep_dir_records=False, use_git_index=False, include_untracked=False):
         self.project_path = Path(project_path).absolute()
         self.ignore_rules = IgnoreRules(self.project_path)
+        # Honor .gitignore files in subdirectories, loaded as the walk enters them
+        self.nested_gitignore = nested_gitignore
+        # Files larger than this many bytes are skipped from stat data alone, before any read
+        self.max_file_size = max_file_size
+        # Relative paths of every directory seen by the last scan (including ignored ones)
+        self.directories = set()
+        # Per-directory listings of the last scan, rendered directly by TreeBuilder.iter_tree_lines
+        self.tree = ScanTree()
+        # Text/binary verdicts of sniffed files from previous scans, kept in .codebase/
+        self.classification_cache = (
+            ClassificationCache(self.ignore_rules.codebase_dir) if use_classification_cache else None
+        )
+        # First bytes of the text files sniffed by this scan, reused by the combiner
+        self.sniffed_chunks = SniffedChunks()
+        # With keep_dir_records, every entered directory's verdicts from the last complete scan,
+        # so a rescan limited to changed directories can replay the others (see iter_scan)
+        self.keep_dir_records = keep_dir_records
+        self.dir_records = {}
+        # RunProfile collecting timings and I/O counts, or None when profiling is off
+        self.profile = None
+        # In git repositories, enumerate the files listed in .git/index instead of walking the
+        # tree; untracked files are then only added with include_untracked (see _iter_git_index)
+        self.use_git_index = use_git_index
+        self.include_untracked = include_untracked
 
-    def scan(self, callback=None, cancel_event=None):
-        text_files = []
+    def reload_rules(self):
+        """Re-read .gitignore and track_ignore.txt; recorded verdicts are dropped with the old rules."""
+        self.ignore_rules = IgnoreRules(self.project_path)
+        self.dir_records = {}
+
+    def scan(self, callback=None, cancel_event=None, dirty=None):
         ignored_items = []
         all_files = []
-        ignored_dirs = set()
+        text_files = list(self.iter_scan(ignored_items, all_files, callback, cancel_event, dirty))
+        return text_files, ignored_items, all_files
+
+    def iter_scan(self, ignored_items, all_files, callback=None, cancel_event=None, dirty=None):
+        """
+        Generator version of scan(): yields (file_path, rel_path) for each text file as soon as
+        it is classified, while appending to the caller's ignored_items and all_files lists.
+        Both lists are complete once the generator is exhausted.
+
+        The walk uses os.scandir directly: entry types come from the directory listing,
+        relative paths are built by concatenating onto the parent's prefix, and every
+        directory path is recorded in self.directories so the tree builder never has to stat.
+        Each entered directory's entries are also recorded in self.tree, in scan order.
+
+        `dirty` limits the work to the directories whose relative prefixes it contains: every
+        other directory with a record from the previous scan is replayed from self.dir_records
+        without listing or classifying its entries. The results are the same as a full scan's
+        as long as every directory with changed entries is in `dirty` and no ignore file changed.
+
+        With use_git_index the files come from the git index instead (see _iter_git_index), and
+        `dirty` is not needed: reading the index is as cheap as replaying records.
+        """
+        self.directories.clear()
+        self.tree.clear()
+        self.sniffed_chunks.clear()
+        if self.classification_cache is not None:
+            self.classification_cache.load()
+        self.ignore_rules.active_nested_gitignores.clear()
+        records = {} if self.keep_dir_records else None
+
+        git_entries = self._read_git_index() if self.use_git_index else None
+        if git_entries is not None:
+            records = None
+            self.dir_records = {}
+            text_files_found = yield from self._iter_git_index(git_entries, ignored_items, all_files,
+                                                               callback, cancel_event)
+        else:
+            stack = [(str(self.project_path), '', ())]
+            text_files_found = yield from self._walk(stack, ignored_items, all_files, callback, cancel_event,
+                                                     dirty, records)
+
+        if cancel_event and cancel_event.is_set():
+            return
+        if records is not None:
+            self.dir_records = records
+        if self.classification_cache is not None:
+            self.classification_cache.save()
+            if self.profile is not None:
+                self.profile.count('classification_cache_hits', self.classification_cache.hits)
+        if callback:
+            callback(
+                f"Scan complete! Found {text_files_found} text files and {len(ignored_items)} ignored items.", -1)
+
+    def _walk(self, stack, ignored_items, all_files, callback, cancel_event, dirty=None, records=None):
+        """
+        Walk the directories on `stack`, (absolute dir, relative prefix, scope of nested
+        .gitignore rule sets above it) entries, and everything below them; see iter_scan.
+        Returns the number of text files found.
+        """
+        text_files_found = 0
         total_files_checked = 0
+        profile = self.profile
+        is_ignored = self.ignore_rules.is_ignored
+        sniff = self._sniff
+        if profile is not None:
+            is_ignored = profile.timed('ignore_match', is_ignored)
+            sniff = profile.timed('sniff', sniff)
 
-        for root, dirs, files in os.walk(self.project_path, topdown=True):
+        # Depth-first, pre-order like os.walk(topdown=True)
+        while stack:
             # === UX IMPROVEMENT: Allow cancellation ===
             if cancel_event and cancel_event.is_set():
                 if callback:
                     callback("Scan cancelled by user.", -1)
                 break
 
-            root_path = Path(root)
-            rel_root = get_relative_path(root_path, self.project_path)
-
-            if rel_root == '.':
-                rel_root = ''
-
-            parent_ignored = any(
-                rel_root == ignored_dir or rel_root.startswith(ignored_dir + os.sep)
-                for ignored_dir in ignored_dirs
-            )
+            root, rel_prefix, scope = stack.pop()
+            record = self.dir_records.get(rel_prefix) if dirty is not None and rel_prefix not in dirty else None
+            if record is not None:
+                if records is not None:
+                    records[rel_prefix] = record
+                if profile is not None:
+                    profile.count('directories_replayed')
+                for item in self._replay(record, rel_prefix, scope, ignored_items, all_files, stack):
+                    text_files_found += 1
+                    yield item
+                continue
 
-            if parent_ignored:
-                dirs[:] = []
+            dirs = []
+            files = []
+            gitignore_entry = None
+            try:
+                with os.scandir(root) as it:
+                    for entry in it:
+                        try:
+                            is_dir = entry.is_dir()
+                        except OSError:
+                            is_dir = False
+                        (dirs if is_dir else files).append(entry)
+                        if not is_dir and entry.name == GITIGNORE_FILENAME:
+                            gitignore_entry = entry
+            except OSError:
+                # Unreadable directory: skip it silently, as os.walk does
                 continue
+            if profile is not None:
+                profile.count('directories_visited')
 
-            if rel_root:
-                all_files.append(rel_root)
+            # A nested .gitignore applies to everything in this directory, so load it before
+            # matching any entry; ignored subdirectories are then pruned without being entered
+            if gitignore_entry is not None and rel_prefix and self.nested_gitignore:
+                rule_set = self.ignore_rules.load_nested_gitignore(
+                    rel_prefix, gitignore_entry.path, self._entry_stat(gitignore_entry)
+                )
+                if rule_set is not None:
+                    scope = scope + ((rel_prefix.replace(os.sep, '/'), rule_set),)
 
-            dirs_to_remove = []
-            for d in dirs:
-                dir_path = root_path / d
-                rel_path = get_relative_path(dir_path, self.project_path)
+            listing = self.tree.add_listing(rel_prefix)
+            subdirs = []
+            # Verdicts for the directory record: "directory" (ignored), "enter" or None for
+            # directories, "text" or the ignored kind for files
+            dir_verdicts = []
+            file_verdicts = []
+            for entry in dirs:
+                rel_path = rel_prefix + entry.name
                 all_files.append(rel_path)
-                if self.ignore_rules.is_ignored(rel_path):
-                    ignored_items.append((dir_path, rel_path, "directory"))
-                    ignored_dirs.add(rel_path)
-                    dirs_to_remove.append(d)
-
-            for d in dirs_to_remove:
-                dirs.remove(d)
+                listing.append((entry.name, True))
+                self.directories.add(rel_path)
+                verdict = None
+                if is_ignored(rel_path, is_dir=True, scope=scope):
+                    verdict = "directory"
+                    ignored_items.append((entry.path, rel_path, verdict))
+                elif not entry.is_symlink():
+                    verdict = "enter"
+                    subdirs.append((entry.path, rel_path + os.sep, scope))
+                dir_verdicts.append((entry.path, rel_path, verdict))
 
-            for filename in files:
+            for entry in files:
                 # === UX IMPROVEMENT: Allow cancellation ===
                 if cancel_event and cancel_event.is_set():
                     break
-                
-                file_path = root_path / filename
-                rel_path = get_relative_path(file_path, self.project_path)
+
+                file_path = entry.path
+                rel_path = rel_prefix + entry.name
                 all_files.append(rel_path)
+                listing.append((entry.name, False))
                 total_files_checked += 1
                 if callback and total_files_checked % 50 == 0:
                     callback(f"Scanning: {rel_path}", -1) # Use -1 progress for indeterminate updates
 
-                if self.ignore_rules.is_ignored(rel_path):
-                    ignored_items.append((file_path, rel_path, "file"))
-                    continue
+                verdict = None
+                if is_ignored(rel_path, scope=scope):
+                    verdict = "file"
+                elif self.max_file_size is not None:
+                    stat_result = self._entry_stat(entry)
+                    if stat_result is not None and stat_result.st_size > self.max_file_size:
+                        verdict = "too large"
+                if verdict is None:
+                    is_text = classify_by_name(file_path)
+                    if is_text is None:
+                        is_text = sniff(entry, rel_path)
+                    verdict = "text" if is_text else "binary"
+                file_verdicts.append((file_path, rel_path, verdict))
 
-                if is_text_file(file_path):
-                    text_files.append((file_path, rel_path))
+                if verdict == "text":
+                    text_files_found += 1
+                    yield file_path, rel_path
                 else:
-                    ignored_items.append((file_path, rel_path, "binary"))
-            
+                    ignored_items.append((file_path, rel_path, verdict))
+
             if cancel_event and cancel_event.is_set():
                 break
 
-        if callback and not (cancel_event and cancel_event.is_set()):
-            callback(
-                f"Scan complete! Found {len(text_files)} text files and {len(ignored_items)} ignored items.", -1)
+            if records is not None:
+                records[rel_prefix] = (gitignore_entry.path if gitignore_entry is not None else None,
+                                       listing, dir_verdicts, file_verdicts)
+            stack.extend(reversed(subdirs))
+        return text_files_found
+
+    def _read_git_index(self):
+        """
+        The (path, mode) entries of the git index below the project, paths relative to the
+        project; None for projects outside a git repository or with an unreadable index.
+        """
+        located = find_git_index(self.project_path)
+        if located is None:
+            return None
+        index_path, repository_root = located
+        try:
+            entries = read_git_index(index_path)
+        except GitIndexError as e:
+            print(f"Git index unusable, walking the tree instead: {e}", file=sys.stderr)
+            return None
+        prefix = os.path.relpath(self.project_path, repository_root).replace(os.sep, '/')
+        if prefix == '.':
+            return entries
+        prefix += '/'
+        return [(path[len(prefix):], mode) for path, mode in entries if path.startswith(prefix)]
+
+    def _iter_git_index(self, entries, ignored_items, all_files, callback, cancel_event):
+        """
+        iter_scan() from the git index: only the directories holding tracked files are
+        visited, so ignored trees (node_modules/, build output, ...) cost nothing, and no
+        directory is listed. Each tracked file is stat'ed to skip deleted ones. Tracked files
+        are kept even if a .gitignore matches them, as git does; the default patterns,
+        track_ignore.txt and the .codebase rule still apply.
+
+        With include_untracked every visited directory is also listed: untracked entries are
+        matched against all ignore rules, and untracked directories are walked as usual.
+        Returns the number of text files found.
+        """
+        profile = self.profile
+        rules = self.ignore_rules
+        sniff = self._sniff
+        if profile is not None:
+            sniff = profile.timed('sniff', sniff)
+        project = str(self.project_path)
+
+        # posix directory -> ([(file name, mode)], [subdirectory names]), in index order
+        layout = {'': ([], [])}
+        for path, mode in entries:
+            directory, _, name = path.rpartition('/')
+            if directory not in layout:
+                missing = []
+                parent = directory
+                while parent not in layout:
+                    missing.append(parent)
+                    parent = parent.rpartition('/')[0]
+                for new_dir in reversed(missing):
+                    layout[new_dir.rpartition('/')[0]][1].append(new_dir.rpartition('/')[2])
+                    layout[new_dir] = ([], [])
+            layout[directory][0].append((name, mode))
+
+        text_files_found = 0
+        files_checked = 0
+        stack = [('', ())]
+        while stack:
+            if cancel_event and cancel_event.is_set():
+                if callback:
+                    callback("Scan cancelled by user.", -1)
+                break
+            directory, scope = stack.pop()
+            rel_prefix = directory.replace('/', os.sep) + os.sep if directory else ''
+            root = os.path.join(project, rel_prefix)
+            tracked_files, tracked_dirs = layout[directory]
+            on_disk = None
+            if self.include_untracked:
+                try:
+                    with os.scandir(root) as it:
+                        on_disk = {entry.name: entry for entry in it}
+                except OSError:
+                    continue
+                gitignore_entry = on_disk.get(GITIGNORE_FILENAME)
+                if gitignore_entry is not None and rel_prefix and self.nested_gitignore:
+                    rule_set = rules.load_nested_gitignore(rel_prefix, gitignore_entry.path,
+                                                           self._entry_stat(gitignore_entry))
+                    if rule_set is not None:
+                        scope = scope + ((directory + '/', rule_set),)
+            if profile is not None:
+                profile.count('directories_visited')
+
+            listing = self.tree.add_listing(rel_prefix)
+            subdirs = []
+            for name in tracked_dirs:
+                path = root + name
+                if on_disk is not None:
+                    entry = on_disk.pop(name, None)
+                    if entry is None or not entry.is_dir():
+                        continue
+                elif not os.path.isdir(path):
+                    continue
+                rel_path = rel_prefix + name
+                all_files.append(rel_path)
+                listing.append((name, True))
+                self.directories.add(rel_path)
+                if rules.is_always_ignored(rel_path, is_dir=True):
+                    ignored_items.append((path, rel_path, "directory"))
+                else:
+                    subdirs.append((directory + '/' + name if directory else name, scope))
+
+            untracked_dirs = []
+            checked = []
+            for name, mode in tracked_files:
+                if on_disk is not None:
+                    entry = on_disk.pop(name, None)
+                    if entry is None:
+                        continue
+                else:
+                    entry = _TrackedFile(root + name, name, self)
+                    if not entry.exists:
+                        # Deleted since it was added
+                        continue
+                checked.append((entry, True))
+            if on_disk is not None:
+                for name, entry in on_disk.items():
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if is_dir:
+                        untracked_dirs.append(entry)
+                    else:
+                        checked.append((entry, False))
+
+            for entry in untracked_dirs:
+                rel_path = rel_prefix + entry.name
+                all_files.append(rel_path)
+                listing.append((entry.name, True))
+                self.directories.add(rel_path)
+                if rules.is_ignored(rel_path, is_dir=True, scope=scope):
+                    ignored_items.append((entry.path, rel_path, "directory"))
+                elif not entry.is_symlink():
+                    text_files_found += yield from self._walk([(entry.path, rel_path + os.sep, scope)],
+                                                              ignored_items, all_files, callback, cancel_event)
+
+            for entry, tracked in checked:
+                if cancel_event and cancel_event.is_set():
+                    break
+                rel_path = rel_prefix + entry.name
+                all_files.append(rel_path)
+                if entry.is_dir():
+                    # A submodule, or a tracked symlink to a directory: listed, never entered
+                    listing.append((entry.name, True))
+                    self.directories.add(rel_path)
+                    continue
+                listing.append((entry.name, False))
+                files_checked += 1
+                if callback and files_checked % 50 == 0:
+                    callback(f"Scanning: {rel_path}", -1)
+
+                if tracked:
+                    ignored = rules.is_always_ignored(rel_path)
+                else:
+                    ignored = rules.is_ignored(rel_path, scope=scope)
+                verdict = self._file_verdict(entry, rel_path, ignored, sniff)
+                if verdict == "text":
+                    text_files_found += 1
+                    yield entry.path, rel_path
+                else:
+                    ignored_items.append((entry.path, rel_path, verdict))
+
+            stack.extend(reversed(subdirs))
+        return text_files_found
+
+    def _file_verdict(self, entry, rel_path, ignored, sniff):
+        """The walker's verdict for a file: "file" when ignored, "too large", "text" or "binary"."""
+        if ignored:
+            return "file"
+        if self.max_file_size is not None:
+            stat_result = self._entry_stat(entry)
+            if stat_result is not None and stat_result.st_size > self.max_file_size:
+                return "too large"
+        is_text = classify_by_name(entry.path)
+        if is_text is None:
+            is_text = sniff(entry, rel_path)
+        return "text" if is_text else "binary"
+
+    def _replay(self, record, rel_prefix, scope, ignored_items, all_files, stack):
+        """
+        Repeat what the walk did for an unchanged directory from its record: yields its text
+        files and pushes the subdirectories to enter onto the walk stack.
+        """
+        gitignore_path, listing, dir_verdicts, file_verdicts = record
+        if gitignore_path is not None and rel_prefix and self.nested_gitignore:
+            # Served from IgnoreRules' cache unless the file changed, which triggers a full rescan
+            rule_set = self.ignore_rules.load_nested_gitignore(rel_prefix, gitignore_path)
+            if rule_set is not None:
+                scope = scope + ((rel_prefix.replace(os.sep, '/'), rule_set),)
+        self.tree.listings[rel_prefix] = listing
+
+        subdirs = []
+        for path, rel_path, verdict in dir_verdicts:
+            all_files.append(rel_path)
+            self.directories.add(rel_path)
+            if verdict == "enter":
+                subdirs.append((path, rel_path + os.sep, scope))
+            elif verdict is not None:
+                ignored_items.append((path, rel_path, verdict))
+
+        cache = self.classification_cache
+        for path, rel_path, verdict in file_verdicts:
+            all_files.append(rel_path)
+            if cache is not None:
+                cache.retain(rel_path)
+            if verdict == "text":
+                yield path, rel_path
+            else:
+                ignored_items.append((path, rel_path, verdict))
+        stack.extend(reversed(subdirs))
+
+    def _sniff(self, entry, rel_path):
+        """Classify a file by its content, consulting the classification cache first."""
+        stat_result = self._entry_stat(entry)
+        if stat_result is None:
+            return False
+        cache = self.classification_cache
+        if cache is not None:
+            is_text = cache.get(rel_path, stat_result)
+            if is_text is not None:
+                return is_text
+
+        is_text, chunk = sniff_text_file(entry.path)
+        if self.profile is not None:
+            self.profile.count('open_calls')
+            self.profile.count('bytes_sniffed', len(chunk or b''))
+        if chunk is not None:
+            if cache is not None:
+                cache.put(rel_path, stat_result, is_text)
+            if is_text:
+                self.sniffed_chunks.add(rel_path, stat_result, chunk)
+        return is_text
+
+    def _entry_stat(self, entry):
+        if self.profile is not None:
+            self.profile.count('stat_calls')
+        try:
+            return entry.stat()
+        except OSError:
+            return None
+
+
+class _TrackedFile:
+    """
+    os.DirEntry stand-in for a file listed in the git index. The stat result (following
+    symlinks, like DirEntry.is_dir) is taken once; None means the file is gone.
+    """
+
+    __slots__ = ('path', 'name', '_stat')
+
+    def __init__(self, path, name, scanner):
+        self.path = path
+        self.name = name
+        if scanner.profile is not None:
+            scanner.profile.count('stat_calls')
+        try:
+            self._stat = os.stat(path)
+        except OSError:
+            self._stat = None
+
+    @property
+    def exists(self):
+        return self._stat is not None
+
+    def stat(self):
+        if self._stat is None:
+            raise FileNotFoundError(self.path)
+        return self._stat
 
-        return text_files, ignored_items, all_files
\ No newline at end of file
+    def is_dir(self):
+        return self._stat is not None and stat.S_ISDIR(self._stat.st_mode)
@@ -0,0 +1,184 @@
+import json
+import os
+
+from file_utils import temp_path
+
+SHARD_INDEX_VERSION = 1
+COPY_CHUNK_SIZE = 1024 * 1024
+# Rough size of a token for code and English text; good enough to keep shards under a model's limit
+CHARS_PER_TOKEN = 4
+# Room kept in every shard for its header and a continuation line
+SHARD_HEADER_RESERVE_BYTES = 512
+
+
+def estimate_tokens(chars):
+    """Estimated token count of `chars` characters of text, without a tokenizer."""
+    return (chars + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class ShardWriter:
+    """
+    Splits a finished snapshot into <stem>.part-NNN<suffix> files of at most `max_bytes`
+    bytes or `max_tokens` estimated tokens each, plus a <stem>.shards.json index.
+
+    The snapshot is described by its segments, (path or None, offset, length, chars), in
+    output order: the header and tree, one segment per file, then the ignored section.
+    A segment is never split unless it is larger than a whole shard by itself; then it is
+    cut at line breaks and every continuation starts with a "(continued)" marker.
+    Token counts are estimated from the character counts the combiner already keeps.
+    """
+
+    def __init__(self, output_file, max_bytes=None, max_tokens=None):
+        self.output_file = output_file
+        self.unit = 'tokens' if max_tokens else 'bytes'
+        self.budget = max_tokens if max_tokens else max_bytes
+        reserve = estimate_tokens(SHARD_HEADER_RESERVE_BYTES) if max_tokens else SHARD_HEADER_RESERVE_BYTES
+        self.capacity = max(self.budget - reserve, 1)
+        self.index_path = output_file.with_name(output_file.stem + '.shards.json')
+
+    def shard_path(self, number):
+        return self.output_file.with_name(f"{self.output_file.stem}.part-{number:03d}{self.output_file.suffix}")
+
+    def write(self, segments, timestamp, project_name):
+        """Write every shard and the index. Returns the list of shard paths."""
+        self._timestamp = timestamp
+        self._project_name = project_name
+        self._shards = []
+        self._files = {}
+        self._current = None
+        try:
+            with open(self.output_file, 'rb') as source:
+                for label, offset, length, chars in segments:
+                    if length > 0:
+                        self._write_segment(source, label, offset, length, chars)
+        finally:
+            self._close_shard()
+
+        self._remove_stale_shards(len(self._shards))
+        self._write_index()
+        return [self.shard_path(shard['number']) for shard in self._shards]
+
+    def _cost(self, length, chars):
+        return estimate_tokens(chars) if self.unit == 'tokens' else length
+
+    def _write_segment(self, source, label, offset, length, chars):
+        if self._current is None or (self._cost(length, chars) > self._room() and self._current['used'] > 0):
+            self._open_shard()
+        if self._cost(length, chars) <= self._room():
+            self._copy(source, label, offset, length, chars)
+            return
+
+        # Larger than a whole shard: cut it into pieces that fill one shard each
+        chars_per_byte = chars / length if chars else 1.0
+        end = offset + length
+        while True:
+            room = self._room()
+            room_bytes = room if self.unit == 'bytes' else int(room * CHARS_PER_TOKEN / chars_per_byte)
+            piece = min(end - offset, max(room_bytes, 1))
+            if offset + piece < end:
+                piece = self._cut_point(source, offset, piece)
+            self._copy(source, label, offset, piece, round(piece * chars_per_byte))
+            offset += piece
+            if offset >= end:
+                return
+            self._open_shard()
+            if label:
+                self._write_text(f"/* ===== {label} (continued) ===== */\n")
+
+    def _cut_point(self, source, offset, piece):
+        """Shorten a piece to end after a line break, or at least on a UTF-8 character boundary."""
+        window = min(piece, 64 * 1024)
+        window_start = piece - window
+        source.seek(offset + window_start)
+        # One extra byte: the first byte of the next piece
+        tail = source.read(window + 1)
+        newline = tail.rfind(b'\n', 0, window)
+        if newline >= 0 and window_start + newline + 1 > piece // 2:
+            return window_start + newline + 1
+        cut = piece
+        while cut > window_start + 1 and cut - window_start < len(tail) and 0x80 <= tail[cut - window_start] < 0xC0:
+            cut -= 1
+        return cut
+
+    def _room(self):
+        return self.capacity - self._current['used']
+
+    def _open_shard(self):
+        self._close_shard()
+        number = len(self._shards) + 1
+        shard = {'number': number, 'bytes': 0, 'estimated_tokens': 0, 'used': 0, 'files': 0}
+        shard['handle'] = open(self.shard_path(number), 'wb')
+        self._shards.append(shard)
+        self._current = shard
+        header = f"/* ==========================================================\n" \
+                 f"   CODEBASE SNAPSHOT - {self._timestamp}\n" \
+                 f"   Project: {self._project_name}\n" \
+                 f"   Part {number:03d} - index: {self.index_path.name}\n" \
+                 f"   ========================================================== */\n\n"
+        self._write_text(header)
+
+    def _close_shard(self):
+        if self._current is not None:
+            self._current.pop('handle').close()
+            self._current = None
+
+    def _write_text(self, text):
+        data = text.replace('\n', os.linesep).encode('utf-8')
+        self._current['handle'].write(data)
+        self._current['bytes'] += len(data)
+        self._current['estimated_tokens'] += estimate_tokens(len(text))
+
+    def _copy(self, source, label, offset, length, chars):
+        shard = self._current
+        source.seek(offset)
+        remaining = length
+        while remaining > 0:
+            chunk = source.read(min(remaining, COPY_CHUNK_SIZE))
+            if not chunk:
+                raise IOError("Snapshot ended before the end of a segment")
+            shard['handle'].write(chunk)
+            remaining -= len(chunk)
+        shard['bytes'] += length
+        shard['used'] += self._cost(length, chars)
+        shard['estimated_tokens'] += estimate_tokens(chars)
+        if label:
+            parts = self._files.setdefault(label, [])
+            if not parts or parts[-1] != shard['number']:
+                parts.append(shard['number'])
+                shard['files'] += 1
+
+    def _remove_stale_shards(self, count):
+        """Delete shards left over from an earlier run that produced more of them."""
+        prefix = self.output_file.stem + '.part-'
+        suffix = self.output_file.suffix
+        for name in os.listdir(self.output_file.parent):
+            if not (name.startswith(prefix) and name.endswith(suffix)):
+                continue
+            number = name[len(prefix):len(name) - len(suffix)]
+            if number.isdigit() and int(number) > count:
+                try:
+                    os.remove(self.output_file.with_name(name))
+                except OSError:
+                    pass
+
+    def _write_index(self):
+        data = {
+            'version': SHARD_INDEX_VERSION,
+            'timestamp': self._timestamp,
+            'unit': self.unit,
+            'budget': self.budget,
+            'shards': [
+                {
+                    'file': self.shard_path(shard['number']).name,
+                    'bytes': shard['bytes'],
+                    'estimated_tokens': shard['estimated_tokens'],
+                    'files': shard['files'],
+                }
+                for shard in self._shards
+            ],
+            'files': self._files,
+        }
+        tmp_path = temp_path(self.index_path)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=1, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
@@ -0,0 +1,180 @@
+import json
+import mmap
+import os
+from collections import namedtuple
+from pathlib import Path
+
+from file_utils import temp_path
+
+SNAPSHOT_INDEX_VERSION = 1
+
+# Where a file's content sits in the snapshot: byte offset and length of the content (without
+# the "/* ===== path ===== */" header), its line count and the SHA-1 of the source file.
+# A truncated file's content is the part that was written; a deduplicated one points at the
+# content of the file named by same_as. hash_scope is 'prefix' when the hash covers only the
+# written part of a truncated file, 'file' otherwise.
+IndexedFile = namedtuple('IndexedFile', 'offset length lines hash truncated same_as hash_scope')
+
+
+class SnapshotIndexError(ValueError):
+    """The index is missing, unreadable or doesn't belong to the snapshot next to it."""
+
+
+def snapshot_index_path(output_file):
+    """<stem>.index.json next to the snapshot."""
+    output_file = os.fspath(output_file)
+    stem, _ = os.path.splitext(os.path.basename(output_file))
+    return os.path.join(os.path.dirname(output_file), stem + '.index.json')
+
+
+class LineCounter:
+    """
+    Counts the lines of a file fed to it in chunks, the way a text-mode read splits them:
+    '\\n', '\\r\\n' and a lone '\\r' all end a line, and a last line without a break counts too.
+    """
+
+    __slots__ = ('breaks', '_last')
+
+    def __init__(self):
+        self.breaks = 0
+        self._last = b''
+
+    def update(self, data):
+        if not data:
+            return self
+        breaks = data.count(b'\n')
+        if b'\r' in data:
+            breaks += data.count(b'\r') - data.count(b'\r\n')
+        if self._last == b'\r' and data[:1] == b'\n':
+            # A '\r\n' split between two chunks
+            breaks -= 1
+        self.breaks += breaks
+        self._last = data[-1:]
+        return self
+
+    @property
+    def lines(self):
+        return self.breaks + (1 if self._last and self._last not in b'\r\n' else 0)
+
+
+def count_lines(data):
+    return LineCounter().update(data).lines
+
+
+def write_snapshot_index(output_file, entries):
+    """
+    Write the index of a finished snapshot. `entries` are (relative path, content offset,
+    content length, lines, hash, extra) with extra None or {'truncated': True, 'hash_scope': 'prefix'} /
+    {'same_as': path}. The output's size and mtime are recorded so stale indexes are detected.
+    """
+    output_stat = os.stat(output_file)
+    files = {}
+    for relative_path, offset, length, lines, content_hash, extra in entries:
+        files[relative_path] = [offset, length, lines, content_hash] + ([extra] if extra else [])
+    data = {
+        'version': SNAPSHOT_INDEX_VERSION,
+        'output': {'size': output_stat.st_size, 'mtime_ns': output_stat.st_mtime_ns},
+        'files': files,
+    }
+    path = snapshot_index_path(output_file)
+    tmp_path = temp_path(Path(path))
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+    return path
+
+
+def discard_snapshot_index(output_file):
+    try:
+        os.remove(snapshot_index_path(output_file))
+    except OSError:
+        pass
+
+
+class SnapshotReader:
+    """
+    Random access to the files of a snapshot through its index and an mmap: reading one
+    file is a dictionary lookup and a slice, whatever the size of the snapshot.
+
+        with SnapshotReader('.codebase/codebase.txt') as snapshot:
+            text = snapshot.read('src/main.py')
+
+    Raises SnapshotIndexError if the index is missing or was written for another version
+    of the output, and KeyError for paths that aren't in the snapshot.
+    """
+
+    def __init__(self, output_file, index_file=None):
+        self.output_file = os.fspath(output_file)
+        self.index_file = index_file or snapshot_index_path(output_file)
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            raise SnapshotIndexError(f"can't read {self.index_file}: {e}") from e
+        if not isinstance(data, dict) or data.get('version') != SNAPSHOT_INDEX_VERSION:
+            raise SnapshotIndexError(f"{self.index_file} has an unsupported format")
+
+        self._file = open(self.output_file, 'rb')
+        try:
+            output_stat = os.fstat(self._file.fileno())
+            output_info = data.get('output', {})
+            if (output_stat.st_size != output_info.get('size') or
+                    output_stat.st_mtime_ns != output_info.get('mtime_ns')):
+                raise SnapshotIndexError(f"{self.index_file} doesn't match {self.output_file}")
+            # mmap can't map an empty file
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if output_stat.st_size else b''
+        except BaseException:
+            self._file.close()
+            raise
+
+        self.files = {}
+        for relative_path, fields in data.get('files', {}).items():
+            extra = fields[4] if len(fields) > 4 else {}
+            self.files[relative_path] = IndexedFile(fields[0], fields[1], fields[2], fields[3],
+                                                    extra.get('truncated', False), extra.get('same_as'),
+                                                    extra.get('hash_scope', 'file'))
+
+    def __contains__(self, relative_path):
+        return relative_path in self.files
+
+    def __iter__(self):
+        return iter(self.files)
+
+    def __len__(self):
+        return len(self.files)
+
+    @property
+    def size(self):
+        return len(self._map)
+
+    def read_range(self, offset, length):
+        """Raw bytes of the snapshot itself, e.g. its header."""
+        return self._map[offset:offset + length]
+
+    def read_bytes(self, relative_path):
+        """The content of one file as written to the snapshot, as bytes."""
+        entry = self.files[relative_path]
+        return self._map[entry.offset:entry.offset + entry.length]
+
+    def read(self, relative_path):
+        """The content of one file as text, with '\\n' line breaks."""
+        text = self.read_bytes(relative_path).decode('utf-8', errors='replace')
+        if os.linesep != '\n':
+            text = text.replace(os.linesep, '\n')
+        return text
+
+    def read_many(self, relative_paths):
+        """{path: text} for several files, read in snapshot order."""
+        ordered = sorted(relative_paths, key=lambda relative_path: self.files[relative_path].offset)
+        return {relative_path: self.read(relative_path) for relative_path in ordered}
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,34 @@
+import asyncio
+
+from async_api import stream_snapshot
+
+CONCURRENT_RUNS = 4
+
+
+def make_project(root, files=200):
+    for number in range(files):
+        directory = root / f"pkg{number % 10}"
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / f"module{number}.py").write_text(f"VALUE = {number}\n" * 50)
+    return root
+
+
+async def collect(project):
+    return b''.join([chunk async for chunk in stream_snapshot(str(project), chunk_size=4096)])
+
+
+async def collect_concurrently(project):
+    return await asyncio.gather(*(collect(project) for _ in range(CONCURRENT_RUNS)), return_exceptions=True)
+
+
+def test_concurrent_streams_of_the_same_output_all_succeed(tmp_path):
+    project = make_project(tmp_path / 'project')
+    output = project / '.codebase' / 'codebase.txt'
+    for _ in range(3):
+        results = asyncio.run(collect_concurrently(project))
+        for result in results:
+            assert not isinstance(result, BaseException), result
+            assert b'/* ===== pkg3' in result and b'VALUE = 199' in result
+        assert output.read_bytes() in results
+        leftovers = [path.name for path in output.parent.iterdir() if path.name.endswith('.tmp')]
+        assert leftovers == []
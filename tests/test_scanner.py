@@ -0,0 +1,36 @@
+import shutil
+import subprocess
+
+import pytest
+
+from scanner import FileScanner
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+def scanned_paths(project, **options):
+    text_files, ignored_items, _ = FileScanner(project, **options).scan()
+    return sorted(rel_path for _, rel_path in text_files), sorted(item[1] for item in ignored_items)
+
+
+@pytest.mark.skipif(shutil.which('git') is None, reason="git is not installed")
+def test_git_index_with_untracked_matches_the_walk(tmp_path):
+    project = tmp_path / 'project'
+    write(project / 'main.py', "print('main')\n")
+    write(project / 'gen.txt', "top level, not matched by sub/.gitignore\n")
+    write(project / 'sub' / '.gitignore', "/gen.txt\nfoo/bar.txt\n")
+    write(project / 'sub' / 'tracked.py', "x = 1\n")
+    subprocess.run(['git', 'init', '-q'], cwd=project, check=True)
+    subprocess.run(['git', 'add', '.'], cwd=project, check=True)
+    # Untracked files, only found by listing the directories
+    write(project / 'sub' / 'gen.txt', "generated\n")
+    write(project / 'sub' / 'foo' / 'bar.txt', "generated\n")
+    write(project / 'sub' / 'foo' / 'keep.txt', "kept\n")
+    write(project / 'sub' / 'deeper' / 'gen.txt', "not anchored at sub/, kept\n")
+
+    walked = scanned_paths(project)
+    assert 'sub/gen.txt' not in walked[0] and 'sub/foo/bar.txt' not in walked[0]
+    assert scanned_paths(project, use_git_index=True, include_untracked=True) == walked
@@ -1,5 +1,47 @@
 from pathlib import Path
 import os
+from ignore_matcher import PathPrefixTrie
+
+
+class ScanTree:
+    """
+    Directory listings recorded by the scanner, in scan order.
+
+    `listings` maps the relative prefix of every directory the scanner entered
+    ('' for the root, otherwise the relative path plus os.sep) to its entries as
+    (name, is_dir) pairs. Ignored and symlinked directories appear in their
+    parent's listing but have no listing of their own, so they render collapsed.
+    """
+
+    def __init__(self):
+        self.listings = {}
+
+    def clear(self):
+        self.listings.clear()
+
+    def add_listing(self, rel_prefix):
+        """Register the directory at rel_prefix and return the list its entries are appended to."""
+        entries = []
+        self.listings[rel_prefix] = entries
+        return entries
+
+    @classmethod
+    def from_paths(cls, rel_paths):
+        """A tree holding just the given files (relative paths with os.sep) and their parent directories."""
+        tree = cls()
+        listings = tree.listings
+        listings[''] = []
+        for rel_path in rel_paths:
+            parts = rel_path.split(os.sep)
+            rel_prefix = ''
+            for name in parts[:-1]:
+                child = rel_prefix + name + os.sep
+                if child not in listings:
+                    listings[rel_prefix].append((name, True))
+                    listings[child] = []
+                rel_prefix = child
+            listings[rel_prefix].append((parts[-1], False))
+        return tree
 
 
 class TreeBuilder:
@@ -11,7 +53,7 @@ class TreeBuilder:
         self.tee_symbol = "├── "
         self.last_symbol = "└── "
 
-    def build_tree(self, project_path, ignored_dirs, all_files, max_depth=None):
+    def build_tree(self, project_path, ignored_dirs, all_files, max_depth=None, directories=None):
         """
         Build a tree representation of the project structure.
 
@@ -20,6 +62,8 @@ class TreeBuilder:
             ignored_dirs: Set of directory paths that are ignored
             all_files: List of all files (both included and ignored)
             max_depth: Maximum depth to display (None for unlimited)
+            directories: Optional set of the relative paths in all_files that are directories,
+                as recorded by the scanner. When given, no filesystem calls are made.
 
         Returns:
             String representation of the tree structure
@@ -32,9 +76,9 @@ class TreeBuilder:
 
         # Build file structure map
         file_structure = {}
-        ignored_dirs_set = set()
+        ignored_dirs_trie = PathPrefixTrie()
 
-        # Convert ignored_dirs to a set of normalized paths
+        # Convert ignored_dirs to a trie of normalized paths
         for dir_path in ignored_dirs:
             # Ensure path is relative to project root
             if isinstance(dir_path, tuple) and len(dir_path) > 1:
@@ -42,7 +86,7 @@ class TreeBuilder:
             else:
                 rel_path = str(dir_path)
 
-            ignored_dirs_set.add(self._normalize_path(rel_path))
+            ignored_dirs_trie.add(self._normalize_path(rel_path))
 
         # Add all files to the structure
         for file_item in all_files:
@@ -51,6 +95,9 @@ class TreeBuilder:
                 # From ignored_items or text_files/binary_files list
                 abs_path, rel_path = file_item[0], file_item[1]
                 is_dir = os.path.isdir(abs_path) if abs_path else False
+            elif directories is not None:
+                rel_path = file_item
+                is_dir = rel_path in directories
             else:
                 # Direct path object
                 rel_path = file_item
@@ -65,23 +112,17 @@ class TreeBuilder:
 
             # Build the structure
             current_dict = file_structure
-            current_path = ""
+            trie_node = ignored_dirs_trie.root
+            path_ignored = False
 
             for i, part in enumerate(path_parts):
                 if not part:  # Skip empty parts
                     continue
 
-                # Build the current path for ignore checking
-                if current_path:
-                    current_path += f"/{part}"
-                else:
-                    current_path = part
-
-                # Check if this path or any parent is ignored
-                path_ignored = current_path in ignored_dirs_set or any(
-                    current_path.startswith(ignored_dir + '/')
-                    for ignored_dir in ignored_dirs_set
-                )
+                # Check if this path or any parent is ignored, one trie step per component
+                if not path_ignored:
+                    trie_node = ignored_dirs_trie.child(trie_node, part)
+                    path_ignored = ignored_dirs_trie.is_terminal(trie_node)
 
                 # If it's the last part (file name)
                 if i == len(path_parts) - 1:
@@ -100,49 +141,75 @@ class TreeBuilder:
                     if not current_dict[part].get("__ignored__"):
                         current_dict = current_dict[part]
 
-        # Recursively build the tree lines
-        self._build_tree_recursive(file_structure, tree_lines, "", 0, max_depth)
+        tree_lines.extend(self._iter_lines(file_structure, self._dict_entries, max_depth))
 
         return "\n".join(tree_lines)
 
-    def _build_tree_recursive(self, node, lines, prefix, depth, max_depth):
+    def iter_tree_lines(self, scan_tree, max_depth=None):
         """
-        Recursively build tree lines.
+        Yield the lines of the tree for a ScanTree recorded by the scanner, starting with ".".
 
-        Args:
-            node: Current node in the file structure
-            lines: List of lines to append to
-            prefix: Current line prefix for indentation
-            depth: Current depth in the tree
-            max_depth: Maximum depth to display
+        Every listing is visited once and only sorted, so the work is linear in the number
+        of entries (apart from the per-directory sort) and nothing is re-split or copied.
+        The lines are the same as build_tree() produces for the same scan.
+        """
+        yield "."
+
+        listings = scan_tree.listings
+
+        def entries(rel_prefix):
+            listing = listings.get(rel_prefix)
+            if not listing:
+                return []
+            result = []
+            for name, is_dir in listing:
+                # Same filters as build_tree: top-level '.codebase*' entries, and names starting
+                # with '__', which the dict-based structure has always treated as metadata keys
+                if name.startswith("__") or (not rel_prefix and name.startswith('.codebase')):
+                    continue
+                result.append((name, is_dir, rel_prefix + name + os.sep if is_dir else None))
+            result.sort(key=lambda x: (not x[1], x[0].lower()))
+            return result
+
+        yield from self._iter_lines('', entries, max_depth)
+
+    def _dict_entries(self, node):
+        """Sorted (name, is_dir, child node or None) entries of a build_tree structure node."""
+        result = [
+            (name, contents.get("__is_dir__", False),
+             contents if contents.get("__is_dir__", False) and not contents.get("__ignored__", False) else None)
+            for name, contents in node.items() if not name.startswith("__")
+        ]
+        result.sort(key=lambda x: (not x[1], x[0].lower()))
+        return result
+
+    def _iter_lines(self, root, entries, max_depth):
+        """
+        Render the tree below `root` depth-first with an explicit stack.
+        `entries(key)` returns the sorted (name, is_dir, child key or None) entries of a directory.
         """
-        if max_depth is not None and depth > max_depth:
+        if max_depth is not None and max_depth < 0:
             return
-
-        # Get all entries except metadata
-        entries = [(k, v) for k, v in node.items() if not k.startswith("__")]
-        entries.sort(key=lambda x: (not x[1].get("__is_dir__", False), x[0].lower()))
-
-        # Process each entry
-        for i, (name, contents) in enumerate(entries):
-            is_last = i == len(entries) - 1
-            is_dir = contents.get("__is_dir__", False)
-            is_ignored = contents.get("__ignored__", False)
-
-            # Add this item
-            if is_last:
-                lines.append(f"{prefix}{self.last_symbol}{name}{'/' if is_dir else ''}")
-                new_prefix = prefix + self.indent_symbol
+        children = entries(root)
+        # Each frame: (iterator over the directory's entries, index of its last entry, prefix, depth)
+        stack = [(enumerate(children), len(children) - 1, "", 0)]
+        while stack:
+            items, last_index, prefix, depth = stack[-1]
+            for i, (name, is_dir, child_key) in items:
+                if i == last_index:
+                    yield f"{prefix}{self.last_symbol}{name}{'/' if is_dir else ''}"
+                    new_prefix = prefix + self.indent_symbol
+                else:
+                    yield f"{prefix}{self.tee_symbol}{name}{'/' if is_dir else ''}"
+                    new_prefix = prefix + self.branch_symbol
+
+                if child_key is not None and (max_depth is None or depth + 1 <= max_depth):
+                    children = entries(child_key)
+                    if children:
+                        stack.append((enumerate(children), len(children) - 1, new_prefix, depth + 1))
+                        break
             else:
-                lines.append(f"{prefix}{self.tee_symbol}{name}{'/' if is_dir else ''}")
-                new_prefix = prefix + self.branch_symbol
-
-            # If directory and not ignored, add its children
-            if is_dir and not is_ignored:
-                # Only recurse into non-ignored directories with contents
-                filtered_contents = {k: v for k, v in contents.items() if not k.startswith("__")}
-                if filtered_contents:
-                    self._build_tree_recursive(contents, lines, new_prefix, depth + 1, max_depth)
+                stack.pop()
 
     def _normalize_path(self, path):
         """Normalize path for consistent processing"""
@@ -4,12 +4,18 @@ import threading
 import os
 import platform
 import subprocess
+import tempfile
 from pathlib import Path
 from tkinterdnd2 import DND_FILES
 
 from processor import ProjectProcessor
 from file_utils import format_file_size
 from scanner import FileScanner
+from output_writer import COMPRESSION_CODECS, is_compressed_output, decompress_output, read_output_text
+from watcher import ProjectWatcher
+from profiler import summary_line
+from progress import ProgressState
+from line_index import LineIndex
 
 # --- Constants for UI Design ---
 BACKGROUND_COLOR = "#ffffff"
@@ -27,10 +33,16 @@ FONT_FAMILY = "Segoe UI"
 FONT_NORMAL = (FONT_FAMILY, 10)
 FONT_BOLD = (FONT_FAMILY, 11, "bold")
 FONT_LARGE_BOLD = (FONT_FAMILY, 16, "bold")
+# Interval between polls of the progress state, i.e. the status frame rate
+PROGRESS_FRAME_MS = 50
+# Outputs larger than this (uncompressed) ask for confirmation before being copied to the clipboard
+CLIPBOARD_WARN_BYTES = 50 * 1024 * 1024
+# Lines shown per page of the output preview
+PREVIEW_PAGE_LINES = 200
 
 
 class CodebaseTrackerUI:
-    def __init__(self, root):
+    def __init__(self, root, clipboard_warn_bytes=CLIPBOARD_WARN_BYTES):
         self.root = root
         self.root.title("Codebase Tracker")
         self.root.geometry("800x600")
@@ -44,8 +56,21 @@ class CodebaseTrackerUI:
         self.cancel_event = threading.Event()
         self.worker_thread = None
 
+        self.clipboard_warn_bytes = clipboard_warn_bytes
+        self.copy_thread = None
+        self.copy_cancel = threading.Event()
+        self.preview = None
+        # Set while a watch-triggered run has closed the preview it will reopen afterwards
+        self.reopen_preview = False
+
+        # Workers only write to this; _poll_progress copies it into the widgets
+        self.progress_state = ProgressState()
+        self._seen_version = 0
+        self._seen_line = 0
+
         self._setup_styles()
         self._setup_ui()
+        self._poll_progress()
 
     def _setup_styles(self):
         style = ttk.Style(self.root)
@@ -106,6 +131,24 @@ class CodebaseTrackerUI:
         self.edit_ignore_btn = ttk.Button(actions_frame, text="Edit track_ignore.txt", style="Secondary.TButton", command=self._edit_track_ignore, state=tk.DISABLED)
         self.edit_ignore_btn.grid(row=0, column=1, sticky="ew", padx=(10, 0))
 
+        # Output compression: "none" or one of the stdlib codecs
+        self.compression_var = tk.StringVar(value="none")
+        compression_box = ttk.Combobox(actions_frame, textvariable=self.compression_var, state="readonly", width=6,
+                                       values=["none"] + sorted(COMPRESSION_CODECS))
+        compression_box.grid(row=0, column=2, sticky="ew", padx=(10, 0))
+
+        # Watch mode: regenerate the output on file changes after a successful scan
+        self.watch_var = tk.BooleanVar(value=False)
+        watch_check = ttk.Checkbutton(actions_frame, text="Watch", variable=self.watch_var, command=self._toggle_watch)
+        watch_check.grid(row=0, column=3, sticky="w", padx=(10, 0))
+        self.watch_thread = None
+        self.watch_stop = threading.Event()
+
+        # Profile: per-phase timings and I/O counters in the results panel and .codebase/profile.json
+        self.profile_var = tk.BooleanVar(value=False)
+        profile_check = ttk.Checkbutton(actions_frame, text="Profile", variable=self.profile_var)
+        profile_check.grid(row=0, column=4, sticky="w", padx=(10, 0))
+
         status_frame = ttk.LabelFrame(main_frame, text="Log", padding="10")
         status_frame.pack(fill=tk.BOTH, expand=True)
 
@@ -140,13 +183,14 @@ class CodebaseTrackerUI:
             self._set_project_path(folder_path)
 
     def _set_project_path(self, path):
+        self._stop_watch()
         self.project_path = path
         for widget in self.drop_zone.winfo_children():
             widget.destroy()
         path_label = ttk.Label(self.drop_zone, text=f"Project: {path}", font=FONT_BOLD, wraplength=750)
         path_label.pack(pady=40, padx=20, expand=True)
 
-        self.status_var.set(f"Project selected. Ready to scan.")
+        self.progress_state.update("Project selected. Ready to scan.")
         self.scan_btn.config(state=tk.NORMAL)
         self.edit_ignore_btn.config(state=tk.NORMAL)
         self._log(f"Project selected: {path}")
@@ -162,13 +206,19 @@ class CodebaseTrackerUI:
             messagebox.showerror("Error", "Please select a project folder first.")
             return
 
-        self.processor = ProjectProcessor(self.project_path)
+        # Two runs must never write the same output at once
+        self._stop_watch(wait=True)
+        self._close_preview()
+        self.reopen_preview = False
+        compression = self.compression_var.get()
+        self.processor = ProjectProcessor(self.project_path,
+                                          compression=compression if compression in COMPRESSION_CODECS else None,
+                                          keep_scan_records=self.watch_var.get(),
+                                          profile=self.profile_var.get())
         self.output_stats = {}
         self.cancel_event.clear()
 
-        self.log_text.delete(1.0, tk.END)
-        self.progress_var.set(0)
-        self.status_var.set("Starting scan...")
+        self.progress_state.reset("Starting scan...")
         self.results_frame.pack_forget()
         
         self.scan_btn.grid_remove()
@@ -203,6 +253,8 @@ class CodebaseTrackerUI:
                 self._update_status("Success! Output file generated.", 1.0)
                 self._log(f"Combined {stats.get('text_files', 0)} files. Total characters: {stats.get('total_chars', 0):,}")
                 self.root.after(0, self._show_results)
+                if self.watch_var.get():
+                    self.root.after(0, self._start_watch)
             else:
                 self._update_status(f"Error: {message}", 1.0)
                 self._log(f"Failed to complete process: {message}")
@@ -210,6 +262,70 @@ class CodebaseTrackerUI:
         finally:
             self.root.after(0, self._restore_ui_state)
 
+    def _toggle_watch(self):
+        if not self.watch_var.get():
+            self._stop_watch()
+        elif self.output_stats and not (self.worker_thread and self.worker_thread.is_alive()):
+            self._start_watch()
+
+    def _start_watch(self):
+        """Watch the project with the processor of the last successful scan."""
+        if not self.processor or (self.watch_thread and self.watch_thread.is_alive()):
+            return
+        self.watch_stop = threading.Event()
+        watcher = ProjectWatcher(self.processor)
+        self.watch_thread = threading.Thread(
+            target=watcher.run,
+            args=(self.watch_stop, self._scan_callback, self._combine_callback, self._on_watch_result,
+                  self._before_watch_run),
+            daemon=True
+        )
+        self.watch_thread.start()
+        self._log(f"Watching {self.project_path} for changes...")
+
+    def _stop_watch(self, wait=False):
+        if self.watch_thread and self.watch_thread.is_alive():
+            self.watch_stop.set()
+            if wait:
+                self.watch_thread.join(timeout=5)
+            self._log("Stopped watching for changes.")
+        self.watch_thread = None
+
+    def _before_watch_run(self):
+        """Watch thread: have the Tk thread close the preview before the output is replaced."""
+        closed = threading.Event()
+
+        def close():
+            if self.preview is not None:
+                # Not if the user closed its window already
+                self.reopen_preview = bool(self.preview.window.winfo_exists())
+                self._close_preview()
+            closed.set()
+
+        self.root.after(0, close)
+        # Don't wait on a Tk thread that is itself waiting for this thread to stop
+        while not closed.wait(0.1):
+            if self.watch_stop.is_set():
+                return
+
+    def _on_watch_result(self, success, message, stats, changes):
+        if success:
+            self.output_stats = stats
+            self._update_status(f"Output updated after {changes} change(s).", 1.0)
+            self._log(f"{changes} change(s) detected: {message} Reused {stats.get('reused_files', 0)} unchanged files.")
+            self.root.after(0, self._show_results)
+        else:
+            self._log(f"Failed to update output: {message}")
+        self.root.after(0, self._reopen_preview)
+
+    def _reopen_preview(self):
+        """Show the output again in a preview closed for a watch-triggered run."""
+        if not self.reopen_preview:
+            return
+        self.reopen_preview = False
+        if self.preview is None and self.processor and os.path.exists(self.processor.combiner.output_file):
+            self.preview = OutputPreview(self.root, self.processor.combiner.output_file)
+
     def _restore_ui_state(self):
         self.cancel_btn.grid_remove()
         self.scan_btn.grid(row=0, column=0, sticky="ew")
@@ -223,26 +339,28 @@ class CodebaseTrackerUI:
         self._update_status(message, progress)
 
     def _update_status(self, message, progress=None):
-        def update():
-            self.status_var.set(message)
-            if progress is not None and progress >= 0:
-                self.progress_var.set(progress)
-            
-            if "Scanning:" in message or "Processing" in message:
-                self._log(message, show_timestamp=False)
-
-        self.root.after(0, update)
+        self.progress_state.update(message, progress)
 
     def _log(self, message, show_timestamp=True):
-        def update():
-            if show_timestamp:
-                import time
-                timestamp = time.strftime("%H:%M:%S")
-                self.log_text.insert(tk.END, f"[{timestamp}] {message}\n")
-            else:
-                self.log_text.insert(tk.END, f"{message}\n")
-            self.log_text.see(tk.END)
-        self.root.after(0, update)
+        self.progress_state.log(message, show_timestamp)
+
+    def _poll_progress(self):
+        """Copy the latest progress state into the widgets; runs every PROGRESS_FRAME_MS on the Tk thread."""
+        update = self.progress_state.poll(self._seen_version, self._seen_line)
+        if update is not None:
+            version, message, progress, lines, last_line, restart = update
+            self.status_var.set(message)
+            self.progress_var.set(progress or 0)
+            if restart:
+                self.log_text.delete(1.0, tk.END)
+            if lines:
+                self.log_text.insert(tk.END, "\n".join(lines) + "\n")
+                excess = int(self.log_text.index("end-1c").split(".")[0]) - 1 - self.progress_state.log_lines
+                if excess > 0:
+                    self.log_text.delete(1.0, f"{excess + 1}.0")
+                self.log_text.see(tk.END)
+            self._seen_version, self._seen_line = version, last_line
+        self.root.after(PROGRESS_FRAME_MS, self._poll_progress)
 
     def _show_results(self):
         for widget in self.results_frame.winfo_children():
@@ -257,15 +375,35 @@ class CodebaseTrackerUI:
         ttk.Label(info_frame, text=f"Text Files: {stats.get('text_files', 0)}", font=FONT_BOLD).pack(side=tk.LEFT, padx=(0, 15))
         ttk.Label(info_frame, text=f"Ignored: {stats.get('ignored_items', 0)}", font=FONT_BOLD).pack(side=tk.LEFT, padx=15)
         ttk.Label(info_frame, text=f"Total Chars: {stats.get('total_chars', 0):,}", font=FONT_BOLD).pack(side=tk.LEFT, padx=15)
+        if stats.get('compressed_bytes', 0) != stats.get('raw_bytes', 0):
+            size_text = f"Size: {format_file_size(stats['raw_bytes'])} → {format_file_size(stats['compressed_bytes'])}"
+            ttk.Label(info_frame, text=size_text, font=FONT_BOLD).pack(side=tk.LEFT, padx=15)
         if stats.get('errors', 0) > 0:
             ttk.Label(info_frame, text=f"Errors: {stats['errors']}", font=FONT_BOLD, foreground="red").pack(side=tk.LEFT, padx=15)
 
+        if 'profile' in stats:
+            profile_frame = ttk.Frame(self.results_frame)
+            profile_frame.pack(fill=tk.X)
+            ttk.Label(profile_frame, text=summary_line(stats['profile']), font=FONT_NORMAL,
+                      foreground=TEXT_SECONDARY_COLOR, wraplength=750).pack(anchor="w")
+            slowest = stats['profile']['slowest_reads'][:3]
+            if slowest:
+                slowest_text = "Slowest reads: " + ", ".join(f"{item['path']} ({item['seconds'] * 1000:.0f} ms)"
+                                                             for item in slowest)
+                ttk.Label(profile_frame, text=slowest_text, font=FONT_NORMAL,
+                          foreground=TEXT_SECONDARY_COLOR, wraplength=750).pack(anchor="w")
+
         btn_frame = ttk.Frame(self.results_frame)
         btn_frame.pack(fill=tk.X, pady=(10, 0))
 
-        self.copy_btn = ttk.Button(btn_frame, text="Copy to Clipboard", style="Success.TButton", command=self._copy_to_clipboard)
+        copying = self.copy_thread is not None and self.copy_thread.is_alive()
+        self.copy_btn = ttk.Button(btn_frame, text="Cancel Copy" if copying else "Copy to Clipboard",
+                                   style="Success.TButton", command=self._copy_to_clipboard)
         self.copy_btn.pack(side=tk.LEFT, padx=(0, 10))
 
+        preview_btn = ttk.Button(btn_frame, text="Preview", style="Secondary.TButton", command=self._open_preview)
+        preview_btn.pack(side=tk.LEFT, padx=5)
+
         open_file_btn = ttk.Button(btn_frame, text="Open Output File", style="Secondary.TButton", command=self._open_output_file)
         open_file_btn.pack(side=tk.LEFT, padx=5)
 
@@ -275,20 +413,82 @@ class CodebaseTrackerUI:
         self.results_frame.pack(fill=tk.X, padx=0, pady=(15, 0))
 
     def _copy_to_clipboard(self):
-        if self.processor and self.processor.combiner and os.path.exists(self.processor.combiner.output_file):
-            try:
-                with open(self.processor.combiner.output_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                self.root.clipboard_clear()
-                self.root.clipboard_append(content)
-                self._log("Content copied to clipboard!")
-                original_text = self.copy_btn.cget("text")
-                self.copy_btn.config(text="Copied!", state=tk.DISABLED)
-                self.root.after(2000, lambda: self.copy_btn.config(text=original_text, state=tk.NORMAL))
-            except Exception as e:
-                messagebox.showerror("Error", f"Could not copy to clipboard: {e}")
+        if self.copy_thread and self.copy_thread.is_alive():
+            # While the output loads, the button cancels the copy
+            self.copy_cancel.set()
+            self.copy_btn.config(text="Cancelling...", state=tk.DISABLED)
+            return
+        if not (self.processor and self.processor.combiner and os.path.exists(self.processor.combiner.output_file)):
+            messagebox.showerror("Error", "Output file not found. Please generate it first.")
+            return
+
+        output_file = self.processor.combiner.output_file
+        size = self.output_stats.get('raw_bytes') or os.path.getsize(output_file)
+        if size > self.clipboard_warn_bytes and not messagebox.askyesno(
+                "Large output",
+                f"The output is {format_file_size(size)}. Copying it can take a while and needs about twice "
+                f"that much memory, and many applications can't paste text this large.\n\nCopy anyway?"):
+            return
+
+        # The file is read and decoded on a worker thread; only the hand-over to Tk runs here
+        self.copy_cancel = threading.Event()
+        self.copy_thread = threading.Thread(target=self._load_for_clipboard, args=(output_file, self.copy_cancel),
+                                            daemon=True)
+        self.copy_thread.start()
+        self.copy_btn.config(text="Cancel Copy")
+        self._log(f"Loading {output_file.name} for the clipboard...")
+
+    def _load_for_clipboard(self, output_file, cancel_event):
+        def progress(done, total):
+            self._update_status(f"Loading output for the clipboard: {format_file_size(done)} of "
+                                f"{format_file_size(total)}", done / total if total else 1.0)
+
+        try:
+            content = read_output_text(output_file, cancel_event, progress)
+        except Exception as e:
+            self.root.after(0, lambda error=e: self._finish_copy(None, error))
+            return
+        self.root.after(0, lambda: self._finish_copy(content))
+
+    def _finish_copy(self, content, error=None):
+        self.copy_thread = None
+        copied = False
+        if error is not None:
+            self._update_status("Copy to clipboard failed.")
+            messagebox.showerror("Error", f"Could not copy to clipboard: {error}")
+        elif content is None:
+            self._update_status("Copy to clipboard cancelled.")
+            self._log("Copy to clipboard cancelled.")
         else:
+            self.root.clipboard_clear()
+            self.root.clipboard_append(content)
+            self._update_status("Content copied to clipboard.", 1.0)
+            self._log("Content copied to clipboard!")
+            copied = True
+        # _show_results may have replaced the button in the meantime
+        if not self.copy_btn.winfo_exists():
+            return
+        if copied:
+            button = self.copy_btn
+            button.config(text="Copied!", state=tk.DISABLED)
+            self.root.after(2000, lambda: button.winfo_exists() and
+                            button.config(text="Copy to Clipboard", state=tk.NORMAL))
+        else:
+            self.copy_btn.config(text="Copy to Clipboard", state=tk.NORMAL)
+
+    def _open_preview(self):
+        if not (self.processor and self.processor.combiner and os.path.exists(self.processor.combiner.output_file)):
             messagebox.showerror("Error", "Output file not found. Please generate it first.")
+            return
+        if self.preview is not None:
+            self.preview.close()
+        self.preview = OutputPreview(self.root, self.processor.combiner.output_file)
+
+    def _close_preview(self):
+        """Unmap the previewed output before it is replaced (Windows can't replace a mapped file)."""
+        if self.preview is not None:
+            self.preview.close()
+            self.preview = None
 
     def _open_path(self, path):
         try:
@@ -306,7 +506,23 @@ class CodebaseTrackerUI:
 
     def _open_output_file(self):
         if self.processor and self.processor.combiner and self.processor.combiner.output_file:
-            self._open_path(self.processor.combiner.output_file)
+            output_file = self.processor.combiner.output_file
+            if is_compressed_output(output_file) and os.path.exists(output_file):
+                # Editors can't open .gz/.xz/.bz2 text, so open a decompressed copy instead
+                self._log(f"Decompressing {output_file.name} for viewing...")
+                threading.Thread(target=self._open_decompressed, args=(output_file,), daemon=True).start()
+            else:
+                self._open_path(output_file)
+
+    def _open_decompressed(self, output_file):
+        target = Path(tempfile.gettempdir()) / f"{Path(self.project_path).name}-{output_file.stem}"
+        try:
+            decompress_output(output_file, target)
+        except Exception as e:
+            message = f"Could not decompress output: {e}"
+            self.root.after(0, lambda: messagebox.showerror("Error", message))
+            return
+        self.root.after(0, lambda: self._open_path(target))
 
     def _open_output_dir(self):
         if self.processor and self.processor.combiner and self.processor.combiner.output_dir:
@@ -325,3 +541,166 @@ class CodebaseTrackerUI:
         track_ignore_path = scanner.ignore_rules.get_track_ignore_path()
         
         self._open_path(track_ignore_path)
+
+
+class OutputPreview:
+    """
+    Read-only window paging through an output file.
+
+    The file is mapped and its line offsets are indexed on a worker thread (see
+    LineIndex); pages can be shown while indexing goes on, and only the lines of
+    the current page are ever decoded. Compressed outputs are first decompressed
+    to a temporary file.
+    """
+
+    def __init__(self, root, path, page_lines=PREVIEW_PAGE_LINES):
+        self.path = Path(path)
+        self.page_lines = page_lines
+        self.first = 0
+        self.index = None
+        self.error = None
+        self.status = "Opening..."
+        self.temp_path = None
+        self.cancel_event = threading.Event()
+        # Lines on the current page and the line count when it was drawn
+        self._lines_shown = 0
+        self._rendered_count = -1
+
+        self.window = tk.Toplevel(root)
+        self.window.title(f"Preview - {self.path.name}")
+        self.window.geometry("900x650")
+        self.window.configure(bg=BACKGROUND_COLOR)
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        nav_frame = ttk.Frame(self.window, padding=(10, 10, 10, 5))
+        nav_frame.pack(fill=tk.X)
+        for text, command in (("« Top", self.top), ("‹ Previous", self.previous_page),
+                              ("Next ›", self.next_page), ("End »", self.end)):
+            ttk.Button(nav_frame, text=text, style="Secondary.TButton", command=command).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Label(nav_frame, text="Line:").pack(side=tk.LEFT, padx=(10, 5))
+        self.goto_var = tk.StringVar()
+        goto_entry = ttk.Entry(nav_frame, textvariable=self.goto_var, width=10)
+        goto_entry.pack(side=tk.LEFT)
+        goto_entry.bind("<Return>", lambda event: self.go_to_line())
+        self.position_var = tk.StringVar()
+        ttk.Label(nav_frame, textvariable=self.position_var, foreground=TEXT_SECONDARY_COLOR).pack(side=tk.RIGHT)
+
+        text_frame = ttk.Frame(self.window, padding=(10, 0, 10, 10))
+        text_frame.pack(fill=tk.BOTH, expand=True)
+        self.text = tk.Text(text_frame, wrap=tk.NONE, bg="#F8F9FA", fg=TEXT_COLOR, relief=tk.SOLID, borderwidth=1,
+                            font=("Consolas", 10), state=tk.DISABLED)
+        y_scrollbar = ttk.Scrollbar(text_frame, command=self.text.yview)
+        x_scrollbar = ttk.Scrollbar(text_frame, orient=tk.HORIZONTAL, command=self.text.xview)
+        self.text.config(yscrollcommand=y_scrollbar.set, xscrollcommand=x_scrollbar.set)
+        y_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        x_scrollbar.pack(side=tk.BOTTOM, fill=tk.X)
+        self.text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.window.bind("<Prior>", lambda event: self.previous_page())
+        self.window.bind("<Next>", lambda event: self.next_page())
+        self.window.bind("<Control-Home>", lambda event: self.top())
+        self.window.bind("<Control-End>", lambda event: self.end())
+
+        self.thread = threading.Thread(target=self._load, daemon=True)
+        self.thread.start()
+        self._poll()
+
+    def _load(self):
+        path = self.path
+        try:
+            if is_compressed_output(path):
+                self.status = "Decompressing..."
+                handle, temp_name = tempfile.mkstemp(prefix=f"{path.stem}-", suffix=".txt")
+                os.close(handle)
+                self.temp_path = temp_name
+                decompress_output(path, temp_name)
+                path = temp_name
+            self.index = LineIndex(path)
+            self.index.build(self.cancel_event)
+        except Exception as e:
+            self.error = e
+        finally:
+            if self.cancel_event.is_set():
+                self._release()
+
+    def _poll(self):
+        """Follow the indexing: refresh the position, and the page while it is short of lines."""
+        if self.cancel_event.is_set():
+            return
+        index = self.index
+        if self.error is not None:
+            self.position_var.set(f"Error: {self.error}")
+            return
+        if index is None:
+            self.position_var.set(self.status)
+        else:
+            if self._lines_shown < self.page_lines and index.line_count != self._rendered_count:
+                self._render()
+            self._update_position()
+        if index is None or not index.complete:
+            self.window.after(PROGRESS_FRAME_MS, self._poll)
+
+    def _render(self):
+        index = self.index
+        lines = index.lines(self.first, self.page_lines)
+        self._lines_shown = len(lines)
+        self._rendered_count = index.line_count
+        self.text.config(state=tk.NORMAL)
+        self.text.delete(1.0, tk.END)
+        self.text.insert(tk.END, "\n".join(lines))
+        self.text.config(state=tk.DISABLED)
+
+    def _update_position(self):
+        index = self.index
+        last = min(self.first + self.page_lines, index.line_count)
+        if index.complete:
+            total = f"{index.line_count:,}"
+        else:
+            total = f"{index.line_count:,}+ (indexing {index.indexed_bytes / max(index.size, 1):.0%})"
+        self.position_var.set(f"Lines {min(self.first + 1, last):,}–{last:,} of {total}")
+
+    def show(self, first):
+        if self.index is None:
+            return
+        last_page = max(self.index.line_count - self.page_lines, 0)
+        self.first = min(max(first, 0), last_page)
+        self._render()
+        self.text.yview_moveto(0)
+        self._update_position()
+
+    def top(self):
+        self.show(0)
+
+    def previous_page(self):
+        self.show(self.first - self.page_lines)
+
+    def next_page(self):
+        self.show(self.first + self.page_lines)
+
+    def end(self):
+        if self.index is not None:
+            self.show(self.index.line_count)
+
+    def go_to_line(self):
+        try:
+            line = int(self.goto_var.get().replace(",", ""))
+        except ValueError:
+            return
+        self.show(line - 1)
+
+    def close(self):
+        self.cancel_event.set()
+        # A worker still indexing releases the file itself when it sees the cancel
+        if not self.thread.is_alive():
+            self._release()
+        if self.window.winfo_exists():
+            self.window.destroy()
+
+    def _release(self):
+        if self.index is not None:
+            self.index.close()
+        if self.temp_path:
+            try:
+                os.remove(self.temp_path)
+            except OSError:
+                pass
@@ -0,0 +1,344 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import re
+import select
+import struct
+import sys
+import time
+from ignore_rules import GITIGNORE_FILENAME, TRACK_IGNORE_FILENAME
+
+# Quiet period after the last change before regenerating
+DEFAULT_DEBOUNCE = 0.3
+# Upper bound on how long a steady stream of changes can postpone regenerating
+MAX_DEBOUNCE_DELAY = 3.0
+# Interval between directory sweeps of the polling backend
+DEFAULT_POLL_INTERVAL = 2.0
+# How often the wait loop wakes to check the stop event; the only idle work with inotify
+WAKE_INTERVAL = 0.5
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+# No IN_CLOSE_WRITE: IgnoreRules opens track_ignore.txt for writing on every load, which
+# would make each rule reload trigger the next one
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+              IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW)
+# Events that add or remove a directory entry, as opposed to changing a file in place
+STRUCTURE_MASK = IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct('iIII')
+
+# Marker in a change list: changes were lost, rescan everything
+RESCAN_ALL = (None, True)
+
+
+class InotifyBackend:
+    """
+    Directory watches through the Linux inotify API, called with ctypes.
+
+    wait() blocks in select() on the inotify descriptor, so an idle project costs
+    nothing but a wake-up every WAKE_INTERVAL. Changes are (absolute path, is_dir)
+    pairs, is_dir being True only when a directory was created, removed or renamed.
+    """
+
+    name = "inotify"
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._paths = {}
+        self._descriptors = {}
+
+    def sync(self, directories):
+        """Watch exactly `directories` (absolute paths) from now on."""
+        directories = set(directories)
+        descriptors = {}
+        for path in directories:
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOSPC:
+                    raise OSError(error, "inotify watch limit reached (fs.inotify.max_user_watches)")
+                # The directory vanished since the scan; its parent's events cover it
+                continue
+            # A renamed directory keeps its watch descriptor, so always remap it
+            descriptors[path] = wd
+        live = set(descriptors.values())
+        for path, wd in self._descriptors.items():
+            if wd not in live:
+                self._libc.inotify_rm_watch(self._fd, wd)
+        self._descriptors = descriptors
+        self._paths = {wd: path for path, wd in descriptors.items()}
+
+    def wait(self, timeout):
+        """Return the changes that arrive within `timeout` seconds (an empty list if none)."""
+        try:
+            readable, _, _ = select.select([self._fd], [], [], timeout)
+        except InterruptedError:
+            return []
+        if not readable:
+            return []
+        changes = []
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            changes.extend(self._parse(data))
+        return changes
+
+    def _parse(self, data):
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b'\0')
+            offset += EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                yield RESCAN_ALL
+                continue
+            directory = self._paths.get(wd)
+            if directory is None or mask & IN_IGNORED:
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                yield directory, True
+            elif name:
+                yield os.path.join(directory, os.fsdecode(name)), bool(mask & IN_ISDIR and mask & STRUCTURE_MASK)
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingBackend:
+    """
+    Portable fallback: sweeps the watched directories every `interval` seconds and
+    compares each entry's type, size and mtime with the previous sweep.
+    """
+
+    name = "polling"
+
+    def __init__(self, interval=DEFAULT_POLL_INTERVAL):
+        self.interval = interval
+        self._snapshots = {}
+        self._next_poll = time.monotonic() + interval
+
+    def sync(self, directories):
+        self._snapshots = {path: self._snapshot(path) for path in directories}
+        self._next_poll = time.monotonic() + self.interval
+
+    def wait(self, timeout):
+        delay = self._next_poll - time.monotonic()
+        if delay > timeout:
+            time.sleep(timeout)
+            return []
+        if delay > 0:
+            time.sleep(delay)
+        self._next_poll = time.monotonic() + self.interval
+
+        changes = []
+        for directory, previous in self._snapshots.items():
+            current = self._snapshot(directory)
+            if current is None:
+                if previous is not None:
+                    changes.append((directory, True))
+                continue
+            if current == previous:
+                continue
+            previous = previous or {}
+            for name in current.keys() | previous.keys():
+                before, after = previous.get(name), current.get(name)
+                if before != after:
+                    is_dir = (before or after)[0]
+                    changes.append((os.path.join(directory, name), is_dir))
+            self._snapshots[directory] = current
+        return changes
+
+    @staticmethod
+    def _snapshot(directory):
+        """name -> (is_dir, size, mtime_ns); directories only by name, they have their own snapshot."""
+        entries = {}
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            entries[entry.name] = (True, 0, 0)
+                        else:
+                            stat_result = entry.stat(follow_symlinks=False)
+                            entries[entry.name] = (False, stat_result.st_size, stat_result.st_mtime_ns)
+                    except OSError:
+                        continue
+        except OSError:
+            return None
+        return entries
+
+    def close(self):
+        self._snapshots = {}
+
+
+def create_backend(polling=False, poll_interval=DEFAULT_POLL_INTERVAL):
+    """inotify on Linux unless polling is requested or it isn't available, else PollingBackend."""
+    if not polling and sys.platform.startswith('linux'):
+        try:
+            return InotifyBackend()
+        except (OSError, AttributeError) as e:
+            print(f"inotify unavailable, falling back to polling: {e}", file=sys.stderr)
+    return PollingBackend(poll_interval)
+
+
+class ProjectWatcher:
+    """
+    Keeps a ProjectProcessor's output up to date while files change.
+
+    After the caller's first run, the watcher waits for changes in the directories the
+    scanner entered, waits for them to settle for `debounce` seconds, and runs the
+    processor again with only the changed directories rescanned; the combiner reuses the
+    segments of unchanged files from the previous output. Changes to a .gitignore or to
+    track_ignore.txt reload the rules and rescan everything.
+    """
+
+    def __init__(self, processor, debounce=DEFAULT_DEBOUNCE, polling=False, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.processor = processor
+        self.debounce = debounce
+        self.polling = polling
+        self.poll_interval = poll_interval
+        self.backend = None
+        # The first change after this fails over to a full rescan if no records were kept
+        processor.scanner.keep_dir_records = True
+        self.project_path = processor.scanner.project_path
+        self.output_file = processor.combiner.output_file
+        self._output_names = _output_names_pattern(self.output_file)
+
+    def run(self, stop_event, scan_callback, combine_callback, on_result=None, before_run=None):
+        """
+        Watch until stop_event is set; it also cancels a run in progress. before_run is called
+        with no arguments before every run, on_result with (success, message, stats, number of
+        changed paths) after it.
+        """
+        self.backend = create_backend(self.polling, self.poll_interval)
+        try:
+            self._sync()
+            while not stop_event.is_set():
+                changes = self._collect(stop_event)
+                if not changes:
+                    continue
+                reload, dirty = self._classify(changes)
+                if reload is None:
+                    continue
+                if reload:
+                    self.processor.scanner.reload_rules()
+                if before_run:
+                    before_run()
+                success, message, stats = self.processor.run(scan_callback, combine_callback, stop_event,
+                                                             dirty=None if reload else dirty)
+                if stop_event.is_set():
+                    break
+                if on_result:
+                    on_result(success, message, stats, len(changes))
+                self._sync()
+        finally:
+            self.backend.close()
+
+    def _sync(self):
+        scanner = self.processor.scanner
+        directories = [os.path.join(self.project_path, rel_prefix) for rel_prefix in scanner.tree.listings]
+        # .codebase itself is never scanned, but track_ignore.txt lives there
+        directories.append(str(scanner.ignore_rules.codebase_dir))
+        try:
+            self.backend.sync(directories)
+        except OSError as e:
+            if isinstance(self.backend, PollingBackend):
+                raise
+            print(f"{e}; falling back to polling", file=sys.stderr)
+            self.backend.close()
+            self.backend = PollingBackend(self.poll_interval)
+            self.backend.sync(directories)
+
+    def _collect(self, stop_event):
+        """Wait for a change, then keep collecting until none arrive for `debounce` seconds."""
+        changes = self.backend.wait(WAKE_INTERVAL)
+        if not changes:
+            return []
+        deadline = time.monotonic() + MAX_DEBOUNCE_DELAY
+        while not stop_event.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            more = self.backend.wait(min(self.debounce, remaining))
+            if not more:
+                break
+            changes.extend(more)
+        return changes
+
+    def _classify(self, changes):
+        """
+        Return (reload, dirty directory prefixes) for a batch of changes; reload is None
+        when none of them can affect the output, True when the rules must be reloaded.
+        """
+        scanner = self.processor.scanner
+        rules = scanner.ignore_rules
+        codebase_dir = str(rules.codebase_dir)
+        project = str(self.project_path)
+        dirty = set()
+        relevant = False
+        for path, is_dir in changes:
+            if path is None:
+                return True, None
+            parent, name = os.path.split(path)
+            if self._is_output(parent, name):
+                continue
+            if parent == codebase_dir:
+                if name == TRACK_IGNORE_FILENAME:
+                    return True, None
+                continue
+            if name == GITIGNORE_FILENAME:
+                return True, None
+            rel_path = os.path.relpath(path, project)
+            if rel_path == '.' or rel_path.startswith('..'):
+                continue
+            if rules.is_always_ignored(rel_path, is_dir):
+                continue
+            relevant = True
+            rel_parent = os.path.dirname(rel_path)
+            dirty.add(rel_parent + os.sep if rel_parent else '')
+            if is_dir:
+                # A directory appeared, vanished or was renamed: nothing recorded below it holds
+                prefix = rel_path + os.sep
+                dirty.update(key for key in scanner.dir_records if key.startswith(prefix))
+        return (False if relevant else None), dirty
+
+    def _is_output(self, parent, name):
+        """The output, its temporary files, manifest and shards, in case they are inside the project."""
+        return parent == str(self.output_file.parent) and self._output_names.fullmatch(name) is not None
+
+
+def _output_names_pattern(output_file):
+    """
+    Names the combiner writes next to `output_file`: the output and its per-run temp files
+    (file_utils.temp_path), <stem>.manifest.json, .index.json and .shards.json with theirs,
+    and the <stem>.part-NNN<suffix> shards.
+    """
+    name = re.escape(output_file.name)
+    stem = re.escape(output_file.stem)
+    temp = r'\.\d+-\d+'
+    return re.compile(rf"{name}(?:{temp}(?:\.body)?\.tmp)?|"
+                      rf"{stem}\.(?:manifest|index|shards)\.json(?:{temp}\.tmp)?|"
+                      rf"{stem}\.part-\d{{3,}}{re.escape(output_file.suffix)}")